@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DailyReport, ZoneAnalytics, VehicleAnalytics, RevenueReport, PeakHourAnalytics, Alert
+from .models import DailyReport, ZoneAnalytics, VehicleAnalytics, RevenueReport, PeakHourAnalytics, RevenueCube, Alert
 
 @admin.register(Alert)
 class AlertAdmin(admin.ModelAdmin):
@@ -27,9 +27,14 @@ class PeakHourAnalyticsAdmin(admin.ModelAdmin):
     list_display = ('date', 'hour', 'sessions_count', 'occupancy_rate')
     list_filter = ('date', 'hour')
 
+class RevenueCubeAdmin(admin.ModelAdmin):
+    list_display = ('date', 'zone', 'payment_method', 'revenue', 'payment_count', 'session_count')
+    list_filter = ('date', 'zone', 'payment_method')
+
 # Explicitly register models
 admin.site.register(DailyReport, DailyReportAdmin)
 admin.site.register(ZoneAnalytics, ZoneAnalyticsAdmin)
 admin.site.register(VehicleAnalytics, VehicleAnalyticsAdmin)
 admin.site.register(RevenueReport, RevenueReportAdmin)
 admin.site.register(PeakHourAnalytics, PeakHourAnalyticsAdmin)
+admin.site.register(RevenueCube, RevenueCubeAdmin)
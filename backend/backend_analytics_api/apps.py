@@ -5,3 +5,8 @@ class BackendAnalyticsApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend_analytics_api'
     verbose_name = 'Analytics Reports'
+
+    def ready(self):
+        # Drop cached analytics whenever sessions, payments or slots change,
+        # and mark rolled-up days whose payments were edited or deleted
+        from . import signals  # noqa: F401
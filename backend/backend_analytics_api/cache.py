@@ -0,0 +1,97 @@
+"""
+Cache layer in front of AnalyticsService.
+
+Results are cached per method and arguments. Every key embeds the local
+date and a global generation number. Writes to ParkingSession, Payment,
+Slot, Attendance and User bump the generation (see signals.py), which orphans every cached
+result at once instead of deleting keys one by one. A result computed from
+pre-write data can only ever be stored under the old generation, so it is
+never served after the write has committed.
+
+Hit/miss counters are kept in the same cache so that they are shared by all
+workers when a shared backend such as Redis is configured.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from functools import wraps
+import hashlib
+import time
+
+GENERATION_KEY = 'analytics:generation'
+METRIC_KEY = 'analytics:metrics:{method}:{outcome}'
+_MISSING = object()
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Time-based seed, so a restarted or evicted counter never reuses an old generation
+        cache.add(GENERATION_KEY, time.time_ns() // 1000, None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def invalidate():
+    """Orphan every cached analytics result"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        get_generation()
+
+
+def _record(method, outcome):
+    key = METRIC_KEY.format(method=method, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_metrics():
+    """Hit/miss counters for every cached method"""
+    methods = getattr(settings, 'ANALYTICS_CACHE_TIMEOUTS', {}).keys()
+    keys = {
+        (method, outcome): METRIC_KEY.format(method=method, outcome=outcome)
+        for method in methods for outcome in ('hit', 'miss')
+    }
+    values = cache.get_many(keys.values())
+    metrics = {}
+    for (method, outcome), key in keys.items():
+        metrics.setdefault(method, {'hit': 0, 'miss': 0})[outcome] = values.get(key, 0)
+    for counts in metrics.values():
+        total = counts['hit'] + counts['miss']
+        counts['hit_rate'] = round(counts['hit'] / total * 100, 2) if total else 0
+    return metrics
+
+
+def cached_analytics(func):
+    """
+    Cache the result of an AnalyticsService method.
+    The timeout comes from settings.ANALYTICS_CACHE_TIMEOUTS[<method name>].
+    Results carrying an 'error' key are not cached.
+    """
+    method = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        timeout = getattr(settings, 'ANALYTICS_CACHE_TIMEOUTS', {}).get(method, 0)
+        if not timeout:
+            return func(*args, **kwargs)
+
+        arguments = hashlib.md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+        key = f'analytics:{method}:{get_generation()}:{timezone.localdate().isoformat()}:{arguments}'
+
+        result = cache.get(key, _MISSING)
+        if result is not _MISSING:
+            _record(method, 'hit')
+            return result
+
+        _record(method, 'miss')
+        result = func(*args, **kwargs)
+        if not (isinstance(result, dict) and 'error' in result):
+            cache.set(key, result, timeout)
+        return result
+
+    return wrapper
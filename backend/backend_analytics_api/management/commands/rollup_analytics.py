@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import date
+from backend_analytics_api.rollups import RollupService
+
+
+class Command(BaseCommand):
+    help = 'Fold closed days into DailyReport, ZoneAnalytics and PeakHourAnalytics (run at least daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every day instead of only what changed')
+        parser.add_argument('--from-date', help='With --rebuild, start at this day (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        if options['from_date'] and not options['rebuild']:
+            raise CommandError('--from-date requires --rebuild')
+
+        if options['rebuild']:
+            try:
+                from_date = date.fromisoformat(options['from_date']) if options['from_date'] else None
+            except ValueError:
+                raise CommandError('--from-date must be YYYY-MM-DD')
+            days = RollupService.rebuild(from_date)
+        else:
+            days = RollupService.run()
+
+        if days:
+            self.stdout.write(f'Recomputed {len(days)} day(s): {days[0]} .. {days[-1]}')
+        self.stdout.write(self.style.SUCCESS(f'Rollups up to date through {RollupService.rolled_through()}'))
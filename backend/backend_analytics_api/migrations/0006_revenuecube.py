@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def reset_rollup_watermark(apps, schema_editor):
+    # Days rolled up before the cube existed have no cube rows; recompute them on the next run
+    RollupWatermark = apps.get_model('backend_analytics_api', 'RollupWatermark')
+    RollupWatermark.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_analytics_api', '0005_rollupwatermark'),
+        ('backend_core_api', '0016_parkingsession_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueCube',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(max_length=50)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('session_count', models.IntegerField(default=0)),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_cube', to='backend_core_api.zone')),
+            ],
+            options={
+                'verbose_name': 'Revenue Cube',
+                'verbose_name_plural': 'Revenue Cube',
+                'ordering': ['-date', 'zone', 'payment_method'],
+                'unique_together': {('date', 'zone', 'payment_method')},
+            },
+        ),
+        migrations.RunPython(reset_rollup_watermark, migrations.RunPython.noop),
+    ]
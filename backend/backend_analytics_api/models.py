@@ -102,6 +102,53 @@ class PeakHourAnalytics(models.Model):
         return f"{self.date} - {self.hour}:00"
 
 
+class RevenueCube(models.Model):
+    """Successful payments per local day, zone and payment method (maintained by rollups.py)"""
+    date = models.DateField()
+    zone = models.ForeignKey('backend_core_api.Zone', on_delete=models.CASCADE, related_name='revenue_cube')
+    payment_method = models.CharField(max_length=50)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+    session_count = models.IntegerField(default=0)  # Sessions whose first successful payment is in this cell (additive)
+
+    class Meta:
+        unique_together = ['date', 'zone', 'payment_method']
+        ordering = ['-date', 'zone', 'payment_method']
+        verbose_name = "Revenue Cube"
+        verbose_name_plural = "Revenue Cube"
+
+    def __str__(self):
+        return f"{self.date} - {self.zone_id} - {self.payment_method}"
+
+
+class RollupDirtyDay(models.Model):
+    """Rolled-up day whose payments changed after it was folded (see rollups.py)"""
+    date = models.DateField(unique=True)
+    marked_at = models.DateTimeField(default=timezone.now)  # Last change; rows older than a run are cleared by it
+
+    class Meta:
+        verbose_name = "Rollup Dirty Day"
+        verbose_name_plural = "Rollup Dirty Days"
+
+    def __str__(self):
+        return f"{self.date} (marked {self.marked_at})"
+
+
+class RollupWatermark(models.Model):
+    """High-water mark of the analytics rollup job (see rollups.py)"""
+    name = models.CharField(max_length=50, unique=True)
+    rolled_through = models.DateField(null=True, blank=True)  # Last local day folded into the rollups
+    last_closed_at = models.DateTimeField(null=True, blank=True)  # Session exits/cancellations seen up to here
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Rollup Watermark"
+        verbose_name_plural = "Rollup Watermarks"
+
+    def __str__(self):
+        return f"{self.name}: {self.rolled_through}"
+
+
 class Alert(models.Model):
     TYPE_CHOICES = (
         ('critical', 'Critical'),
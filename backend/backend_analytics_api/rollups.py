@@ -0,0 +1,315 @@
+"""
+Incremental rollups of sessions and payments into DailyReport,
+ZoneAnalytics, PeakHourAnalytics and RevenueCube, one row set per closed
+local day.
+
+A day is closed once it has ended (plus SETTLE_LAG for in-flight commits);
+"today" is never rolled up and is always computed live by the caller.
+RollupWatermark records the last rolled day and the last session closure
+seen. Each run only recomputes:
+
+* days that closed since the previous run, and
+* older days touched by sessions that completed or were cancelled since
+  the previous run (a long stay changes the occupancy of every day it spans),
+* older days marked in RollupDirtyDay because a payment taken on them was
+  edited or deleted (PaymentViewSet, admin, cascades from deleted sessions).
+
+Days are recomputed from the fact tables, so a run is idempotent and can be
+repeated or interrupted safely.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, Sum, Q, F, OuterRef, Subquery, Value, DurationField, ExpressionWrapper
+from django.db.models.functions import Coalesce, Greatest, Least, ExtractHour, TruncDate
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from .cache import invalidate
+from .models import DailyReport, ZoneAnalytics, PeakHourAnalytics, RevenueCube, RollupDirtyDay, RollupWatermark
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def local_day_bounds(day):
+    """Aware [start, end) datetimes of a local calendar day"""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+class RollupService:
+    WATERMARK = 'daily'
+    SETTLE_LAG = timedelta(minutes=5)  # Rows committed later than this after their timestamp can be missed
+
+    @staticmethod
+    def get_models():
+        ParkingSession = apps.get_model('backend_core_api', 'ParkingSession')
+        Payment = apps.get_model('backend_core_api', 'Payment')
+        Zone = apps.get_model('backend_core_api', 'Zone')
+        return ParkingSession, Payment, Zone
+
+    @staticmethod
+    def rolled_through():
+        """Last local day available from the rollups, or None"""
+        return RollupWatermark.objects.filter(name=RollupService.WATERMARK).values_list('rolled_through', flat=True).first()
+
+    @staticmethod
+    def compute_day(day):
+        """
+        Aggregate one local day straight from the fact tables.
+        Used both to materialize closed days and to serve "today" live.
+        """
+        ParkingSession, Payment, Zone = RollupService.get_models()
+        local_tz = timezone.get_current_timezone()
+        start, end = local_day_bounds(day)
+        now = timezone.now()
+        zones = {}
+
+        def zone_row(zone_id):
+            return zones.setdefault(zone_id, {
+                'sessions_count': 0, 'revenue': Decimal('0.00'), 'occupied_seconds': 0,
+                'completed': 0, 'completed_duration': timedelta(0),
+            })
+
+        # Sessions are attributed to the day and local hour they entered
+        hours = dict.fromkeys(range(24), 0)
+        entered = (
+            ParkingSession.objects.filter(entry_time__gte=start, entry_time__lt=end)
+            .annotate(hour=ExtractHour('entry_time', tzinfo=local_tz))
+            .values('zone_id', 'hour').annotate(sessions_count=Count('id')).order_by()
+        )
+        for row in entered:
+            hours[row['hour']] += row['sessions_count']
+            zone_row(row['zone_id'])['sessions_count'] += row['sessions_count']
+
+        durations = (
+            ParkingSession.objects.filter(entry_time__gte=start, entry_time__lt=end, status='completed', exit_time__isnull=False)
+            .values('zone_id').order_by()
+            .annotate(
+                completed=Count('id'),
+                completed_duration=Sum(ExpressionWrapper(F('exit_time') - F('entry_time'), output_field=DurationField())),
+            )
+        )
+        for row in durations:
+            zone = zone_row(row['zone_id'])
+            zone['completed'] = row['completed']
+            zone['completed_duration'] = row['completed_duration'] or timedelta(0)
+
+        # Occupancy: parked time clipped to the day; open stays run until now
+        occupied_until = Least(Coalesce('exit_time', Value(now)), Value(end))
+        occupied_from = Greatest('entry_time', Value(start))
+        occupancy = (
+            ParkingSession.objects.filter(status__in=['active', 'completed'], entry_time__lt=end)
+            .filter(Q(exit_time__isnull=True) | Q(exit_time__gt=start))
+            .values('zone_id').order_by()
+            .annotate(occupied=Sum(ExpressionWrapper(occupied_until - occupied_from, output_field=DurationField())))
+        )
+        for row in occupancy:
+            if row['occupied'] and row['occupied'] > timedelta(0):
+                zone_row(row['zone_id'])['occupied_seconds'] = row['occupied'].total_seconds()
+
+        revenue_cells = RollupService.revenue_cells(day, day)
+        for cell in revenue_cells:
+            zone_row(cell['zone_id'])['revenue'] += cell['revenue']
+
+        capacity = dict(Zone.objects.filter(Q(is_active=True) | Q(id__in=zones)).values_list('id', 'total_slots'))
+        day_seconds = (end - start).total_seconds()
+        for zone_id, zone in zones.items():
+            slots = capacity.get(zone_id) or 0
+            zone['occupancy_rate'] = round(zone['occupied_seconds'] / (slots * day_seconds) * 100, 2) if slots else 0
+            zone['average_duration'] = zone['completed_duration'] / zone['completed'] if zone['completed'] else None
+
+        total_slots = sum(capacity.values())
+        completed = sum(z['completed'] for z in zones.values())
+        busiest = max(hours, key=hours.get)
+        return {
+            'date': day,
+            'total_sessions': sum(hours.values()),
+            'total_revenue': sum((z['revenue'] for z in zones.values()), Decimal('0.00')),
+            'average_duration': sum((z['completed_duration'] for z in zones.values()), timedelta(0)) / completed if completed else None,
+            'peak_hour': time(busiest) if hours[busiest] else None,
+            'occupancy_rate': round(sum(z['occupied_seconds'] for z in zones.values()) / (total_slots * day_seconds) * 100, 2) if total_slots else 0,
+            'hours': hours,
+            'zones': zones,
+            'revenue_cells': revenue_cells,
+        }
+
+    @staticmethod
+    def revenue_cells(from_date, to_date):
+        """
+        Successful payments grouped by local day, zone and payment method,
+        the grain of RevenueCube. Revenue lands on the day the payment was taken.
+
+        session_count counts each session once, in the cell of its first
+        successful payment, so it can be summed across cells and days. A
+        session first paid before a range is not counted in that range.
+        """
+        ParkingSession, Payment, Zone = RollupService.get_models()
+        start = local_day_bounds(from_date)[0]
+        end = local_day_bounds(to_date)[1]
+        first_payment = (
+            Payment.objects.filter(session=OuterRef('session'), status='success')
+            .order_by('created_at', 'id').values('id')[:1]
+        )
+        rows = (
+            Payment.objects.filter(created_at__gte=start, created_at__lt=end, status='success')
+            .annotate(date=TruncDate('created_at', tzinfo=timezone.get_current_timezone()), first_payment=Subquery(first_payment))
+            .values('date', 'session__zone_id', 'payment_method').order_by()
+            .annotate(
+                revenue=Sum('amount'), payment_count=Count('id'),
+                session_count=Count('id', filter=Q(id=F('first_payment'))),
+            )
+        )
+        return [
+            {
+                'date': row['date'],
+                'zone_id': row['session__zone_id'],
+                'payment_method': row['payment_method'],
+                'revenue': row['revenue'] or Decimal('0.00'),
+                'payment_count': row['payment_count'],
+                'session_count': row['session_count'],
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def rollup_day(day):
+        """Materialize one closed day, replacing whatever was stored for it"""
+        facts = RollupService.compute_day(day)
+
+        DailyReport.objects.update_or_create(date=day, defaults={
+            'total_sessions': facts['total_sessions'],
+            'total_revenue': facts['total_revenue'],
+            'average_duration': facts['average_duration'],
+            'peak_hour': facts['peak_hour'],
+            'occupancy_rate': facts['occupancy_rate'],
+        })
+
+        ZoneAnalytics.objects.filter(date=day).exclude(zone_id__in=facts['zones']).delete()
+        ZoneAnalytics.objects.bulk_create(
+            [
+                ZoneAnalytics(
+                    zone_id=zone_id, date=day,
+                    sessions_count=zone['sessions_count'],
+                    revenue=zone['revenue'],
+                    occupancy_rate=zone['occupancy_rate'],
+                    average_duration=zone['average_duration'],
+                )
+                for zone_id, zone in facts['zones'].items()
+            ],
+            update_conflicts=True,
+            unique_fields=['zone', 'date'],
+            update_fields=['sessions_count', 'revenue', 'occupancy_rate', 'average_duration'],
+        )
+
+        RevenueCube.objects.filter(date=day).delete()
+        RevenueCube.objects.bulk_create([RevenueCube(**cell) for cell in facts['revenue_cells']])
+
+        PeakHourAnalytics.objects.bulk_create(
+            [PeakHourAnalytics(date=day, hour=hour, sessions_count=count) for hour, count in facts['hours'].items()],
+            update_conflicts=True,
+            unique_fields=['date', 'hour'],
+            update_fields=['sessions_count'],
+        )
+        return facts
+
+    @staticmethod
+    def mark_dirty(days):
+        """
+        Queue past days for recomputation on the next run. Today is always
+        computed live, so changes to it need no mark.
+        """
+        days = {day for day in days if day < timezone.localdate()}
+        if days:
+            now = timezone.now()
+            RollupDirtyDay.objects.bulk_create(
+                [RollupDirtyDay(date=day, marked_at=now) for day in days],
+                update_conflicts=True, unique_fields=['date'], update_fields=['marked_at'],
+            )
+        return days
+
+    @staticmethod
+    def affected_days(watermark, cutoff, through):
+        """Closed days that need (re)computing since the watermark was written"""
+        ParkingSession, Payment, Zone = RollupService.get_models()
+        local_tz = timezone.get_current_timezone()
+        days = set()
+
+        if watermark.rolled_through is None:
+            # First run: backfill from the oldest fact
+            first = [
+                ParkingSession.objects.order_by('entry_time').values_list('entry_time', flat=True).first(),
+                Payment.objects.order_by('created_at').values_list('created_at', flat=True).first(),
+            ]
+            first = [timezone.localdate(value) for value in first if value]
+            next_day = min(first) if first else through + timedelta(days=1)
+        else:
+            next_day = watermark.rolled_through + timedelta(days=1)
+
+        while next_day <= through:
+            days.add(next_day)
+            next_day += timedelta(days=1)
+
+        if watermark.rolled_through is not None and watermark.last_closed_at is not None:
+            closed = (
+                ParkingSession.objects
+                .filter(
+                    Q(status='completed', exit_time__gt=watermark.last_closed_at, exit_time__lte=cutoff)
+                    | Q(status='cancelled', cancelled_at__gt=watermark.last_closed_at, cancelled_at__lte=cutoff)
+                )
+                .annotate(
+                    entry_day=TruncDate('entry_time', tzinfo=local_tz),
+                    closed_day=TruncDate(Coalesce('exit_time', 'cancelled_at'), tzinfo=local_tz),
+                )
+                .values_list('entry_day', 'closed_day').distinct()
+            )
+            for entry_day, closed_day in closed:
+                day = entry_day
+                while day <= min(closed_day, watermark.rolled_through):
+                    days.add(day)
+                    day += timedelta(days=1)
+
+        if watermark.rolled_through is not None:
+            days.update(RollupDirtyDay.objects.filter(date__lte=watermark.rolled_through).values_list('date', flat=True))
+
+        return sorted(days)
+
+    @staticmethod
+    def run():
+        """Fold everything that changed since the last run into the rollups"""
+        started = timezone.now()
+        cutoff = started - RollupService.SETTLE_LAG
+        through = timezone.localdate(cutoff) - timedelta(days=1)
+
+        with transaction.atomic():
+            RollupWatermark.objects.get_or_create(name=RollupService.WATERMARK)
+            watermark = RollupWatermark.objects.select_for_update().get(name=RollupService.WATERMARK)
+
+            days = RollupService.affected_days(watermark, cutoff, through)
+            for day in days:
+                RollupService.rollup_day(day)
+            # Marks made while this run was computing stay for the next one
+            RollupDirtyDay.objects.filter(date__lte=through, marked_at__lte=started).delete()
+
+            if watermark.rolled_through is None or through > watermark.rolled_through:
+                watermark.rolled_through = through
+            watermark.last_closed_at = cutoff
+            watermark.save()
+
+            if days:
+                transaction.on_commit(invalidate)
+
+        logger.info(f"Analytics rollups: {len(days)} day(s) recomputed, rolled through {watermark.rolled_through}")
+        return days
+
+    @staticmethod
+    def rebuild(from_date=None):
+        """Forget the watermark so the next run recomputes every day (from from_date if given)"""
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=RollupService.WATERMARK)
+            watermark.rolled_through = from_date - timedelta(days=1) if from_date else None
+            watermark.last_closed_at = None
+            watermark.save()
+        return RollupService.run()
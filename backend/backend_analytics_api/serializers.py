@@ -42,6 +42,15 @@ class RevenueReportSerializer(serializers.Serializer):
 class PeakHoursSerializer(serializers.Serializer):
     hourly_data = serializers.ListField()
     top_peak_hours = serializers.ListField()
+    weekday_matrix = serializers.ListField(required=False)
+
+class DailyReportSerializer(serializers.Serializer):
+    from_date = serializers.DateField()
+    to_date = serializers.DateField()
+    total_sessions = serializers.IntegerField()
+    total_revenue = serializers.FloatField()
+    average_occupancy_rate = serializers.FloatField()
+    daily = serializers.ListField()
 
 class ActiveSessionSerializer(serializers.Serializer):
     session_id = serializers.IntegerField(source='id')
@@ -1,8 +1,10 @@
 from django.db.models import Count, Sum, Q, Avg
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django.apps import apps
 from decimal import Decimal
+from .cache import cached_analytics
+from .rollups import RollupService, local_day_bounds
 
 class AnalyticsService:
     @staticmethod
@@ -19,32 +21,50 @@ class AnalyticsService:
         return ParkingSession, Zone, Vehicle, Payment, Slot
     
     @staticmethod
+    @cached_analytics
     def get_dashboard_summary():
         try:
             ParkingSession, Zone, Vehicle, Payment, Slot = AnalyticsService.get_models()
-            now = timezone.now()
-            local_now = timezone.localtime(now)
+            local_now = timezone.localtime(timezone.now())
             today_start = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
             
-            # Use filters consistently
-            vehicles_entered = ParkingSession.objects.filter(entry_time__gte=today_start).count()
-            vehicles_exited = ParkingSession.objects.filter(status='completed', exit_time__gte=today_start).count()
-            active_sessions = ParkingSession.objects.filter(status='active').count()
+            # One pass over today's and open sessions; the OR lets each branch use its index
+            entered_today = Q(entry_time__gte=today_start)
+            exited_today = Q(status='completed', exit_time__gte=today_start)
+            active = Q(status='active')
+            session_totals = ParkingSession.objects.filter(entered_today | exited_today | active).aggregate(
+                vehicles_entered=Count('id', filter=entered_today),
+                vehicles_exited=Count('id', filter=exited_today),
+                active_sessions=Count('id', filter=active),
+            )
+            vehicles_entered = session_totals['vehicles_entered']
+            vehicles_exited = session_totals['vehicles_exited']
+            active_sessions = session_totals['active_sessions']
             
             total_revenue = Decimal('0.00')
             cash_revenue = Decimal('0.00')
             online_revenue = Decimal('0.00')
             
             if Payment:
-                today_payments = Payment.objects.filter(created_at__gte=today_start, status='success')
-                total_revenue = today_payments.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-                cash_revenue = today_payments.filter(payment_method__iexact='cash').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+                payment_totals = Payment.objects.filter(created_at__gte=today_start, status='success').aggregate(
+                    total=Sum('amount'),
+                    cash=Sum('amount', filter=Q(payment_method__iexact='cash')),
+                )
+                total_revenue = payment_totals['total'] or Decimal('0.00')
+                cash_revenue = payment_totals['cash'] or Decimal('0.00')
                 online_revenue = total_revenue - cash_revenue
             
-            total_zones = Zone.objects.filter(is_active=True).count()
-            total_slots = Slot.objects.filter(is_active=True).count()
-            occupied_slots = Slot.objects.filter(is_occupied=True, is_active=True).count()
-            reserved_slots = Slot.objects.filter(is_reserved=True, is_active=True).count()
+            # Occupancy comes from the live counters of active zones, not from counting slots
+            zone_totals = Zone.objects.filter(is_active=True).aggregate(
+                total_zones=Count('id'),
+                total_slots=Sum('total_slots'),
+                occupied_slots=Sum('occupied_count'),
+                reserved_slots=Sum('reserved_count'),
+            )
+            total_zones = zone_totals['total_zones']
+            total_slots = zone_totals['total_slots'] or 0
+            occupied_slots = zone_totals['occupied_slots'] or 0
+            reserved_slots = zone_totals['reserved_slots'] or 0
             occupancy_rate = (occupied_slots / total_slots * 100) if total_slots > 0 else 0
             
             from django.contrib.auth import get_user_model
@@ -79,6 +99,7 @@ class AnalyticsService:
             return {'error': str(e)}
 
     @staticmethod
+    @cached_analytics
     def get_zone_occupancy():
         try:
             ParkingSession, Zone, Vehicle, Payment, Slot = AnalyticsService.get_models()
@@ -106,91 +127,179 @@ class AnalyticsService:
             return {'error': str(e)}
 
     @staticmethod
+    @cached_analytics
     def get_revenue_report(from_date=None, to_date=None, period='ALL'):
         try:
             ParkingSession, Zone, Vehicle, Payment, Slot = AnalyticsService.get_models()
-            now = timezone.now()
+            from .models import RevenueCube
+            today = timezone.localdate()
             
             if not from_date:
                 if period == 'DAILY':
-                    from_date = now.date()
+                    from_date = today
                 else:
-                    from_date = now.date() - timedelta(days=30)
-            if not to_date: to_date = now.date()
-            
-            from_datetime = datetime.combine(from_date, datetime.min.time())
-            to_datetime = datetime.combine(to_date, datetime.max.time())
+                    from_date = today - timedelta(days=30)
+            if not to_date: to_date = today
             
-            if Payment:
-                # Still need sessions for count
-                sessions = ParkingSession.objects.filter(entry_time__range=[from_datetime, to_datetime], payment_status='paid')
-                
-                payments_query = Payment.objects.filter(
-                    created_at__range=[from_datetime, to_datetime],
-                    status='success'
+            # (day, zone, payment_method) cells: closed days from the cube, the rest in one grouped query
+            cells = []
+            live_from = from_date
+            rolled_through = RollupService.rolled_through()
+            if rolled_through and rolled_through >= from_date:
+                cells.extend(
+                    RevenueCube.objects.filter(date__gte=from_date, date__lte=min(rolled_through, to_date))
+                    .values('date', 'zone_id', 'payment_method', 'revenue', 'payment_count', 'session_count')
                 )
-                
-                total_revenue = payments_query.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-                cash_revenue = payments_query.filter(payment_method__iexact='cash').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-                online_revenue = Decimal(total_revenue) - Decimal(cash_revenue)
-                
-                total_sessions = sessions.count()
-                
-                # Zone revenue still needs to join with session
-                zone_revenue = payments_query.values('session__zone__name').annotate(
-                    revenue=Sum('amount'), 
-                    session_count=Count('session', distinct=True)
-                ).order_by('-revenue')
-                
-                from django.db.models.functions import TruncDate
-                daily_revenue = payments_query.annotate(date=TruncDate('created_at')).values('date').annotate(
-                    revenue=Sum('amount')
-                ).order_by('date')
-                
-                payment_method_revenue = payments_query.values('payment_method').annotate(
-                    revenue=Sum('amount')
-                ).order_by('-revenue')
-            else:
-                total_revenue = Decimal('0.00')
-                cash_revenue = Decimal('0.00')
-                online_revenue = Decimal('0.00')
-                total_sessions = 0
-                zone_revenue = []
-                daily_revenue = []
-                payment_method_revenue = []
+                live_from = rolled_through + timedelta(days=1)
+            if live_from <= to_date:
+                cells.extend(RollupService.revenue_cells(live_from, to_date))
+            
+            total_revenue = Decimal('0.00')
+            cash_revenue = Decimal('0.00')
+            zone_totals = {}
+            daily_totals = {}
+            method_totals = {}
+            total_sessions = 0
+            for cell in cells:
+                total_revenue += cell['revenue']
+                if (cell['payment_method'] or '').lower() == 'cash':
+                    cash_revenue += cell['revenue']
+                # Each session is counted in the cell of its first payment only
+                total_sessions += cell['session_count']
+                zone = zone_totals.setdefault(cell['zone_id'], {'revenue': Decimal('0.00'), 'session_count': 0})
+                zone['revenue'] += cell['revenue']
+                zone['session_count'] += cell['session_count']
+                daily_totals[cell['date']] = daily_totals.get(cell['date'], Decimal('0.00')) + cell['revenue']
+                method_totals[cell['payment_method']] = method_totals.get(cell['payment_method'], Decimal('0.00')) + cell['revenue']
+            
+            zone_names = dict(Zone.objects.filter(id__in=zone_totals).values_list('id', 'name')) if zone_totals else {}
+            zone_revenue = sorted(
+                (
+                    {'session__zone__name': zone_names.get(zone_id), 'revenue': float(zone['revenue']), 'session_count': zone['session_count']}
+                    for zone_id, zone in zone_totals.items()
+                ),
+                key=lambda z: z['revenue'], reverse=True
+            )
             
             return {
                 'from_date': from_date.isoformat(),
                 'to_date': to_date.isoformat(),
                 'total_revenue': float(total_revenue),
                 'cash_revenue': float(cash_revenue),
-                'online_revenue': float(online_revenue),
+                'online_revenue': float(total_revenue - cash_revenue),
                 'total_sessions': total_sessions,
-                'zone_revenue': list(zone_revenue),
+                'zone_revenue': zone_revenue,
                 'payment_method_revenue': [
-                    {'payment_method': pm['payment_method'] or 'Unknown', 'revenue': float(pm['revenue'])}
-                    for pm in payment_method_revenue
+                    {'payment_method': method or 'Unknown', 'revenue': float(revenue)}
+                    for method, revenue in sorted(method_totals.items(), key=lambda m: m[1], reverse=True)
                 ],
                 'daily_revenue': [
-                    {'date': dr['date'].isoformat(), 'revenue': float(dr['revenue'])}
-                    for dr in daily_revenue
+                    {'date': day.isoformat(), 'revenue': float(revenue)}
+                    for day, revenue in sorted(daily_totals.items())
                 ]
             }
         except Exception as e:
             return {'error': str(e)}
 
     @staticmethod
-    def get_peak_hours():
+    @cached_analytics
+    def get_peak_hours(days=30, zone_id=None, by_weekday=False):
         try:
             ParkingSession, Zone, Vehicle, Payment, Slot = AnalyticsService.get_models()
-            sessions = ParkingSession.objects.filter(entry_time__gte=timezone.now() - timedelta(days=30))
-            hourly_data = {}
-            for session in sessions:
-                hour = session.entry_time.hour
-                hourly_data[hour] = hourly_data.get(hour, 0) + 1
-            
-            peak_hours = [{'hour': h, 'session_count': hourly_data.get(h, 0)} for h in range(24)]
-            return {'hourly_data': peak_hours, 'top_peak_hours': sorted(peak_hours, key=lambda x: x['session_count'], reverse=True)[:5]}
+            from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+            from .models import PeakHourAnalytics
+            local_tz = timezone.get_current_timezone()
+            first_day = timezone.localdate() - timedelta(days=days)
+            hourly_data = dict.fromkeys(range(24), 0)
+            # Monday first, as ISO weekday 1..7
+            weekday_matrix = [[0] * 24 for _ in range(7)]
+
+            # Closed days come from the rollups (no per-zone split there), the rest live
+            live_from = first_day
+            rolled_through = None if zone_id else RollupService.rolled_through()
+            if rolled_through and rolled_through >= first_day:
+                rollups = PeakHourAnalytics.objects.filter(date__gte=first_day, date__lte=rolled_through)
+                for row in rollups.values('date', 'hour', 'sessions_count'):
+                    hourly_data[row['hour']] += row['sessions_count']
+                    weekday_matrix[row['date'].isoweekday() - 1][row['hour']] += row['sessions_count']
+                live_from = rolled_through + timedelta(days=1)
+
+            sessions = ParkingSession.objects.filter(entry_time__gte=local_day_bounds(live_from)[0])
+            if zone_id:
+                sessions = sessions.filter(zone_id=zone_id)
+
+            # Bucket in the database by local hour; only 24 (or 7x24) rows come back
+            sessions = sessions.annotate(
+                hour=ExtractHour('entry_time', tzinfo=local_tz),
+                weekday=ExtractIsoWeekDay('entry_time', tzinfo=local_tz),
+            )
+            group_by = ('weekday', 'hour') if by_weekday else ('hour',)
+            for row in sessions.values(*group_by).annotate(session_count=Count('id')).order_by():
+                hourly_data[row['hour']] += row['session_count']
+                if by_weekday:
+                    weekday_matrix[row['weekday'] - 1][row['hour']] += row['session_count']
+
+            peak_hours = [{'hour': h, 'session_count': hourly_data[h]} for h in range(24)]
+            data = {'hourly_data': peak_hours, 'top_peak_hours': sorted(peak_hours, key=lambda x: x['session_count'], reverse=True)[:5]}
+            if by_weekday:
+                data['weekday_matrix'] = weekday_matrix
+            return data
+        except Exception as e:
+            return {'error': str(e)}
+
+    @staticmethod
+    @cached_analytics
+    def get_daily_report(days=30):
+        """Per-day sessions, revenue and occupancy: rolled-up days plus today live"""
+        try:
+            from .models import DailyReport
+            today = timezone.localdate()
+            first_day = today - timedelta(days=days - 1)
+            rows = {}
+
+            rolled_through = RollupService.rolled_through()
+            live_from = first_day
+            if rolled_through and rolled_through >= first_day:
+                for report in DailyReport.objects.filter(date__gte=first_day, date__lte=rolled_through):
+                    rows[report.date] = {
+                        'date': report.date,
+                        'total_sessions': report.total_sessions,
+                        'total_revenue': report.total_revenue,
+                        'average_duration': report.average_duration,
+                        'peak_hour': report.peak_hour,
+                        'occupancy_rate': report.occupancy_rate,
+                    }
+                live_from = rolled_through + timedelta(days=1)
+
+            # Normally only today; more if the rollup job has fallen behind
+            day = live_from
+            while day <= today:
+                facts = RollupService.compute_day(day)
+                rows[day] = {key: facts[key] for key in ('date', 'total_sessions', 'total_revenue', 'average_duration', 'peak_hour', 'occupancy_rate')}
+                day += timedelta(days=1)
+
+            daily = []
+            day = first_day
+            while day <= today:
+                row = rows.get(day, {'date': day, 'total_sessions': 0, 'total_revenue': Decimal('0.00'), 'average_duration': None, 'peak_hour': None, 'occupancy_rate': 0})
+                daily.append({
+                    'date': day.isoformat(),
+                    'total_sessions': row['total_sessions'],
+                    'total_revenue': float(row['total_revenue']),
+                    'average_duration_minutes': round(row['average_duration'].total_seconds() / 60, 1) if row['average_duration'] else None,
+                    'peak_hour': row['peak_hour'].hour if row['peak_hour'] else None,
+                    'occupancy_rate': row['occupancy_rate'],
+                })
+                day += timedelta(days=1)
+
+            return {
+                'from_date': first_day.isoformat(),
+                'to_date': today.isoformat(),
+                'total_sessions': sum(d['total_sessions'] for d in daily),
+                'total_revenue': sum(d['total_revenue'] for d in daily),
+                'average_occupancy_rate': round(sum(d['occupancy_rate'] for d in daily) / len(daily), 2) if daily else 0,
+                'daily': daily,
+            }
         except Exception as e:
             return {'error': str(e)}
 
@@ -228,7 +337,7 @@ class AlertService:
         try:
             zone = Zone.objects.get(id=zone_id)
             total = zone.total_slots
-            occupied = zone.slots.filter(is_occupied=True).count()
+            occupied = zone.occupied_count
             
             if total > 0:
                 occupancy = (occupied / total) * 100
@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from backend_core_api.models import Attendance, ParkingSession, Payment, Slot, User
+from backend_core_api.signals import slot_state_changed
+from .cache import invalidate
+from .rollups import RollupService
+
+
+@receiver(post_save, sender=ParkingSession)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Slot)
+@receiver(post_delete, sender=ParkingSession)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Slot)
+# The dashboard summary reports the on-duty staff and the user count
+@receiver(post_save, sender=Attendance)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_delete, sender=User)
+def invalidate_analytics_cache(sender, **kwargs):
+    transaction.on_commit(invalidate)
+
+
+@receiver(slot_state_changed)
+def invalidate_analytics_cache_on_slot_change(sender, **kwargs):
+    # Already sent after commit
+    invalidate()
+
+
+def mark_payment_days(*payments):
+    """
+    Mark the rolled-up days of changed payments dirty. A session is counted
+    on the day of its first payment, so its other payments' days go too.
+    """
+    payments = [payment for payment in payments if payment]
+    days = {timezone.localdate(payment['created_at']) for payment in payments}
+    if not RollupService.mark_dirty(days):
+        return  # Only today changed: computed live anyway
+    sessions = {payment['session_id'] for payment in payments}
+    RollupService.mark_dirty(
+        timezone.localdate(created_at)
+        for created_at in Payment.objects.filter(session_id__in=sessions, status='success').values_list('created_at', flat=True)
+    )
+
+
+@receiver(pre_save, sender=Payment)
+def remember_stored_payment(sender, instance, raw=False, **kwargs):
+    instance._stored_payment = None
+    if instance.pk and not raw:
+        instance._stored_payment = Payment.objects.filter(pk=instance.pk).values('created_at', 'session_id').first()
+
+
+@receiver(post_save, sender=Payment)
+def mark_saved_payment_days(sender, instance, created, raw=False, **kwargs):
+    stored = instance.__dict__.pop('_stored_payment', None)
+    if not created and not raw:
+        mark_payment_days(stored, {'created_at': instance.created_at, 'session_id': instance.session_id})
+
+
+@receiver(post_delete, sender=Payment)
+def mark_deleted_payment_days(sender, instance, **kwargs):
+    mark_payment_days({'created_at': instance.created_at, 'session_id': instance.session_id})
@@ -1,3 +1,299 @@
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from django.utils import timezone
+from datetime import datetime, timedelta
+from decimal import Decimal
+from backend_core_api.models import Attendance, Zone, Slot, ParkingSession, Payment, User
+from backend_core_api.services import SlotStateService
+from .cache import get_metrics
+from .models import DailyReport, ZoneAnalytics, PeakHourAnalytics, RevenueCube, RollupDirtyDay, RollupWatermark
+from .rollups import RollupService
+from .services import AnalyticsService
 
-# Create your tests here.
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.zone = Zone.objects.create(name='Zone A', total_slots=2)
+        for number in ('A1', 'A2'):
+            Slot.objects.create(zone=self.zone, slot_number=number)
+        self.session = ParkingSession.objects.create(vehicle_number='MH12AB1234', zone=self.zone)
+
+    def record_payment(self, amount, method='cash'):
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(session=self.session, amount=Decimal(amount), payment_method=method)
+
+    def test_cached_summary_is_served_until_a_write(self):
+        first = AnalyticsService.get_dashboard_summary()
+        # Queryset updates send no signals, so the cached value must still be returned
+        ParkingSession.objects.update(status='completed')
+        self.assertEqual(AnalyticsService.get_dashboard_summary(), first)
+
+    def test_payment_invalidates_dashboard_summary(self):
+        self.assertEqual(AnalyticsService.get_dashboard_summary()['total_revenue'], 0)
+
+        self.record_payment('50.00')
+        summary = AnalyticsService.get_dashboard_summary()
+        self.assertEqual(summary['total_revenue'], 50.0)
+        self.assertEqual(summary['cash_revenue'], 50.0)
+
+        self.record_payment('30.00', method='upi')
+        summary = AnalyticsService.get_dashboard_summary()
+        self.assertEqual(summary['total_revenue'], 80.0)
+        self.assertEqual(summary['online_revenue'], 30.0)
+
+    def test_payment_invalidates_revenue_report(self):
+        self.assertEqual(AnalyticsService.get_revenue_report(period='DAILY')['total_revenue'], 0)
+        self.record_payment('40.00')
+        self.assertEqual(AnalyticsService.get_revenue_report(period='DAILY')['total_revenue'], 40.0)
+
+    def test_uncommitted_payment_does_not_invalidate(self):
+        AnalyticsService.get_dashboard_summary()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Payment.objects.create(session=self.session, amount=Decimal('20.00'), payment_method='cash')
+            self.assertEqual(AnalyticsService.get_dashboard_summary()['total_revenue'], 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(AnalyticsService.get_dashboard_summary()['total_revenue'], 20.0)
+
+    def test_staff_and_user_changes_refresh_the_dashboard(self):
+        client = APIClient()
+        first = client.get('/api/analytics/dashboard/')
+        self.assertEqual(first.data['data']['current_staff_name'], 'No Active Shift')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            staff = User.objects.create_user('gate1', password='x', first_name='Asha', role='STAFF')
+        after_user = client.get('/api/analytics/dashboard/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(after_user.status_code, 200)
+        self.assertEqual(after_user.data['data']['total_users'], first.data['data']['total_users'] + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Attendance.objects.create(staff=staff)
+        after_shift = client.get('/api/analytics/dashboard/', HTTP_IF_NONE_MATCH=after_user['ETag'])
+        self.assertEqual(after_shift.status_code, 200)
+        self.assertEqual(after_shift.data['data']['current_staff_name'], 'Asha')
+
+    def test_slot_claim_invalidates_zone_occupancy(self):
+        self.assertEqual(AnalyticsService.get_zone_occupancy()[0]['occupied_slots'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            SlotStateService.claim(self.zone, occupy=True)
+        self.assertEqual(AnalyticsService.get_zone_occupancy()[0]['occupied_slots'], 1)
+
+    def test_summary_occupancy_covers_active_zones_only(self):
+        Zone.objects.create(name='Closed', total_slots=5, occupied_count=4, reserved_count=1, is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            SlotStateService.claim(self.zone, occupy=True)
+            SlotStateService.claim(self.zone)
+        summary = AnalyticsService.get_dashboard_summary()
+        self.assertEqual(
+            [summary[key] for key in ('total_zones', 'total_slots', 'occupied_slots', 'reserved_slots', 'available_slots')],
+            [1, 2, 1, 1, 0]
+        )
+        self.assertEqual(summary['occupancy_rate'], 50.0)
+
+    def test_summary_is_a_fixed_number_of_aggregates(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        for n, status in enumerate(['active', 'active', 'completed', 'completed', 'reserved', 'cancelled']):
+            session = ParkingSession.objects.create(vehicle_number=f'MH12AB{n:04d}', zone=self.zone, status=status,
+                                                    exit_time=timezone.now() if status == 'completed' else None)
+            if n % 2:  # Entered yesterday
+                ParkingSession.objects.filter(pk=session.pk).update(entry_time=yesterday)
+        self.record_payment('25.00')
+        cache.clear()
+
+        # Sessions, payments, zones, users and the on-duty staff: one query each, however many rows
+        with self.assertNumQueries(5):
+            summary = AnalyticsService.get_dashboard_summary()
+        self.assertEqual(
+            [summary[key] for key in ('vehicles_entered', 'completed_sessions', 'active_sessions', 'total_revenue')],
+            [4, 2, 3, 25.0]
+        )
+
+    def test_hit_and_miss_metrics(self):
+        AnalyticsService.get_peak_hours()
+        AnalyticsService.get_peak_hours()
+        AnalyticsService.get_peak_hours()
+        metrics = get_metrics()['get_peak_hours']
+        self.assertEqual(metrics['miss'], 1)
+        self.assertEqual(metrics['hit'], 2)
+        self.assertEqual(metrics['hit_rate'], 66.67)
+
+
+class PeakHoursTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.zone = Zone.objects.create(name='Zone A', total_slots=2)
+        other = Zone.objects.create(name='Zone B', total_slots=2)
+        day = timezone.localdate() - timedelta(days=1)
+        # 08:00 local is 02:30 UTC, so UTC bucketing would put these in hour 2
+        self.entry = timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=8))
+        for zone in (self.zone, self.zone, other):
+            session = ParkingSession.objects.create(vehicle_number='MH12AB1234', zone=zone)
+            ParkingSession.objects.filter(pk=session.pk).update(entry_time=self.entry)
+
+    def test_buckets_by_local_hour(self):
+        data = AnalyticsService.get_peak_hours()
+        self.assertEqual(len(data['hourly_data']), 24)
+        self.assertEqual(data['hourly_data'][8]['session_count'], 3)
+        self.assertEqual(data['top_peak_hours'][0], {'hour': 8, 'session_count': 3})
+
+    def test_zone_and_weekday_breakdown(self):
+        data = AnalyticsService.get_peak_hours(zone_id=self.zone.id, by_weekday=True)
+        self.assertEqual(data['hourly_data'][8]['session_count'], 2)
+        matrix = data['weekday_matrix']
+        self.assertEqual((len(matrix), len(matrix[0])), (7, 24))
+        self.assertEqual(matrix[self.entry.isoweekday() - 1][8], 2)
+        self.assertEqual(sum(map(sum, matrix)), 2)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.zone = Zone.objects.create(name='Zone A', total_slots=4)
+        self.days_ago = [timezone.localdate() - timedelta(days=n) for n in (3, 2)]
+
+    def add_session(self, day, hour, hours_parked=None, amount=None):
+        entry = timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=hour))
+        session = ParkingSession.objects.create(vehicle_number='MH12AB1234', zone=self.zone)
+        changes = {'entry_time': entry}
+        if hours_parked is not None:
+            changes.update(status='completed', exit_time=entry + timedelta(hours=hours_parked))
+        ParkingSession.objects.filter(pk=session.pk).update(**changes)
+        if amount:
+            payment = Payment.objects.create(session=session, amount=Decimal(amount), payment_method='cash')
+            Payment.objects.filter(pk=payment.pk).update(created_at=entry)
+        return session
+
+    def test_rollup_matches_live_computation(self):
+        first, second = self.days_ago
+        self.add_session(first, 9, hours_parked=2, amount='40.00')
+        self.add_session(first, 9, hours_parked=4, amount='60.00')
+        self.add_session(second, 18, hours_parked=1, amount='20.00')
+        live = AnalyticsService.get_daily_report(days=4)
+
+        days = RollupService.run()
+        self.assertIn(first, days)
+        report = DailyReport.objects.get(date=first)
+        self.assertEqual(report.total_sessions, 2)
+        self.assertEqual(report.total_revenue, Decimal('100.00'))
+        self.assertEqual(report.average_duration, timedelta(hours=3))
+        self.assertEqual(report.peak_hour.hour, 9)
+        # 6 slot-hours out of 4 slots x 24 hours
+        self.assertEqual(report.occupancy_rate, 6.25)
+        self.assertEqual(ZoneAnalytics.objects.get(date=first, zone=self.zone).revenue, Decimal('100.00'))
+        self.assertEqual(PeakHourAnalytics.objects.get(date=second, hour=18).sessions_count, 1)
+
+        cache.clear()
+        self.assertEqual(AnalyticsService.get_daily_report(days=4), live)
+        self.assertEqual(AnalyticsService.get_peak_hours()['hourly_data'][9]['session_count'], 2)
+
+    def test_closing_an_old_session_recomputes_its_days(self):
+        first, second = self.days_ago
+        session = self.add_session(first, 12)
+        RollupService.run()
+        self.assertEqual(DailyReport.objects.get(date=first).average_duration, None)
+        self.assertEqual(RollupService.run(), [])
+
+        # The exit happens after that run
+        RollupWatermark.objects.update(last_closed_at=timezone.now() - timedelta(hours=2))
+        ParkingSession.objects.filter(pk=session.pk).update(status='completed', exit_time=timezone.now() - timedelta(hours=1))
+        days = RollupService.run()
+        self.assertEqual(days[0], first)
+        self.assertIn(second, days)
+        self.assertIsNotNone(DailyReport.objects.get(date=first).average_duration)
+
+
+    def test_editing_a_payment_on_a_closed_day_refolds_it(self):
+        first, second = self.days_ago
+        self.add_session(first, 9, hours_parked=1, amount='40.00')
+        doomed = self.add_session(second, 10, hours_parked=1, amount='25.00')
+        RollupService.run()
+        self.assertEqual(RollupService.run(), [])
+
+        payment = Payment.objects.get(session__entry_time__date=first)
+        payment.amount = Decimal('45.00')
+        payment.save()
+        doomed.delete()  # Cascades to its payment
+        self.assertEqual(sorted(RollupDirtyDay.objects.values_list('date', flat=True)), [first, second])
+
+        self.assertEqual(RollupService.run(), [first, second])
+        self.assertEqual(DailyReport.objects.get(date=first).total_revenue, Decimal('45.00'))
+        self.assertEqual(DailyReport.objects.get(date=second).total_revenue, Decimal('0.00'))
+        self.assertFalse(RevenueCube.objects.filter(date=second).exists())
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+
+class RevenueReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.zone = Zone.objects.create(name='Zone A', total_slots=4)
+        self.other = Zone.objects.create(name='Zone B', total_slots=4)
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+
+    def pay(self, zone, amount, method, day, hour, minute=0, session=None):
+        session = session or ParkingSession.objects.create(vehicle_number='MH12AB1234', zone=zone)
+        payment = Payment.objects.create(session=session, amount=Decimal(amount), payment_method=method)
+        paid_at = timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute))
+        Payment.objects.filter(pk=payment.pk).update(created_at=paid_at)
+        return session
+
+    def test_breakdowns_from_cube_and_live_agree(self):
+        self.pay(self.zone, '100.00', 'cash', self.yesterday, 10)
+        self.pay(self.other, '50.00', 'upi', self.yesterday, 11)
+        self.pay(self.zone, '30.00', 'CASH', timezone.localdate(), 0, 5)
+        live = AnalyticsService.get_revenue_report(from_date=self.yesterday)
+
+        RollupService.run()
+        self.assertEqual(RevenueCube.objects.filter(date=self.yesterday).count(), 2)
+        cache.clear()
+        report = AnalyticsService.get_revenue_report(from_date=self.yesterday)
+        self.assertEqual(report, live)
+
+        self.assertEqual(report['total_revenue'], 180.0)
+        self.assertEqual(report['cash_revenue'], 130.0)
+        self.assertEqual(report['online_revenue'], 50.0)
+        self.assertEqual(report['total_sessions'], 3)
+        self.assertEqual(report['zone_revenue'][0], {'session__zone__name': 'Zone A', 'revenue': 130.0, 'session_count': 2})
+        self.assertEqual(
+            report['daily_revenue'],
+            [{'date': self.yesterday.isoformat(), 'revenue': 150.0}, {'date': timezone.localdate().isoformat(), 'revenue': 30.0}]
+        )
+
+    def test_session_paid_across_cells_counts_once(self):
+        # Booking paid online yesterday, balance paid in cash at exit today
+        session = self.pay(self.zone, '40.00', 'upi', self.yesterday, 18)
+        self.pay(self.zone, '20.00', 'cash', timezone.localdate(), 0, 5, session=session)
+        self.pay(self.other, '10.00', 'cash', timezone.localdate(), 0, 10)
+
+        RollupService.run()
+        cache.clear()
+        report = AnalyticsService.get_revenue_report(from_date=self.yesterday)
+        self.assertEqual(report['total_revenue'], 70.0)
+        self.assertEqual(report['total_sessions'], 2)
+        self.assertEqual(
+            [(zone['session__zone__name'], zone['session_count']) for zone in report['zone_revenue']],
+            [('Zone A', 1), ('Zone B', 1)]
+        )
+        # A session counts in the range holding its first payment
+        today = AnalyticsService.get_revenue_report(from_date=timezone.localdate())
+        self.assertEqual((today['total_revenue'], today['total_sessions']), (30.0, 1))
+
+    def test_report_reads_a_fixed_number_of_queries(self):
+        for days_ago in range(1, 8):
+            self.pay(self.zone, '10.00', 'cash', timezone.localdate() - timedelta(days=days_ago), 12)
+        self.pay(self.other, '10.00', 'upi', timezone.localdate(), 0, 5)
+        RollupService.run()
+        cache.clear()
+        # Watermark, cube cells, today's live cells, zone names: no scan of the closed days' payments
+        with self.assertNumQueries(4):
+            report = AnalyticsService.get_revenue_report(from_date=timezone.localdate() - timedelta(days=7))
+        self.assertEqual((report['total_revenue'], report['total_sessions']), (80.0, 8))
+
+    def test_days_use_local_boundaries(self):
+        # 00:30 local is still the previous day in UTC
+        self.pay(self.zone, '40.00', 'cash', self.yesterday, 0, 30)
+        report = AnalyticsService.get_revenue_report(from_date=self.yesterday, to_date=self.yesterday)
+        self.assertEqual(report['total_revenue'], 40.0)
+        report = AnalyticsService.get_revenue_report(from_date=self.yesterday - timedelta(days=1), to_date=self.yesterday - timedelta(days=1))
+        self.assertEqual(report['total_revenue'], 0)
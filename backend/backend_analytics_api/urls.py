@@ -5,10 +5,12 @@ from .views import (
     RevenueAnalyticsView, 
     OccupancyAnalyticsView,
     PeakHoursView,
+    DailyReportView,
     ActiveSessionsView,
     CompletedSessionsView,
     PaymentAnalyticsView,
-    AlertViewSet
+    AlertViewSet,
+    CacheStatsView
 )
 
 router = DefaultRouter()
@@ -19,8 +21,10 @@ urlpatterns = [
     path('revenue/', RevenueAnalyticsView.as_view(), name='analytics-revenue'),
     path('zones/', OccupancyAnalyticsView.as_view(), name='analytics-zones'),
     path('peak-hours/', PeakHoursView.as_view(), name='analytics-peak-hours'),
+    path('daily/', DailyReportView.as_view(), name='analytics-daily'),
     path('active-sessions/', ActiveSessionsView.as_view(), name='analytics-active-sessions'),
     path('completed-sessions/', CompletedSessionsView.as_view(), name='analytics-completed-sessions'),
     path('payments/', PaymentAnalyticsView.as_view(), name='analytics-payments'),
+    path('cache-stats/', CacheStatsView.as_view(), name='analytics-cache-stats'),
     path('', include(router.urls)),
 ]
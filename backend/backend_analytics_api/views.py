@@ -2,14 +2,17 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import status, viewsets
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from .services import AnalyticsService
+from .cache import get_metrics
+from backend_core_api.versioning import conditional_get
 from .serializers import (
     DashboardSummarySerializer, ZoneOccupancySerializer, RevenueReportSerializer,
     PeakHoursSerializer, ActiveSessionSerializer, CompletedSessionSerializer,
-    AlertSerializer
+    DailyReportSerializer, AlertSerializer
 )
 from .models import Alert
+from datetime import date
 
 class AlertViewSet(viewsets.ModelViewSet):
     queryset = Alert.objects.all().order_by('-created_at')
@@ -18,6 +21,7 @@ class AlertViewSet(viewsets.ModelViewSet):
 
 class DashboardAnalyticsView(APIView):
     permission_classes = [AllowAny]
+    @conditional_get()
     def get(self, request):
         data = AnalyticsService.get_dashboard_summary()
         if 'error' in data: return Response(data, status=500)
@@ -28,12 +32,19 @@ class RevenueAnalyticsView(APIView):
     permission_classes = [AllowAny]
     def get(self, request):
         period = request.query_params.get('period', 'ALL')
-        data = AnalyticsService.get_revenue_report(period=period)
+        try:
+            from_date = date.fromisoformat(request.query_params['from_date']) if request.query_params.get('from_date') else None
+            to_date = date.fromisoformat(request.query_params['to_date']) if request.query_params.get('to_date') else None
+        except ValueError:
+            return Response({'success': False, 'error': 'Dates must be YYYY-MM-DD'}, status=400)
+        data = AnalyticsService.get_revenue_report(from_date=from_date, to_date=to_date, period=period)
+        if 'error' in data: return Response(data, status=500)
         serializer = RevenueReportSerializer(data)
         return Response({'success': True, 'data': serializer.data})
 
 class OccupancyAnalyticsView(APIView):
     permission_classes = [AllowAny]
+    @conditional_get()
     def get(self, request):
         data = AnalyticsService.get_zone_occupancy()
         serializer = ZoneOccupancySerializer(data, many=True)
@@ -42,12 +53,32 @@ class OccupancyAnalyticsView(APIView):
 class PeakHoursView(APIView):
     permission_classes = [AllowAny]
     def get(self, request):
-        data = AnalyticsService.get_peak_hours()
+        try:
+            days = int(request.query_params.get('days', 30))
+            zone_id = int(request.query_params['zone']) if request.query_params.get('zone') else None
+        except ValueError:
+            return Response({'success': False, 'error': 'days and zone must be integers'}, status=400)
+        by_weekday = request.query_params.get('by_weekday', '').lower() in ('1', 'true', 'yes')
+        data = AnalyticsService.get_peak_hours(days=days, zone_id=zone_id, by_weekday=by_weekday)
+        if 'error' in data: return Response(data, status=500)
         serializer = PeakHoursSerializer(data)
         return Response({'success': True, 'data': serializer.data})
 
+class DailyReportView(APIView):
+    permission_classes = [AllowAny]
+    def get(self, request):
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 366)
+        except ValueError:
+            return Response({'success': False, 'error': 'days must be an integer'}, status=400)
+        data = AnalyticsService.get_daily_report(days=days)
+        if 'error' in data: return Response(data, status=500)
+        serializer = DailyReportSerializer(data)
+        return Response({'success': True, 'data': serializer.data})
+
 class ActiveSessionsView(APIView):
     permission_classes = [AllowAny]
+    @conditional_get()
     def get(self, request):
         data = AnalyticsService.get_active_sessions()
         serializer = ActiveSessionSerializer(data, many=True)
@@ -64,3 +95,8 @@ class PaymentAnalyticsView(APIView):
     permission_classes = [AllowAny]
     def get(self, request):
         return Response({'success': True, 'payments': []})
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+    def get(self, request):
+        return Response({'success': True, 'data': get_metrics()})
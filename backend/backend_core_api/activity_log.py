@@ -0,0 +1,118 @@
+"""
+Buffered writer for BookingActivityLog.
+
+Entries are queued with ``ActivityLogWriter.add()``. An entry is only kept
+once the transaction that produced it commits (``transaction.on_commit``),
+so a rolled-back cancellation leaves no log row behind. Committed entries
+are written with one ``bulk_create`` when the surrounding ``batch()`` ends
+(ActivityLogMiddleware wraps each request, the scheduler wraps each job) or
+when ACTIVITY_LOG_FLUSH_SIZE entries are waiting. Outside a batch they are written as
+soon as they commit.
+
+If the INSERT fails, the entries are appended as JSON lines to
+``settings.ACTIVITY_LOG_SPOOL``; ``manage.py replay_activity_spool`` loads
+them back later.
+"""
+from asgiref.local import Local
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from .models import BookingActivityLog
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+_state = Local()
+
+
+class ActivityLogWriter:
+    FIELDS = ('session_id', 'user_id', 'activity_type', 'description', 'metadata', 'created_at')
+
+    @staticmethod
+    def _pending():
+        if not hasattr(_state, 'pending'):
+            _state.pending = []
+            _state.depth = 0
+        return _state.pending
+
+    @staticmethod
+    def add(session, activity_type, description, user=None, metadata=None):
+        """Queue one entry; user defaults to the session's user"""
+        ActivityLogWriter.add_many([BookingActivityLog(
+            session=session,
+            user=user or session.user,
+            activity_type=activity_type,
+            description=description,
+            metadata=metadata or {},
+        )])
+
+    @staticmethod
+    def add_many(entries):
+        """Queue unsaved BookingActivityLog rows until the current transaction commits"""
+        if entries:
+            transaction.on_commit(lambda: ActivityLogWriter._committed(entries))
+
+    @staticmethod
+    def _committed(entries):
+        pending = ActivityLogWriter._pending()
+        pending.extend(entries)
+        if not _state.depth or len(pending) >= getattr(settings, 'ACTIVITY_LOG_FLUSH_SIZE', 500):
+            ActivityLogWriter.flush()
+
+    @staticmethod
+    def flush():
+        """Write all committed entries; spools them to disk if the INSERT fails"""
+        pending = ActivityLogWriter._pending()
+        if not pending:
+            return 0
+        entries, _state.pending = list(pending), []
+        try:
+            # Savepoint if a caller flushes inside a transaction, so a failure does not break it
+            with transaction.atomic():
+                BookingActivityLog.objects.bulk_create(entries)
+        except Exception as e:
+            logger.error(f"Failed to write {len(entries)} activity logs, spooling them: {str(e)}")
+            ActivityLogWriter.spool(entries)
+            return 0
+        logger.debug(f"Activity logged: {len(entries)} entries")
+        return len(entries)
+
+    @staticmethod
+    @contextmanager
+    def batch():
+        """Hold committed entries until the block ends, then write them together"""
+        ActivityLogWriter._pending()
+        _state.depth += 1
+        try:
+            yield
+        finally:
+            _state.depth -= 1
+            if not _state.depth:
+                ActivityLogWriter.flush()
+
+    @staticmethod
+    def spool_path():
+        return getattr(settings, 'ACTIVITY_LOG_SPOOL', os.path.join(settings.BASE_DIR, 'activity_log_spool.jsonl'))
+
+    @staticmethod
+    def spool(entries, path=None):
+        lines = ''.join(
+            json.dumps({field: getattr(entry, field) for field in ActivityLogWriter.FIELDS}, cls=DjangoJSONEncoder) + '\n'
+            for entry in entries
+        )
+        try:
+            # One append per batch; O_APPEND keeps concurrent writers' lines whole
+            with open(path or ActivityLogWriter.spool_path(), 'a', encoding='utf-8') as spool:
+                spool.write(lines)
+        except OSError as e:
+            logger.error(f"Could not spool {len(entries)} activity logs, they are lost: {str(e)}")
+
+    @staticmethod
+    def from_spool(line):
+        record = json.loads(line)
+        record['created_at'] = parse_datetime(record['created_at'])
+        return BookingActivityLog(**record)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Slot, Attendance, Zone, ParkingSession, Payment, Vehicle, Dispute, Schedule, ShiftLog, Feedback, BookingActivityLog
+from .models import User, Slot, Attendance, Zone, ParkingSession, Payment, Vehicle, Dispute, Schedule, ShiftLog, Feedback, BookingActivityLog, SMSOutbox, JobLease, OccupancyEvent
 
 @admin.register(Slot)
 class SlotAdmin(admin.ModelAdmin):
@@ -21,9 +21,10 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(Zone)
 class ZoneAdmin(admin.ModelAdmin):
-    list_display = ('name', 'total_slots', 'base_price', 'is_active', 'created_at')
+    list_display = ('name', 'total_slots', 'occupied_count', 'reserved_count', 'base_price', 'is_active', 'created_at')
     list_filter = ('is_active',)
     search_fields = ('name',)
+    readonly_fields = ('occupied_count', 'reserved_count')
 
 @admin.register(ParkingSession)
 class ParkingSessionAdmin(admin.ModelAdmin):
@@ -81,3 +82,18 @@ class BookingActivityLogAdmin(admin.ModelAdmin):
         return obj.session.vehicle_number
     vehicle_number_display.short_description = 'Vehicle Number'
 
+@admin.register(SMSOutbox)
+class SMSOutboxAdmin(admin.ModelAdmin):
+    list_display = ('mobile_numbers', 'provider', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'provider')
+    search_fields = ('mobile_numbers', 'message')
+
+@admin.register(JobLease)
+class JobLeaseAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'expires_at', 'last_finished_at', 'last_duration', 'run_count', 'failure_count')
+    readonly_fields = ('last_started_at', 'last_finished_at', 'last_duration', 'run_count', 'failure_count', 'last_error')
+
+@admin.register(OccupancyEvent)
+class OccupancyEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'zone_id', 'created_at')
+    list_filter = ('event_type',)
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class BackendCoreApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend_core_api'
+
+    def ready(self):
+        # Keep the free-slot index in step with Slot writes
+        from . import slot_index  # noqa: F401
+        # Move zone counters on slot saves/deletes outside SlotStateService
+        from . import zone_counters  # noqa: F401
+        # Record session lifecycle events for the occupancy stream
+        from . import events  # noqa: F401
+        # Bump the ETag version of polled endpoints on writes
+        from . import versioning  # noqa: F401
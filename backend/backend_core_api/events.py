@@ -0,0 +1,181 @@
+"""
+Occupancy event feed for staff screens.
+
+Slot transitions and session status changes append rows to OccupancyEvent
+inside the transaction that makes the change, so an event exists exactly
+when its change has committed. ``/api/core/events/`` streams them as
+Server-Sent Events; the event id is the row id, so a reconnecting
+EventSource resumes from its ``Last-Event-ID``. A client that has fallen
+behind the retention window gets a ``resync`` event and reloads over REST.
+
+Ids are handed out at insert time but become visible at commit, so a long
+transaction can commit a lower id after a higher one was streamed. ``fetch``
+therefore stops at the first missing id until the row after it is older than
+OCCUPANCY_EVENTS_GAP_SECONDS; only then is the id taken as rolled back.
+
+EventSource cannot send an Authorization header, so staff screens first
+POST to ``/api/core/events/ticket/`` for a signed ticket that only opens
+this stream and expires after ``TICKET_SECONDS``. The JWT itself never
+goes into a URL.
+
+Each open stream costs one indexed ``id > last_id`` query per poll interval,
+which returns no rows while nothing changes.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from datetime import timedelta
+from .models import OccupancyEvent, ParkingSession, User
+from .versioning import DataVersion
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OccupancyEventService:
+    BATCH_SIZE = 200
+    HEARTBEAT_SECONDS = 15
+    TICKET_SALT = 'backend_core_api.events.ticket'
+    TICKET_SECONDS = 60  # Only checked when the stream opens
+
+    @staticmethod
+    def issue_ticket(user):
+        """Signed, short-lived ticket that lets this user open the event stream"""
+        return signing.dumps({'user_id': user.pk}, salt=OccupancyEventService.TICKET_SALT)
+
+    @staticmethod
+    def staff_from_ticket(ticket):
+        """Staff/admin user a valid, unexpired ticket was issued to, or None"""
+        if not ticket:
+            return None
+        try:
+            data = signing.loads(ticket, salt=OccupancyEventService.TICKET_SALT, max_age=OccupancyEventService.TICKET_SECONDS)
+        except signing.BadSignature:  # Includes SignatureExpired
+            return None
+        user = User.objects.filter(pk=data.get('user_id'), is_active=True).first()
+        return user if user and (user.role in ('STAFF', 'ADMIN') or user.is_staff) else None
+
+    @staticmethod
+    def zone_event(slot, occupied_delta=0, reserved_delta=0):
+        """Unsaved event for a slot that changed state; slot carries the new flags"""
+        return OccupancyEvent(event_type='zone', zone_id=slot.zone_id, payload={
+            'zone_id': slot.zone_id,
+            'occupied_delta': occupied_delta,
+            'reserved_delta': reserved_delta,
+            'slot': {
+                'id': slot.id,
+                'slot_number': slot.slot_number,
+                'is_occupied': slot.is_occupied,
+                'is_reserved': slot.is_reserved,
+            },
+        })
+
+    @staticmethod
+    def session_event(session):
+        return OccupancyEvent(event_type='session', zone_id=session.zone_id, payload={
+            'session_id': session.id,
+            'status': session.status,
+            'zone_id': session.zone_id,
+            'slot_id': session.slot_id,
+            'vehicle_number': session.vehicle_number,
+            'payment_status': session.payment_status,
+        })
+
+    @staticmethod
+    def record(events):
+        if events:
+            OccupancyEvent.objects.bulk_create(events)
+            # Bulk paths skip post_save, so move the ETag version here too
+            transaction.on_commit(DataVersion.bump)
+
+    @staticmethod
+    def prune():
+        """Drop events older than OCCUPANCY_EVENTS_RETENTION_HOURS"""
+        hours = getattr(settings, 'OCCUPANCY_EVENTS_RETENTION_HOURS', 24)
+        deleted, _ = OccupancyEvent.objects.filter(created_at__lt=timezone.now() - timedelta(hours=hours)).delete()
+        return deleted
+
+    @staticmethod
+    def latest_id():
+        return OccupancyEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    @staticmethod
+    def is_behind(last_id):
+        """
+        True when events after last_id may already have been pruned.
+
+        prune() is the only thing that deletes events and it goes oldest
+        first, so while the client's last event is still stored nothing
+        after it is gone. Id gaps left by rolled-back inserts do not count.
+        """
+        if OccupancyEvent.objects.filter(id=last_id).exists():
+            return False
+        oldest = OccupancyEvent.objects.order_by('id').values_list('id', flat=True).first()
+        return oldest is not None and oldest > last_id + 1
+
+    @staticmethod
+    def fetch(last_id, include_sessions):
+        """
+        Events after last_id up to the first id that may still be in flight,
+        and the id the caller has now read up to
+        """
+        gap_seconds = getattr(settings, 'OCCUPANCY_EVENTS_GAP_SECONDS', 30)
+        gap_expired_before = timezone.now() - timedelta(seconds=gap_seconds)
+        read_up_to = last_id
+        events = []
+        for event in OccupancyEvent.objects.filter(id__gt=last_id).order_by('id')[:OccupancyEventService.BATCH_SIZE]:
+            # The missing id was inserted before this row, so its transaction is at least this old
+            if event.id != read_up_to + 1 and event.created_at > gap_expired_before:
+                break
+            events.append(event)
+            read_up_to = event.id
+        if not include_sessions:
+            events = [event for event in events if event.event_type != 'session']
+        return events, read_up_to
+
+    @staticmethod
+    def format(event_id, event_type, data):
+        return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+    @staticmethod
+    async def stream(last_id, include_sessions):
+        """Async generator of SSE frames; runs until the client disconnects"""
+        poll = getattr(settings, 'OCCUPANCY_EVENTS_POLL_SECONDS', 1)
+        yield 'retry: 3000\n\n'
+
+        if last_id is None:
+            last_id = await sync_to_async(OccupancyEventService.latest_id)()
+        elif await sync_to_async(OccupancyEventService.is_behind)(last_id):
+            last_id = await sync_to_async(OccupancyEventService.latest_id)()
+            yield OccupancyEventService.format(last_id, 'resync', {})
+
+        idle = 0
+        while True:
+            events, last_id = await sync_to_async(OccupancyEventService.fetch)(last_id, include_sessions)
+            for event in events:
+                yield OccupancyEventService.format(event.id, event.event_type, event.payload)
+
+            idle = 0 if events else idle + poll
+            if idle >= OccupancyEventService.HEARTBEAT_SECONDS:
+                idle = 0
+                yield ': ping\n\n'  # Keeps proxies from closing an idle stream
+            await asyncio.sleep(poll)
+
+
+@receiver(post_init, sender=ParkingSession)
+def remember_session_status(sender, instance, **kwargs):
+    # __dict__ so that deferred loads never trigger a query
+    instance._event_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=ParkingSession)
+def record_session_event(sender, instance, created, **kwargs):
+    if created or instance.status != instance._event_status:
+        OccupancyEventService.record([OccupancyEventService.session_event(instance)])
+        instance._event_status = instance.status
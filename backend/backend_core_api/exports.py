@@ -0,0 +1,155 @@
+"""
+Streaming CSV / NDJSON exports of sessions, payments and activity logs.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` (a
+server-side cursor on PostgreSQL), formatted and handed to
+StreamingHttpResponse a batch at a time, so memory stays flat and the
+first bytes leave before the query has finished. No COUNT is run.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from .models import ParkingSession, Payment, BookingActivityLog
+import csv
+import io
+import json
+import zlib
+
+CHUNK_SIZE = 2000  # Rows fetched per round trip
+ROWS_PER_WRITE = 500  # Rows formatted into one chunk of the response
+
+# dataset -> (model, date field, [(column, field)])
+DATASETS = {
+    'sessions': (ParkingSession, 'entry_time', [
+        ('id', 'id'),
+        ('vehicle_number', 'vehicle_number'),
+        ('zone', 'zone__name'),
+        ('slot', 'slot__slot_number'),
+        ('status', 'status'),
+        ('entry_time', 'entry_time'),
+        ('exit_time', 'exit_time'),
+        ('initial_amount_paid', 'initial_amount_paid'),
+        ('final_amount_paid', 'final_amount_paid'),
+        ('total_amount_paid', 'total_amount_paid'),
+        ('payment_method', 'payment_method'),
+        ('payment_status', 'payment_status'),
+        ('cancellation_type', 'cancellation_type'),
+        ('cancelled_at', 'cancelled_at'),
+        ('refund_amount', 'refund_amount'),
+        ('refund_status', 'refund_status'),
+    ]),
+    'payments': (Payment, 'created_at', [
+        ('id', 'id'),
+        ('transaction_id', 'transaction_id'),
+        ('session_id', 'session_id'),
+        ('vehicle_number', 'session__vehicle_number'),
+        ('zone', 'session__zone__name'),
+        ('amount', 'amount'),
+        ('payment_method', 'payment_method'),
+        ('payment_type', 'payment_type'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+    ]),
+    'activity-logs': (BookingActivityLog, 'created_at', [
+        ('id', 'id'),
+        ('session_id', 'session_id'),
+        ('vehicle_number', 'session__vehicle_number'),
+        ('user', 'user__username'),
+        ('activity_type', 'activity_type'),
+        ('description', 'description'),
+        ('metadata', 'metadata'),
+        ('created_at', 'created_at'),
+    ]),
+}
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class ExportService:
+    @staticmethod
+    def rows(dataset, from_date=None, to_date=None):
+        """Lazy tuples of the dataset, filtered on local days [from_date, to_date]"""
+        model, date_field, columns = DATASETS[dataset]
+        tz = timezone.get_current_timezone()
+        queryset = model.objects.all()
+        if from_date:
+            queryset = queryset.filter(**{f'{date_field}__gte': timezone.make_aware(datetime.combine(from_date, time.min), tz)})
+        if to_date:
+            end = timezone.make_aware(datetime.combine(to_date + timedelta(days=1), time.min), tz)
+            queryset = queryset.filter(**{f'{date_field}__lt': end})
+        fields = [field for _, field in columns]
+        return queryset.order_by('id').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, datetime):
+            return timezone.localtime(value).isoformat()
+        return value
+
+    @staticmethod
+    def csv_chunks(columns, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for count, row in enumerate(rows, 1):
+            writer.writerow([
+                json.dumps(value) if isinstance(value, dict) else ExportService._value(value)
+                for value in row
+            ])
+            if count % ROWS_PER_WRITE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    @staticmethod
+    def ndjson_chunks(columns, rows):
+        lines = []
+        for row in rows:
+            record = dict(zip(columns, (ExportService._value(value) for value in row)))
+            lines.append(json.dumps(record, cls=DjangoJSONEncoder))
+            if len(lines) == ROWS_PER_WRITE:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def gzip_chunks(chunks):
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @staticmethod
+    def chunks(dataset, file_format, from_date=None, to_date=None, compress=False):
+        """Encoded response chunks of the export"""
+        columns = [column for column, _ in DATASETS[dataset][2]]
+        rows = ExportService.rows(dataset, from_date, to_date)
+        formatter = ExportService.csv_chunks if file_format == 'csv' else ExportService.ndjson_chunks
+        chunks = (chunk.encode() for chunk in formatter(columns, rows))
+        return ExportService.gzip_chunks(chunks) if compress else chunks
+
+    @staticmethod
+    def streaming_content(request, chunks):
+        """
+        Hand ASGI servers an async iterator; Django would otherwise read a
+        sync iterator into memory before sending it. The cursor stays on
+        the request's sync thread.
+        """
+        if not isinstance(request, ASGIRequest):
+            return chunks
+
+        async def pull():
+            while True:
+                chunk = await sync_to_async(next, thread_sensitive=True)(chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        return pull()
@@ -0,0 +1,145 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+from backend_core_api.models import ParkingSession, Zone
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed ParkingSession rows and compare query plans and timings of the hot '
+        'session predicates with and without the indexes that serve them. '
+        'Everything runs in one transaction that is rolled back; use a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Number of sessions to seed')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+
+        with transaction.atomic():
+            self.seed(options['rows'], options['batch_size'])
+            self.analyze()
+
+            queries = self.hot_queries()
+            with_indexes = self.measure(queries, options['repeat'])
+
+            with connection.cursor() as cursor:
+                for name in self.predicate_indexes():
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+            self.analyze()
+            without_indexes = self.measure(queries, options['repeat'])
+
+            self.report(queries, with_indexes, without_indexes)
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, seeded rows and dropped indexes rolled back'))
+
+    def seed(self, rows, batch_size):
+        self.stdout.write(f'Seeding {rows} sessions...')
+        started = time.perf_counter()
+        now = timezone.now()
+        zone = Zone.objects.create(name='Benchmark Zone', total_slots=0)
+        first_id = (ParkingSession.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+
+        # Roughly a year of history: mostly completed, a few open and cancelled
+        statuses = ['completed'] * 90 + ['cancelled'] * 5 + ['reserved'] * 3 + ['active'] * 2
+        batch = []
+        for i in range(rows):
+            status = random.choice(statuses)
+            # entry_time is auto_now_add, so seed an anchor column and derive entry_time below
+            started_at = now - timedelta(minutes=random.randint(0, 365 * 24 * 60))
+            plate = f'MH{random.randint(1, 50):02d}AB{i:06d}'
+            session = ParkingSession(
+                vehicle_number=plate,
+                vehicle_plate=plate,  # bulk_create skips save()
+                zone=zone,
+                status=status,
+            )
+            if status == 'completed':
+                session.exit_time = started_at + timedelta(hours=2)
+            elif status == 'cancelled':
+                session.cancelled_at = started_at + timedelta(hours=2)
+            elif status == 'reserved':
+                session.booking_expiry_time = now + timedelta(minutes=random.randint(-600, 1440))
+            batch.append(session)
+
+            if len(batch) >= batch_size:
+                ParkingSession.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            ParkingSession.objects.bulk_create(batch)
+
+        seeded = ParkingSession.objects.filter(id__gte=first_id)
+        seeded.filter(status='completed').update(entry_time=F('exit_time') - timedelta(hours=2))
+        seeded.filter(status='cancelled').update(entry_time=F('cancelled_at') - timedelta(hours=2))
+        seeded.filter(status='reserved').update(entry_time=F('booking_expiry_time') - timedelta(hours=24))
+
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+    def predicate_indexes(self):
+        """
+        Names of the secondary indexes on the columns the hot queries filter
+        on: the Meta indexes as well as field-level ones (db_index, and the
+        LIKE-pattern twins PostgreSQL adds to them), so the baseline is a
+        plain table scan.
+        """
+        columns = {
+            ParkingSession._meta.get_field(name).column
+            for name in ('vehicle_plate', 'status', 'booking_expiry_time', 'entry_time', 'exit_time', 'cancelled_at')
+        }
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, ParkingSession._meta.db_table)
+        return sorted(
+            name for name, constraint in constraints.items()
+            if constraint['index'] and not constraint['primary_key'] and not constraint['unique']
+            and columns.intersection(constraint['columns'] or ())
+        )
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(ParkingSession._meta.db_table)}')
+
+    def hot_queries(self):
+        now = timezone.now()
+        today_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        sample_plate = ParkingSession.objects.filter(status='active').values_list('vehicle_plate', flat=True).first() or ''
+        return [
+            ('active session by plate', ParkingSession.objects.filter(vehicle_plate=sample_plate, status='active')),
+            ('expired reservations', ParkingSession.objects.filter(status='reserved', booking_expiry_time__lte=now)),
+            ('entered today', ParkingSession.objects.filter(entry_time__gte=today_start)),
+            ('completed today', ParkingSession.objects.filter(status='completed', exit_time__gte=today_start)),
+            ('cancelled this week', ParkingSession.objects.filter(status='cancelled', cancelled_at__gte=now - timedelta(days=7))),
+        ]
+
+    def measure(self, queries, repeat):
+        results = []
+        for name, queryset in queries:
+            plan = queryset.explain()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                len(list(queryset.values_list('id', flat=True)))
+                timings.append((time.perf_counter() - started) * 1000)
+            results.append({'plan': plan, 'ms': sorted(timings)[len(timings) // 2]})
+        return results
+
+    def report(self, queries, with_indexes, without_indexes):
+        for (name, _), indexed, plain in zip(queries, with_indexes, without_indexes):
+            speedup = plain['ms'] / indexed['ms'] if indexed['ms'] else 0
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{name}'))
+            self.stdout.write(f'  without indexes: {plain["ms"]:.2f} ms (median)')
+            self.stdout.write(f'  with indexes:    {indexed["ms"]:.2f} ms (median), {speedup:.1f}x')
+            self.stdout.write('  plan without indexes:')
+            for line in plain['plan'].splitlines():
+                self.stdout.write(f'    {line}')
+            self.stdout.write('  plan with indexes:')
+            for line in indexed['plan'].splitlines():
+                self.stdout.write(f'    {line}')
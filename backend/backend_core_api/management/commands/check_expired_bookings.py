@@ -1,23 +1,77 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from backend_core_api.services import CancellationService
+from backend_core_api.activity_log import ActivityLogWriter
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = 'Check for expired bookings and send expiry warnings'
+    help = 'Check for expired bookings and send expiry warnings (--daemon keeps running all periodic jobs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Sessions handled per transaction')
+        parser.add_argument('--daemon', action='store_true', help='Run the periodic jobs on their SCHEDULER_INTERVALS until stopped')
 
     def handle(self, *args, **options):
+        if options['daemon']:
+            return self.run_daemon(options['batch_size'])
+
+        with ActivityLogWriter.batch():
+            self.run_once(options['batch_size'])
+
+    def run_once(self, batch_size):
         self.stdout.write(self.style.SUCCESS(f'Starting expired bookings check at {timezone.now()}'))
         
         # Send expiry warnings for bookings expiring soon
-        warning_count = CancellationService.send_expiry_warnings()
-        self.stdout.write(self.style.SUCCESS(f'Sent {warning_count} expiry warning SMS'))
+        started = time.perf_counter()
+        warning_count = CancellationService.send_expiry_warnings(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Sent {warning_count} expiry warning SMS {self.throughput(warning_count, started)}'))
         
         # Auto-cancel expired bookings
-        cancelled_count = CancellationService.check_expired_bookings()
-        self.stdout.write(self.style.SUCCESS(f'Auto-cancelled {cancelled_count} expired bookings'))
+        started = time.perf_counter()
+        cancelled_count = CancellationService.check_expired_bookings(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Auto-cancelled {cancelled_count} expired bookings {self.throughput(cancelled_count, started)}'))
         
         self.stdout.write(self.style.SUCCESS('Expired bookings check completed'))
+
+    def throughput(self, count, started):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        return f'in {elapsed:.2f}s ({rate:.0f}/s)'
+
+    def run_daemon(self, batch_size):
+        from backend_core_api.scheduler import Job, Scheduler
+        from backend_core_api.sms_outbox import SMSOutboxWorker
+        from backend_core_api.events import OccupancyEventService
+        from backend_core_api.zone_counters import reconcile
+        from backend_analytics_api.rollups import RollupService
+
+        sms_worker = SMSOutboxWorker()
+        tasks = {
+            'expiry_warnings': lambda: CancellationService.send_expiry_warnings(batch_size=batch_size),
+            'expired_bookings': lambda: CancellationService.check_expired_bookings(batch_size=batch_size),
+            'sms_outbox': sms_worker.drain,
+            'analytics_rollups': RollupService.run,
+            'prune_occupancy_events': OccupancyEventService.prune,
+            'reconcile_zone_counters': reconcile,
+        }
+        intervals = getattr(settings, 'SCHEDULER_INTERVALS', {})
+        jobs = [Job(name, intervals[name], func) for name, func in tasks.items() if intervals.get(name)]
+
+        scheduler = Scheduler(jobs)
+        scheduler.install_signal_handlers()
+        try:
+            metrics = scheduler.run()
+        finally:
+            sms_worker.shutdown()
+
+        for name, job_metrics in metrics.items():
+            self.stdout.write(
+                f"{name}: {job_metrics['runs']} runs ({job_metrics['skipped']} skipped, {job_metrics['failures']} failed), "
+                f"avg {job_metrics['avg_duration']}s, max {job_metrics['max_duration']}s"
+            )
+        self.stdout.write(self.style.SUCCESS('Scheduler stopped'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from backend_core_api.sms_outbox import SMSOutboxWorker
+import time
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued SMS from SMSOutbox with retries (runs until stopped unless --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain what is due and exit')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--batch-size', type=int, default=50, help='Rows claimed per provider at a time')
+
+    def handle(self, *args, **options):
+        worker = SMSOutboxWorker(batch_size=options['batch_size'])
+        try:
+            while True:
+                sent, failed = worker.drain()
+                if sent or failed:
+                    self.stdout.write(f'Delivered {sent} SMS, {failed} failed attempts')
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.shutdown()
+        self.stdout.write(self.style.SUCCESS('SMS outbox worker stopped'))
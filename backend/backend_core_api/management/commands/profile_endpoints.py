@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from backend_core_api.models import User
+from backend_core_api.perf import recorder
+
+DEFAULT_URLS = [
+    '/api/core/zones/',
+    '/api/core/users/',
+    '/api/core/schedules/',
+    '/api/core/sessions/?status=active,reserved',
+    '/api/core/sessions/activity-logs/',
+    '/api/core/shift-logs/',
+    '/api/dashboard/',
+    '/api/analytics/dashboard/',
+    '/api/analytics/zones/',
+    '/api/analytics/revenue/',
+]
+
+
+class Command(BaseCommand):
+    help = 'Call read endpoints in-process and print query counts and latency percentiles per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*', help='Paths to GET (defaults to the main read endpoints)')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per URL')
+        parser.add_argument('--user', help='Username to authenticate as (defaults to the first superuser)')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.filter(is_superuser=True)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError('No user to authenticate as; pass --user')
+
+        recorder.reset()
+        # The test client sends no If-None-Match, so conditional GETs still do the full work.
+        # Its handler loads the middleware on the first request, so PerfMiddleware is on whatever the settings say.
+        with override_settings(ALLOWED_HOSTS=['*'], PERF_INSTRUMENTATION=True):
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+            for url in options['urls'] or DEFAULT_URLS:
+                for _ in range(options['repeat']):
+                    response = client.get(url)
+                if response.status_code >= 400:
+                    self.stderr.write(f'{url}: HTTP {response.status_code}')
+
+        self.stdout.write(f"{'endpoint':<60} {'reqs':>5} {'queries p50/max':>16} {'db ms p95':>10} {'serialize p95':>14} {'render p95':>11} {'total p50/p95':>15}")
+        for entry in recorder.report():
+            self.stdout.write(
+                f"{entry['endpoint'][:60]:<60} {entry['requests']:>5} "
+                f"{entry['queries']['p50']:>7.0f}/{entry['queries']['max']:<8.0f} "
+                f"{entry['db_ms']['p95']:>10.1f} {entry['serialize_ms']['p95']:>14.1f} {entry['render_ms']['p95']:>11.1f} "
+                f"{entry['total_ms']['p50']:>7.1f}/{entry['total_ms']['p95']:<7.1f}"
+            )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from backend_core_api.services import ShiftService
+from datetime import date, timedelta
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild ShiftLog revenue/cash/online totals from successful payments (Payment.collected_by). '
+        'Days up to the one collected_by was added on, and days still receiving buffered scans, are refused.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-date', help='First local day (YYYY-MM-DD), defaults to yesterday')
+        parser.add_argument('--to-date', help='Last local day (YYYY-MM-DD), defaults to --from-date')
+        parser.add_argument('--staff', type=int, help='Only this staff user id')
+
+    def handle(self, *args, **options):
+        try:
+            from_date = date.fromisoformat(options['from_date']) if options['from_date'] else timezone.localdate() - timedelta(days=1)
+            to_date = date.fromisoformat(options['to_date']) if options['to_date'] else from_date
+        except ValueError:
+            raise CommandError('Dates must be YYYY-MM-DD')
+
+        try:
+            written = ShiftService.recompute(from_date, to_date, staff_id=options['staff'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt totals of {written} shift(s) from {from_date} to {to_date}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from backend_core_api.zone_counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Repair Zone.occupied_count / reserved_count drift against the Slot rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        drifted = reconcile(dry_run=options['dry_run'])
+        for zone, (occupied, reserved), (num_occupied, num_reserved) in drifted:
+            self.stdout.write(f'{zone.name}: occupied {occupied} -> {num_occupied}, reserved {reserved} -> {num_reserved}')
+
+        action = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'{action} counter drift in {len(drifted)} zones'))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from backend_core_api.activity_log import ActivityLogWriter
+from backend_core_api.models import BookingActivityLog, ParkingSession
+import glob
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Load activity logs spooled to disk after failed writes back into BookingActivityLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Spool file (defaults to settings.ACTIVITY_LOG_SPOOL)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        path = options['path'] or ActivityLogWriter.spool_path()
+        # Files left by runs that failed before finishing come first
+        files = sorted(glob.glob(f'{glob.escape(path)}.replaying-*'))
+        if os.path.exists(path):
+            # Take the file away from writers first; new failures start a fresh spool
+            replaying = f'{path}.replaying-{time.time_ns()}'
+            os.replace(path, replaying)
+            files.append(replaying)
+        if not files:
+            self.stdout.write('Nothing to replay')
+            return
+
+        loaded = sum(self.replay(replaying, path, options['batch_size']) for replaying in files)
+        self.stdout.write(self.style.SUCCESS(f'Replayed {loaded} activity logs'))
+
+    def replay(self, replaying, path, batch_size):
+        """Load one claimed file; if this raises, the file stays for the next run"""
+        with open(replaying, encoding='utf-8') as spool:
+            entries = [ActivityLogWriter.from_spool(line) for line in spool if line.strip()]
+
+        existing = set(ParkingSession.objects.filter(id__in={e.session_id for e in entries}).values_list('id', flat=True))
+        orphans = [e for e in entries if e.session_id not in existing]
+        entries = [e for e in entries if e.session_id in existing]
+
+        loaded = 0
+        for start in range(0, len(entries), batch_size):
+            try:
+                BookingActivityLog.objects.bulk_create(entries[start:start + batch_size])
+            except Exception as e:
+                # Keep what is left for the next run
+                ActivityLogWriter.spool(entries[start:], path)
+                self.stderr.write(f'Replay stopped after {loaded} rows: {e}')
+                break
+            loaded += len(entries[start:start + batch_size])
+
+        os.remove(replaying)
+        if orphans:
+            self.stderr.write(f'Dropped {len(orphans)} rows whose session no longer exists')
+        return loaded
@@ -0,0 +1,12 @@
+from .activity_log import ActivityLogWriter
+
+
+class ActivityLogMiddleware:
+    """Writes the activity logs a request produced in one INSERT once it is done"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ActivityLogWriter.batch():
+            return self.get_response(request)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:03
+
+from django.db import migrations, models
+
+
+def backfill_zone_counters(apps, schema_editor):
+    Zone = apps.get_model('backend_core_api', 'Zone')
+    Slot = apps.get_model('backend_core_api', 'Slot')
+    for zone in Zone.objects.all():
+        active_slots = Slot.objects.filter(zone=zone, is_active=True)
+        zone.occupied_count = active_slots.filter(is_occupied=True).count()
+        zone.reserved_count = active_slots.filter(is_reserved=True).count()
+        zone.save(update_fields=['occupied_count', 'reserved_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_core_api', '0013_user_plain_password'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='occupied_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='reserved_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_zone_counters, migrations.RunPython.noop),
+    ]
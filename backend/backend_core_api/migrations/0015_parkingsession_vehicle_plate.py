@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:05
+
+import re
+
+from django.db import migrations, models
+
+
+def backfill_vehicle_plate(apps, schema_editor):
+    ParkingSession = apps.get_model('backend_core_api', 'ParkingSession')
+    batch = []
+    for session in ParkingSession.objects.only('id', 'vehicle_number').iterator(chunk_size=2000):
+        session.vehicle_plate = re.sub(r'[^A-Z0-9]', '', (session.vehicle_number or '').upper())
+        batch.append(session)
+        if len(batch) >= 2000:
+            ParkingSession.objects.bulk_update(batch, ['vehicle_plate'])
+            batch = []
+    if batch:
+        ParkingSession.objects.bulk_update(batch, ['vehicle_plate'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_core_api', '0014_zone_occupied_count_zone_reserved_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingsession',
+            name='vehicle_plate',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_vehicle_plate, migrations.RunPython.noop),
+    ]
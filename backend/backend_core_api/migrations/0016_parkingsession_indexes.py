@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_core_api', '0015_parkingsession_vehicle_plate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['vehicle_plate'], name='session_active_plate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(condition=models.Q(('status', 'reserved')), fields=['booking_expiry_time'], name='session_reserved_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(fields=['entry_time', 'id'], name='session_entry_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(fields=['status', 'entry_time'], name='session_status_entry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['exit_time'], name='session_completed_exit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(condition=models.Q(('status', 'cancelled')), fields=['cancelled_at'], name='session_cancelled_at_idx'),
+        ),
+    ]
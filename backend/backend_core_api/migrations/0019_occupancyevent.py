@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_core_api', '0018_joblease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('zone', 'Zone Occupancy'), ('session', 'Session Lifecycle')], max_length=10)),
+                ('zone_id', models.BigIntegerField(blank=True, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Occupancy Event',
+                'verbose_name_plural': 'Occupancy Events',
+                'ordering': ['id'],
+            },
+        ),
+    ]
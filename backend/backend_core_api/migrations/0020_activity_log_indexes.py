@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_core_api', '0019_occupancyevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookingactivitylog',
+            index=models.Index(fields=['created_at', 'id'], name='activity_log_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingactivitylog',
+            index=models.Index(fields=['activity_type', 'created_at'], name='activity_log_type_created_idx'),
+        ),
+    ]
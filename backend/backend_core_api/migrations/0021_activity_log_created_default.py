@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_core_api', '0020_activity_log_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookingactivitylog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
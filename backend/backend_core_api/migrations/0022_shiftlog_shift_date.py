@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def merge_shift_logs(apps, schema_editor):
+    """Set shift_date and fold same-day duplicates into the earliest log of each staff member"""
+    ShiftLog = apps.get_model('backend_core_api', 'ShiftLog')
+    kept = {}
+    for log in ShiftLog.objects.order_by('shift_start', 'id').iterator(chunk_size=2000):
+        shift_date = timezone.localdate(log.shift_start)
+        first = kept.get((log.staff_id, shift_date))
+        if first is None:
+            log.shift_date = shift_date
+            log.save(update_fields=['shift_date'])
+            kept[(log.staff_id, shift_date)] = log
+            continue
+
+        for field in ('entry_count', 'exit_count', 'revenue_collected', 'cash_collected', 'online_collected'):
+            setattr(first, field, getattr(first, field) + getattr(log, field))
+        if log.shift_end and (first.shift_end is None or log.shift_end > first.shift_end):
+            first.shift_end = log.shift_end
+        if log.notes:
+            first.notes = f"{first.notes}\n{log.notes}" if first.notes else log.notes
+        first.save()
+        log.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_core_api', '0021_activity_log_created_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shiftlog',
+            name='shift_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(merge_shift_logs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0022 so PostgreSQL does not ALTER a table with pending trigger events from the merge
+
+    dependencies = [
+        ('backend_core_api', '0022_shiftlog_shift_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shiftlog',
+            name='shift_date',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='shiftlog',
+            constraint=models.UniqueConstraint(fields=('staff', 'shift_date'), name='shift_log_staff_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend_core_api', '0024_payment_collected_by'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parkingsession',
+            name='vehicle_plate',
+            field=models.CharField(default='', editable=False, max_length=20),
+        ),
+    ]
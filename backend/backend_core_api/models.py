@@ -1,7 +1,16 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Count, F, Q
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
+import re
+
+
+def normalize_vehicle_number(vehicle_number):
+    """Canonical plate: upper-case letters and digits only ('mh-12 ab 1234' -> 'MH12AB1234')"""
+    return re.sub(r'[^A-Z0-9]', '', str(vehicle_number or '').upper())
+
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -28,6 +37,17 @@ class Attendance(models.Model):
     def __str__(self):
         return f"{self.staff.username} - {self.entry_time}"
 
+class ZoneQuerySet(models.QuerySet):
+    def with_occupancy(self):
+        """Annotate occupied, reserved and available slot counts in a single aggregate query"""
+        active_slots = Q(slots__is_active=True)
+        return self.annotate(
+            num_occupied=Count('slots', filter=active_slots & Q(slots__is_occupied=True)),
+            num_reserved=Count('slots', filter=active_slots & Q(slots__is_reserved=True)),
+        ).annotate(
+            num_available=F('total_slots') - F('num_occupied') - F('num_reserved')
+        )
+
 class Zone(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
@@ -36,20 +56,34 @@ class Zone(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Live counters kept in step by SlotStateService and zone_counters.py (repair with reconcile_zone_counters)
+    occupied_count = models.IntegerField(default=0)
+    reserved_count = models.IntegerField(default=0)
+
+    objects = ZoneQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    # The properties below prefer exact with_occupancy() annotations and
+    # otherwise read the live counters, so they never query
     @property
     def available_slots(self):
+        if hasattr(self, 'num_available'):
+            return self.num_available
         return self.total_slots - self.occupied_slots - self.reserved_slots
 
     @property
     def occupied_slots(self):
-        return self.slots.filter(is_occupied=True, is_active=True).count()
+        if hasattr(self, 'num_occupied'):
+            return self.num_occupied
+        return self.occupied_count
 
     @property
     def reserved_slots(self):
-        return self.slots.filter(is_reserved=True, is_active=True).count()
+        if hasattr(self, 'num_reserved'):
+            return self.num_reserved
+        return self.reserved_count
 
 class Slot(models.Model):
     zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='slots')
@@ -86,6 +120,10 @@ class ParkingSession(models.Model):
     
     # Original fields
     vehicle_number = models.CharField(max_length=20)
+    # Normalized copy of vehicle_number used for plate lookups, set in save().
+    # Exact lookups are only made for active sessions and use session_active_plate_idx;
+    # substring searches cannot use a b-tree, so the column has no index of its own.
+    vehicle_plate = models.CharField(max_length=20, editable=False, default='')
     zone = models.ForeignKey(Zone, on_delete=models.CASCADE)
     entry_time = models.DateTimeField(auto_now_add=True)
     exit_time = models.DateTimeField(null=True, blank=True)
@@ -115,6 +153,21 @@ class ParkingSession(models.Model):
     # SMS notification tracking
     sms_notification_sent = models.BooleanField(default=False)
 
+    class Meta:
+        # Hot predicates; see the benchmark_session_indexes command
+        indexes = [
+            # Gate scans: open session by plate
+            models.Index(fields=['vehicle_plate'], condition=Q(status='active'), name='session_active_plate_idx'),
+            # check_expired_bookings and expiry warnings
+            models.Index(fields=['booking_expiry_time'], condition=Q(status='reserved'), name='session_reserved_expiry_idx'),
+            # Dashboard, peak hours, reports and cursor pagination
+            models.Index(fields=['entry_time', 'id'], name='session_entry_time_idx'),
+            models.Index(fields=['status', 'entry_time'], name='session_status_entry_idx'),
+            # Completed today / cancellation reports
+            models.Index(fields=['exit_time'], condition=Q(status='completed'), name='session_completed_exit_idx'),
+            models.Index(fields=['cancelled_at'], condition=Q(status='cancelled'), name='session_cancelled_at_idx'),
+        ]
+
     def __str__(self):
         return f"{self.vehicle_number} - {self.zone.name} ({self.status})"
 
@@ -131,6 +184,11 @@ class ParkingSession(models.Model):
             final = Decimal('0.00')
             
         self.total_amount_paid = initial + final
+        self.vehicle_plate = normalize_vehicle_number(self.vehicle_number)
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'vehicle_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'vehicle_plate'}
         
         # Set default expiry time for reserved bookings (24 hours)
         if not self.booking_expiry_time and self.status == 'reserved':
@@ -181,6 +239,17 @@ class ParkingSession(models.Model):
         else:
             return Decimal('0.00')
     
+    @staticmethod
+    def refund_expression(now):
+        """calculate_refund() as a SQL expression, for bulk cancellations of reserved bookings"""
+        from datetime import timedelta
+        return models.Case(
+            models.When(entry_time__gte=now - timedelta(minutes=30), then=F('initial_amount_paid')),
+            models.When(entry_time__gte=now - timedelta(hours=2), then=F('initial_amount_paid') * Decimal('0.50')),
+            default=models.Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+    
     def is_expiring_soon(self):
         """Check if booking will expire soon (within 2 hours)"""
         from django.utils import timezone
@@ -223,6 +292,7 @@ class Payment(models.Model):
     payment_type = models.CharField(max_length=10, choices=PAYMENT_TYPE_CHOICES, default='FULL')
     transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
     status = models.CharField(max_length=20, default='success')
+    collected_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='collected_payments')  # Staff at the gate; rebuilds shift totals
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -274,6 +344,7 @@ class Schedule(models.Model):
 class ShiftLog(models.Model):
     staff = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'STAFF'})
     shift_start = models.DateTimeField()
+    shift_date = models.DateField(editable=False)  # Local date of shift_start; one log per staff per day
     shift_end = models.DateTimeField(null=True, blank=True)
     entry_count = models.IntegerField(default=0)
     exit_count = models.IntegerField(default=0)
@@ -282,8 +353,18 @@ class ShiftLog(models.Model):
     online_collected = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['staff', 'shift_date'], name='shift_log_staff_date_uniq'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.shift_date is None and self.shift_start:
+            self.shift_date = timezone.localdate(self.shift_start)
+        super().save(*args, **kwargs)
+
     def __str__(self):
-        return f"{self.staff.username} Shift - {self.shift_start.date()}"
+        return f"{self.staff.username} Shift - {self.shift_date}"
 
 class Feedback(models.Model):
     session = models.OneToOneField(ParkingSession, on_delete=models.CASCADE, related_name='feedback')
@@ -310,12 +391,94 @@ class BookingActivityLog(models.Model):
     activity_type = models.CharField(max_length=30, choices=ACTIVITY_TYPE_CHOICES)
     description = models.TextField()
     metadata = models.JSONField(default=dict, blank=True)  # Store additional data like refund amount, extension hours, etc.
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now)  # Set when queued, not when the buffered insert runs
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Booking Activity Log'
         verbose_name_plural = 'Booking Activity Logs'
+        indexes = [
+            # Keyset pages of the monitoring endpoint, newest first (session and user FKs are indexed already)
+            models.Index(fields=['created_at', 'id'], name='activity_log_created_idx'),
+            models.Index(fields=['activity_type', 'created_at'], name='activity_log_type_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.activity_type} - {self.session.vehicle_number} at {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class SMSOutbox(models.Model):
+    """Outbound SMS waiting to be delivered by the process_sms_outbox worker"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    provider = models.CharField(max_length=20)
+    mobile_numbers = models.CharField(max_length=255)  # Comma-separated; one number per row for Twilio
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'SMS Outbox'
+        verbose_name_plural = 'SMS Outbox'
+        indexes = [
+            # Worker claim scan: due pending rows and expired claims
+            models.Index(fields=['provider', 'next_attempt_at'], condition=Q(status='pending'), name='sms_outbox_due_idx'),
+            models.Index(fields=['claimed_at'], condition=Q(status='sending'), name='sms_outbox_claimed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} to {self.mobile_numbers} ({self.status})"
+
+
+class JobLease(models.Model):
+    """Lease row that lets only one node at a time run a scheduled job (see scheduler.py)"""
+    name = models.CharField(max_length=50, unique=True)
+    owner = models.CharField(max_length=100, blank=True, default='')
+    expires_at = models.DateTimeField(default=timezone.now)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_duration = models.FloatField(null=True, blank=True)  # Seconds
+    run_count = models.IntegerField(default=0)
+    failure_count = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Job Lease'
+        verbose_name_plural = 'Job Leases'
+
+    def __str__(self):
+        return f"{self.name} ({self.owner or 'free'})"
+
+
+class OccupancyEvent(models.Model):
+    """Slot and session changes streamed to staff screens over /api/core/events/ (see events.py)"""
+    EVENT_TYPE_CHOICES = (
+        ('zone', 'Zone Occupancy'),
+        ('session', 'Session Lifecycle'),
+    )
+
+    event_type = models.CharField(max_length=10, choices=EVENT_TYPE_CHOICES)
+    zone_id = models.BigIntegerField(null=True, blank=True)  # Plain id so events outlive deleted zones
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Occupancy Event'
+        verbose_name_plural = 'Occupancy Events'
+
+    def __str__(self):
+        return f"{self.id} {self.event_type} zone {self.zone_id}"
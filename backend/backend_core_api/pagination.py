@@ -0,0 +1,43 @@
+from django.db import connections
+from rest_framework.pagination import CursorPagination
+import json
+
+
+class SessionCursorPagination(CursorPagination):
+    """
+    Cursor pagination, newest first. The cursor holds the last entry_time
+    plus an offset past rows that share it; id only orders those ties.
+    """
+    ordering = ('-entry_time', '-id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class ActivityLogCursorPagination(CursorPagination):
+    """Cursor pagination on created_at (plus an offset for ties), newest first"""
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+def estimate_count(queryset, exact_below=10000):
+    """
+    Row count of a queryset, and whether it is an estimate.
+    On PostgreSQL the planner's row estimate is used once it reaches
+    exact_below; smaller results (and other databases) are counted exactly.
+    """
+    queryset = queryset.select_related(None).order_by()
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= exact_below:
+            return estimate, True
+    return queryset.count(), False
@@ -0,0 +1,208 @@
+"""
+Per-endpoint query count and latency instrumentation.
+
+PerfMiddleware wraps every request in ``connection.execute_wrapper`` to
+count SQL statements and time spent in the database. It also splits out two
+phases of DRF views:
+
+- ``serialize_ms``: evaluating serializer ``.data``, timed by wrapping
+  ``BaseSerializer.data``. It runs inside the view and includes the queries
+  it triggers, which is where lazy relations show up. Nested serializers
+  count once, and views that build plain dicts report 0.
+- ``render_ms``: encoding the response (DRF's JSON renderer), timed with a
+  post-render callback.
+
+The rest of ``total_ms`` is view logic, middleware and the framework. Samples are
+kept per endpoint, keyed on the URL route and DRF action, in a ring
+buffer of PERF_RING_SIZE entries per endpoint. ``/api/_perf/`` reports
+percentiles for admins; ``manage.py profile_endpoints`` drives endpoints
+in-process and prints the same report.
+
+Requests issuing more than PERF_QUERY_THRESHOLD statements are logged with
+their most repeated SQL, which is what an N+1 looks like.
+
+The buffer lives in the process, so each worker reports its own traffic.
+Nothing is wrapped unless PERF_INSTRUMENTATION is on: the middleware drops
+out of the stack and the serializer patch is never applied.
+"""
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from contextlib import ExitStack
+from rest_framework.serializers import BaseSerializer
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('queries', 'db_ms', 'serialize_ms', 'render_ms', 'total_ms')
+
+_serialize_timer = ContextVar('perf_serialize_timer', default=None)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0
+    rank = max(int(round(pct / 100 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class PerfRecorder:
+    def __init__(self, size=None):
+        self.size = size
+        self.samples = defaultdict(self._ring)
+        self.lock = threading.Lock()
+
+    def _ring(self):
+        return deque(maxlen=self.size or getattr(settings, 'PERF_RING_SIZE', 500))
+
+    def add(self, endpoint, sample):
+        with self.lock:
+            self.samples[endpoint].append(sample)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+    def report(self):
+        """Per-endpoint request count and p50/p95/p99/max of each metric, slowest p95 first"""
+        with self.lock:
+            samples = {endpoint: list(ring) for endpoint, ring in self.samples.items()}
+        report = []
+        for endpoint, rows in samples.items():
+            entry = {'endpoint': endpoint, 'requests': len(rows)}
+            for metric in METRICS:
+                values = sorted(row[metric] for row in rows)
+                entry[metric] = {
+                    'p50': round(percentile(values, 50), 2),
+                    'p95': round(percentile(values, 95), 2),
+                    'p99': round(percentile(values, 99), 2),
+                    'max': round(values[-1], 2),
+                }
+            report.append(entry)
+        return sorted(report, key=lambda entry: entry['total_ms']['p95'], reverse=True)
+
+
+recorder = PerfRecorder()
+
+
+class QueryCollector:
+    """execute_wrapper that counts statements and DB time; keeps the SQL when asked to"""
+
+    def __init__(self, keep_sql):
+        self.count = 0
+        self.seconds = 0.0
+        self.keep_sql = keep_sql
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            if self.keep_sql:
+                self.statements.append(sql)
+
+
+class SerializeTimer:
+    """Seconds spent in serializer .data during one request"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.depth = 0
+
+
+def instrument_serializers():
+    """Wrap BaseSerializer.data so the current request's SerializeTimer sees it; safe to call twice"""
+    original = BaseSerializer.data.fget
+    if getattr(original, 'perf_timed', False):
+        return
+
+    def data(serializer):
+        timer = _serialize_timer.get()
+        if timer is None:
+            return original(serializer)
+        timer.depth += 1
+        started = time.perf_counter()
+        try:
+            return original(serializer)
+        finally:
+            timer.depth -= 1
+            if not timer.depth:  # Serializers evaluated inside another one are already counted
+                timer.seconds += time.perf_counter() - started
+
+    data.perf_timed = True
+    BaseSerializer.data = property(data)
+
+
+def endpoint_name(request):
+    """'GET api/core/zones/ (list)' style key"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f"{request.method} <unresolved>"  # One bucket, so stray URLs cannot grow the buffer
+    route = (match.route or request.path).replace('^', '').replace('$', '')  # Router routes are regexes
+    actions = getattr(match.func, 'actions', None)  # DRF viewsets
+    action = actions.get(request.method.lower()) if actions else None
+    view = getattr(match.func, 'cls', None)
+    label = action or (view.__name__ if view else match.view_name)
+    return f"{request.method} {route} ({label})"
+
+
+class PerfMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'PERF_QUERY_THRESHOLD', 0)
+        instrument_serializers()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        collector = QueryCollector(keep_sql=bool(self.threshold))
+        request._perf_render_ms = 0.0
+        serialize_timer = SerializeTimer()
+        timer_token = _serialize_timer.set(serialize_timer)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(collector))
+                response = self.get_response(request)
+        finally:
+            _serialize_timer.reset(timer_token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        if getattr(response, 'streaming', False):
+            return response  # Long-lived streams would only skew the latencies
+
+        endpoint = endpoint_name(request)
+        recorder.add(endpoint, {
+            'queries': collector.count,
+            'db_ms': collector.seconds * 1000,
+            'serialize_ms': serialize_timer.seconds * 1000,
+            'render_ms': request._perf_render_ms,
+            'total_ms': total_ms,
+        })
+        if self.threshold and collector.count > self.threshold:
+            repeated = '\n'.join(
+                f"  {times}x {sql}" for sql, times in Counter(collector.statements).most_common(5)
+            )
+            logger.warning(
+                f"{endpoint} ran {collector.count} queries ({collector.seconds * 1000:.1f}ms in DB), "
+                f"threshold {self.threshold}. Most repeated:\n{repeated}"
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # Runs right before Django renders a DRF Response
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._perf_render_ms = (time.perf_counter() - started) * 1000
+        response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,141 @@
+"""
+In-process scheduler for the periodic maintenance jobs.
+
+``manage.py check_expired_bookings --daemon`` keeps one Django process alive
+and runs each job on its own interval instead of paying start-up cost on
+every cron tick. Several nodes may run the daemon: before each run a node
+takes the job's JobLease row with a conditional UPDATE, so one job never
+runs on two nodes at once. A finished run keeps the lease until the job is
+next due, so the other nodes skip it until then and the job runs about
+once per interval across the cluster, not once per node. A crashed node's
+lease simply expires.
+
+Runs are jittered so that nodes started together do not stay in lock-step.
+SIGTERM/SIGINT stop the loop once the job in progress has finished.
+"""
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from datetime import timedelta
+from .activity_log import ActivityLogWriter
+from .models import JobLease
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, name, interval, func, jitter=0.1):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.jitter = jitter
+        self.next_run = time.monotonic() + self.delay()
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+
+    def delay(self):
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def metrics(self):
+        return {
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'avg_duration': round(self.total_duration / self.runs, 3) if self.runs else 0,
+            'max_duration': round(self.max_duration, 3),
+        }
+
+
+class JobLeaseService:
+    @staticmethod
+    def acquire(name, owner, ttl):
+        """Take the job's lease if it is free, expired or already ours"""
+        now = timezone.now()
+        JobLease.objects.get_or_create(name=name, defaults={'expires_at': now})
+        return bool(
+            JobLease.objects.filter(name=name)
+            .filter(Q(expires_at__lte=now) | Q(owner=owner))
+            .update(owner=owner, expires_at=now + ttl, last_started_at=now)
+        )
+
+    @staticmethod
+    def release(name, owner, duration, error=None, next_due=None):
+        """Record the run; the lease stays held until next_due (default: free now)"""
+        now = timezone.now()
+        changes = {
+            'expires_at': max(now, next_due) if next_due else now,
+            'last_finished_at': now,
+            'last_duration': duration,
+            'run_count': F('run_count') + 1,
+            'last_error': error or '',
+        }
+        if error:
+            changes['failure_count'] = F('failure_count') + 1
+        JobLease.objects.filter(name=name, owner=owner).update(**changes)
+
+
+class Scheduler:
+    def __init__(self, jobs, lease_ttl=None):
+        self.jobs = jobs
+        self.lease_ttl = lease_ttl or timedelta(seconds=getattr(settings, 'SCHEDULER_LEASE_SECONDS', 600))
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+
+    def install_signal_handlers(self):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.stop)
+
+    def stop(self, *args):
+        if not self.stopping.is_set():
+            logger.info("Scheduler stopping after the current job")
+        self.stopping.set()
+
+    def run_job(self, job):
+        close_old_connections()
+        if not JobLeaseService.acquire(job.name, self.owner, self.lease_ttl):
+            job.skipped += 1
+            return
+
+        next_due = timezone.now() + timedelta(seconds=job.interval)
+        started = time.perf_counter()
+        error = None
+        try:
+            # Activity logs of the whole run go out in a few INSERTs
+            with ActivityLogWriter.batch():
+                job.func()
+        except Exception as e:
+            error = str(e)
+            job.failures += 1
+            logger.exception(f"Scheduled job {job.name} failed")
+        duration = time.perf_counter() - started
+
+        job.runs += 1
+        job.total_duration += duration
+        job.max_duration = max(job.max_duration, duration)
+        JobLeaseService.release(job.name, self.owner, duration, error, next_due=next_due)
+        logger.info(f"Scheduled job {job.name} finished in {duration:.2f}s")
+
+    def run(self):
+        logger.info(f"Scheduler {self.owner} started with jobs: {', '.join(job.name for job in self.jobs)}")
+        while not self.stopping.is_set():
+            job = min(self.jobs, key=lambda j: j.next_run)
+            wait = job.next_run - time.monotonic()
+            if wait > 0:
+                # Wakes up early on stop()
+                self.stopping.wait(wait)
+                continue
+            self.run_job(job)
+            job.next_run = time.monotonic() + job.delay()
+        close_old_connections()
+        return {job.name: job.metrics() for job in self.jobs}
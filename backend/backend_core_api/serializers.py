@@ -1,3 +1,4 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import User, Slot, Attendance, Zone, ParkingSession, Payment, Vehicle, Dispute, Schedule, ShiftLog, Feedback, BookingActivityLog
 
@@ -90,6 +91,14 @@ class ParkingSessionSerializer(serializers.ModelSerializer):
                   'payment_method', 'payment_status', 'is_paid', 'duration', 'status', 'qr_code_data',
                   'hourly_rate', 'estimated_total', 'estimated_balance', 'guest_mobile', 'guest_email', 'booking_expiry_time')
 
+    def __init__(self, *args, **kwargs):
+        # Optional projection, e.g. fields=['id', 'vehicle_number', 'status']
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def get_is_paid(self, obj):
         return obj.payment_status == 'paid'
 
@@ -197,6 +206,21 @@ class ShiftLogSerializer(serializers.ModelSerializer):
         model = ShiftLog
         fields = '__all__'
 
+    def validate(self, attrs):
+        # shift_date is derived in ShiftLog.save(), so the (staff, shift_date)
+        # constraint is invisible to the default validators; check it here to
+        # answer a second log for the day with 400 instead of an IntegrityError
+        staff = attrs.get('staff', getattr(self.instance, 'staff', None))
+        if self.instance is None:
+            shift_date = timezone.localdate(attrs['shift_start'])
+            others = ShiftLog.objects.all()
+        else:
+            shift_date = self.instance.shift_date
+            others = ShiftLog.objects.exclude(pk=self.instance.pk)
+        if others.filter(staff=staff, shift_date=shift_date).exists():
+            raise serializers.ValidationError({'shift_date': f'{staff.username} already has a shift log for {shift_date}.'})
+        return attrs
+
 class FeedbackSerializer(serializers.ModelSerializer):
     vehicle_number = serializers.CharField(source='session.vehicle_number', read_only=True)
     class Meta:
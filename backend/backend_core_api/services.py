@@ -1,12 +1,186 @@
 from django.utils import timezone
-from .models import ShiftLog, ParkingSession, BookingActivityLog, Slot
+from django.db import IntegrityError, transaction
+from django.db.models import Q, F, Case, When, Value, IntegerField
+from .models import ShiftLog, ParkingSession, BookingActivityLog, Slot, Zone
+from .slot_index import SlotAvailabilityIndex
+from .events import OccupancyEventService
+from .activity_log import ActivityLogWriter
+from .signals import slot_state_changed
 from decimal import Decimal
 from .sms_service import SMSService
 import logging
 
 logger = logging.getLogger(__name__)
 
+FREE_SLOT = Q(is_occupied=False, is_reserved=False, is_active=True)
+RESERVED_SLOT = Q(is_reserved=True, is_occupied=False)
+OCCUPIED_SLOT = Q(is_occupied=True, is_reserved=False)
+
+
+class SlotStateService:
+    """
+    Slot state transitions done as conditional UPDATEs.
+
+    Each transition only succeeds if the row is still in the expected state,
+    so two gates can never both take the same slot, and neither gate waits
+    on the other's row lock.
+
+    The zone's occupied/reserved counters are moved with F() expressions in
+    the same transaction as the slot UPDATE, so a slot change and its
+    counter delta commit together. The zone row stays locked until the
+    caller commits, which is also what lets ``reconcile_zone_counters``
+    (it locks the zone rows, then recounts) never see one without the other.
+    """
+
+    @staticmethod
+    def _move_counters(zone_id, counters):
+        Zone.objects.filter(pk=zone_id).update(
+            **{field: F(field) + delta for field, delta in counters.items()}
+        )
+
+    @staticmethod
+    def _transition(slot, condition, counters, **changes):
+        with transaction.atomic():
+            updated = Slot.objects.filter(condition, pk=slot.pk).update(**changes)
+            if not updated:
+                return False
+
+            if slot.is_active:
+                SlotStateService._move_counters(slot.zone_id, counters)
+
+            for field, value in changes.items():
+                setattr(slot, field, value)
+            deltas = counters if slot.is_active else {}
+            OccupancyEventService.record([OccupancyEventService.zone_event(
+                slot, deltas.get('occupied_count', 0), deltas.get('reserved_count', 0)
+            )])
+
+        # update() skips post_save, so resync the index and notify listeners here
+        transaction.on_commit(lambda: SlotStateService._committed(slot))
+        return True
+
+    @staticmethod
+    def _committed(slot):
+        SlotAvailabilityIndex.sync(slot)
+        slot_state_changed.send(sender=Slot, slot=slot)
+
+    @staticmethod
+    def claim(zone, occupy=False):
+        """
+        Take a free slot in the zone.
+        Reserves it for a booking, or occupies it directly when occupy=True (walk-ins).
+        Returns the Slot, or None when the zone is full.
+        """
+        if occupy:
+            changes, counters = {'is_occupied': True}, {'occupied_count': 1}
+        else:
+            changes, counters = {'is_reserved': True}, {'reserved_count': 1}
+
+        # Fast path: candidates handed out by the free-slot index
+        while True:
+            slot = SlotAvailabilityIndex.acquire(zone)
+            if not slot:
+                break
+            if SlotStateService._transition(slot, FREE_SLOT, counters, **changes):
+                return slot
+
+        # Index empty or stale: ask the DB, skipping rows other gates have locked
+        with transaction.atomic():
+            slot = Slot.objects.select_for_update(skip_locked=True).filter(
+                FREE_SLOT, zone=zone
+            ).order_by('slot_number').first()
+            if slot and SlotStateService._transition(slot, FREE_SLOT, counters, **changes):
+                return slot
+        return None
+
+    @staticmethod
+    def occupy(slot):
+        """Move a reserved (or free) slot to occupied. Returns False if it is already occupied."""
+        changes = {'is_reserved': False, 'is_occupied': True}
+        return (
+            SlotStateService._transition(
+                slot, RESERVED_SLOT, {'reserved_count': -1, 'occupied_count': 1}, **changes
+            )
+            or SlotStateService._transition(slot, FREE_SLOT, {'occupied_count': 1}, **changes)
+        )
+
+    @staticmethod
+    def release(slot):
+        """Free an occupied or reserved slot. Returns False if it was already free."""
+        changes = {'is_reserved': False, 'is_occupied': False}
+        return (
+            SlotStateService._transition(slot, OCCUPIED_SLOT, {'occupied_count': -1}, **changes)
+            or SlotStateService._transition(slot, RESERVED_SLOT, {'reserved_count': -1}, **changes)
+            or SlotStateService._transition(
+                slot, Q(is_occupied=True, is_reserved=True),
+                {'occupied_count': -1, 'reserved_count': -1}, **changes
+            )
+        )
+
+    @staticmethod
+    def release_reserved(slot_ids):
+        """
+        Free many reserved slots with one UPDATE, moving each zone's
+        reserved counter by the number of its slots that were released
+        (one UPDATE for all zones).
+        Slots no longer in the reserved state are left alone.
+        Must run inside a transaction; returns the released slots.
+        """
+        slots = list(Slot.objects.select_for_update().filter(RESERVED_SLOT, id__in=slot_ids))
+        if not slots:
+            return []
+
+        Slot.objects.filter(id__in=[slot.id for slot in slots]).update(is_reserved=False)
+
+        released = {}
+        for slot in slots:
+            slot.is_reserved = False
+            if slot.is_active:
+                released[slot.zone_id] = released.get(slot.zone_id, 0) + 1
+        if released:
+            Zone.objects.filter(id__in=released).update(
+                reserved_count=F('reserved_count') - Case(
+                    *[When(id=zone_id, then=Value(count)) for zone_id, count in released.items()],
+                    output_field=IntegerField(),
+                )
+            )
+        OccupancyEventService.record([
+            OccupancyEventService.zone_event(slot, reserved_delta=-1 if slot.is_active else 0) for slot in slots
+        ])
+
+        transaction.on_commit(lambda: [SlotStateService._committed(slot) for slot in slots])
+        return slots
+
+
 class ShiftService:
+    COUNTERS = ('entry_count', 'exit_count', 'revenue_collected', 'cash_collected', 'online_collected')
+
+    @staticmethod
+    def deltas(action_type, amount=0, payment_method='cash'):
+        """Counter changes of one scan"""
+        amount_decimal = Decimal(str(amount))
+        is_cash = str(payment_method).lower() == 'cash'
+        return {
+            'entry_count': 1 if action_type == 'entry' else 0,
+            'exit_count': 1 if action_type == 'exit' else 0,
+            'revenue_collected': amount_decimal,
+            'cash_collected': amount_decimal if is_cash else Decimal('0.00'),
+            'online_collected': Decimal('0.00') if is_cash else amount_decimal,
+        }
+
+    @staticmethod
+    def record(user, action_type, amount=0, payment_method='cash'):
+        """
+        Count a scan towards the staff member's shift. With SHIFT_STATS_WRITE_BEHIND
+        the deltas are buffered in-process and flushed every few seconds.
+        """
+        from django.conf import settings
+        if getattr(settings, 'SHIFT_STATS_WRITE_BEHIND', False):
+            from .shift_stats import aggregator
+            aggregator.record(user.pk, ShiftService.deltas(action_type, amount, payment_method))
+        else:
+            ShiftService.update_stats(user, action_type, amount, payment_method)
+
     @staticmethod
     def update_stats(user, action_type, amount=0, payment_method='cash'):
         """
@@ -15,37 +189,108 @@ class ShiftService:
         amount: Decimal or float
         payment_method: 'cash', 'upi', 'card'
         """
-        today = timezone.now().date()
-        
-        # Get or create shift log for today
-        shift_log, created = ShiftLog.objects.get_or_create(
-            staff=user,
-            shift_start__date=today,
-            defaults={
-                'shift_start': timezone.now(),
-                'entry_count': 0,
-                'exit_count': 0,
-                'revenue_collected': Decimal('0.00'),
-                'cash_collected': Decimal('0.00'),
-                'online_collected': Decimal('0.00')
-            }
+        ShiftService.apply(user.pk, timezone.localdate(), ShiftService.deltas(action_type, amount, payment_method))
+
+    @staticmethod
+    def apply(staff_id, shift_date, deltas):
+        """
+        Add deltas to the staff member's log for shift_date in one UPDATE with F(),
+        so concurrent scans from several tablets never overwrite each other.
+        """
+        increments = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        shift_logs = ShiftLog.objects.filter(staff_id=staff_id, shift_date=shift_date)
+
+        if not increments or shift_logs.update(**increments):
+            return
+        try:
+            # Savepoint: losing the insert race must not break the caller's transaction
+            with transaction.atomic():
+                ShiftLog.objects.create(staff_id=staff_id, shift_date=shift_date, shift_start=timezone.now(), **deltas)
+        except IntegrityError:
+            # Another tablet opened the log first; add to it
+            shift_logs.update(**increments)
+
+    @staticmethod
+    def attributed_since():
+        """When Payment.collected_by started being recorded (migration 0024), or None"""
+        from django.db import connection
+        from django.db.migrations.recorder import MigrationRecorder
+        return (
+            MigrationRecorder(connection).migration_qs
+            .filter(app='backend_core_api', name='0024_payment_collected_by')
+            .values_list('applied', flat=True).first()
         )
-        
-        amount_decimal = Decimal(str(amount))
-        
-        if action_type == 'entry':
-            shift_log.entry_count += 1
-        elif action_type == 'exit':
-            shift_log.exit_count += 1
-            
-        shift_log.revenue_collected += amount_decimal
-        
-        if str(payment_method).lower() == 'cash':
-            shift_log.cash_collected += amount_decimal
-        else:
-            shift_log.online_collected += amount_decimal
-            
-        shift_log.save()
+
+    @staticmethod
+    def recompute(from_date, to_date, staff_id=None):
+        """
+        Rebuild revenue/cash/online totals of shifts in [from_date, to_date] from
+        successful Payments attributed to staff (Payment.collected_by).
+        Entry/exit counts have no fact table and are left as they are.
+        Returns the number of shift logs written.
+
+        Raises ValueError for days that cannot be rebuilt exactly: days up to
+        the one collected_by was added on, whose payments carry no staff, and,
+        with SHIFT_STATS_WRITE_BEHIND, days whose scans may still sit in some
+        process's buffer and would be added on top of the rebuilt totals.
+        """
+        from django.conf import settings
+        from django.db.models import Sum, Min
+        from django.db.models.functions import TruncDate
+        from datetime import datetime, time, timedelta
+        from .models import Payment
+        from .shift_stats import aggregator
+
+        since = ShiftService.attributed_since()
+        if since is None:
+            raise ValueError("Migration 0024_payment_collected_by is not recorded, so attributed payments cannot be told apart")
+        first_day = timezone.localdate(since) + timedelta(days=1)
+        if from_date < first_day:
+            raise ValueError(f"Payments before {first_day} have no collecting staff; rebuild from {first_day} on")
+        if getattr(settings, 'SHIFT_STATS_WRITE_BEHIND', False):
+            flush_seconds = getattr(settings, 'SHIFT_STATS_FLUSH_SECONDS', 5)
+            open_from = (timezone.localtime() - timedelta(seconds=2 * flush_seconds)).date()
+            if to_date >= open_from:
+                raise ValueError(f"Shifts from {open_from} on may still have buffered scans; rebuild them once the day is over")
+        # Deltas this process failed to write earlier would otherwise land on the rebuilt totals
+        aggregator.flush()
+
+        tz = timezone.get_current_timezone()
+        start = timezone.make_aware(datetime.combine(from_date, time.min), tz)
+        end = timezone.make_aware(datetime.combine(to_date + timedelta(days=1), time.min), tz)
+        payments = Payment.objects.filter(status='success', collected_by__isnull=False, created_at__gte=start, created_at__lt=end)
+        if staff_id:
+            payments = payments.filter(collected_by_id=staff_id)
+        cash = Q(payment_method__iexact='cash')
+        totals = (
+            payments.annotate(shift_date=TruncDate('created_at', tzinfo=tz))
+            .values('collected_by_id', 'shift_date').order_by()
+            .annotate(
+                revenue=Sum('amount'),
+                cash=Sum('amount', filter=cash),
+                online=Sum('amount', filter=~cash),
+                first_payment=Min('created_at'),
+            )
+        )
+
+        logs = ShiftLog.objects.filter(shift_date__gte=from_date, shift_date__lte=to_date)
+        if staff_id:
+            logs = logs.filter(staff_id=staff_id)
+        zero = Decimal('0.00')
+        with transaction.atomic():
+            # Shifts without attributed payments collected nothing
+            logs.update(revenue_collected=zero, cash_collected=zero, online_collected=zero)
+            for row in totals:
+                money = {
+                    'revenue_collected': row['revenue'] or zero,
+                    'cash_collected': row['cash'] or zero,
+                    'online_collected': row['online'] or zero,
+                }
+                ShiftLog.objects.update_or_create(
+                    staff_id=row['collected_by_id'], shift_date=row['shift_date'],
+                    defaults=money, create_defaults={**money, 'shift_start': row['first_payment']},
+                )
+        return len(totals)
 
 
 class CancellationService:
@@ -53,18 +298,8 @@ class CancellationService:
     
     @staticmethod
     def log_activity(session, activity_type, description, user=None, metadata=None):
-        """Log booking activity for admin/staff monitoring"""
-        try:
-            BookingActivityLog.objects.create(
-                session=session,
-                user=user or session.user,
-                activity_type=activity_type,
-                description=description,
-                metadata=metadata or {}
-            )
-            logger.info(f"Activity logged: {activity_type} for session {session.id}")
-        except Exception as e:
-            logger.error(f"Failed to log activity: {str(e)}")
+        """Log booking activity for admin/staff monitoring (written once the transaction commits)"""
+        ActivityLogWriter.add(session, activity_type, description, user=user, metadata=metadata)
     
     @staticmethod
     def process_cancellation(session, reason, user=None, cancellation_type='user_initiated'):
@@ -89,21 +324,19 @@ class CancellationService:
             # Calculate refund
             refund_amount = session.calculate_refund()
             
-            # Update session
-            session.status = 'cancelled'
-            session.cancellation_reason = reason
-            session.cancelled_at = timezone.now()
-            session.cancellation_type = cancellation_type
-            session.refund_amount = refund_amount
-            session.refund_status = 'pending' if refund_amount > 0 else 'not_applicable'
-            session.save()
-            
-            # Free up the slot
-            if session.slot:
-                slot = session.slot
-                slot.is_occupied = False
-                slot.is_reserved = False
-                slot.save()
+            with transaction.atomic():
+                # Update session
+                session.status = 'cancelled'
+                session.cancellation_reason = reason
+                session.cancelled_at = timezone.now()
+                session.cancellation_type = cancellation_type
+                session.refund_amount = refund_amount
+                session.refund_status = 'pending' if refund_amount > 0 else 'not_applicable'
+                session.save()
+                
+                # Free up the slot
+                if session.slot:
+                    SlotStateService.release(session.slot)
             
             # Log activity
             CancellationService.log_activity(
@@ -172,7 +405,7 @@ class CancellationService:
             return False, f"Error: {str(e)}"
     
     @staticmethod
-    def check_expired_bookings():
+    def check_expired_bookings(batch_size=500):
         """
         Check for expired bookings and auto-cancel them
         Returns count of auto-cancelled bookings
@@ -181,6 +414,7 @@ class CancellationService:
         
         now = timezone.now()
         expired_count = 0
+        reason = "Booking expired - not used within time limit"
         
         # Find expired reserved bookings
         expired_sessions = ParkingSession.objects.filter(
@@ -188,53 +422,127 @@ class CancellationService:
             booking_expiry_time__lte=now
         )
         
-        for session in expired_sessions:
-            success, message, refund = CancellationService.process_cancellation(
-                session=session,
-                reason="Booking expired - not used within time limit",
-                cancellation_type='auto_cancelled'
-            )
-            if success:
-                expired_count += 1
+        while True:
+            # One transaction per chunk; skip_locked lets two nodes sweep side by side
+            with transaction.atomic():
+                batch = list(
+                    expired_sessions.select_for_update(skip_locked=True, of=('self',))
+                    .select_related('user', 'zone')
+                    .order_by('id')[:batch_size]
+                )
+                if not batch:
+                    break
+                ids = [session.id for session in batch]
+                
+                refund = ParkingSession.refund_expression(now)
+                ParkingSession.objects.filter(id__in=ids).update(
+                    status='cancelled',
+                    cancellation_reason=reason,
+                    cancelled_at=now,
+                    cancellation_type='auto_cancelled',
+                    refund_amount=refund,
+                    refund_status=Case(
+                        # Same window as refund_expression(): any refund is pending
+                        When(initial_amount_paid__gt=0, entry_time__gte=now - timedelta(hours=2), then=Value('pending')),
+                        default=Value('not_applicable'),
+                    ),
+                )
+                refunds = dict(ParkingSession.objects.filter(id__in=ids).values_list('id', 'refund_amount'))
+                
+                SlotStateService.release_reserved([session.slot_id for session in batch if session.slot_id])
+                
+                # update() skips post_save, so the session events are written here
+                for session in batch:
+                    session.status = 'cancelled'
+                OccupancyEventService.record([OccupancyEventService.session_event(session) for session in batch])
+                
+                ActivityLogWriter.add_many([
+                    BookingActivityLog(
+                        session=session,
+                        user=session.user,
+                        activity_type='auto_cancelled',
+                        description=f"Booking cancelled: {reason}",
+                        metadata={
+                            'refund_amount': float(refunds[session.id]),
+                            'cancellation_type': 'auto_cancelled',
+                            'vehicle_number': session.vehicle_number,
+                            'zone': session.zone.name
+                        }
+                    )
+                    for session in batch
+                ])
+                
+                notices = [SMSService.build_auto_cancellation_notice(session) for session in batch]
+                SMSService.send_many([(mobile, message) for mobile, message in notices if mobile])
+                
+                expired_count += len(batch)
         
         logger.info(f"Auto-cancelled {expired_count} expired bookings")
         return expired_count
     
     @staticmethod
-    def send_expiry_warnings():
+    def send_expiry_warnings(batch_size=500):
         """
         Send SMS warnings for bookings expiring soon
         Returns count of warnings sent
         """
+        from django.conf import settings
+        from datetime import timedelta
+        
+        now = timezone.now()
+        window_end = now + timedelta(hours=getattr(settings, 'SMS_WARNING_HOURS_BEFORE', 2))
         warning_count = 0
+        last_id = 0
         
-        # Find bookings expiring soon that haven't been warned
+        # Find bookings expiring soon that haven't been warned, a chunk at a time
         expiring_sessions = ParkingSession.objects.filter(
             status='reserved',
-            sms_notification_sent=False
+            sms_notification_sent=False,
+            booking_expiry_time__gt=now,
+            booking_expiry_time__lte=window_end
         )
         
-        for session in expiring_sessions:
-            if session.is_expiring_soon():
-                # Send warning SMS
-                success, response = SMSService.send_cancellation_warning(session)
+        while True:
+            with transaction.atomic():
+                # skip_locked lets two sweeps run side by side without warning twice
+                batch = list(
+                    expiring_sessions.filter(id__gt=last_id)
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .select_related('user')
+                    .order_by('id')[:batch_size]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                
+                # Sessions without a mobile number stay unwarned, as before
+                warnings = []
+                for session in batch:
+                    mobile, message = SMSService.build_cancellation_warning(session)
+                    if mobile:
+                        warnings.append((session, mobile, message))
+                if not warnings:
+                    continue
+                
+                results = SMSService.send_many([(mobile, message) for _, mobile, message in warnings])
+                warned = [(session, response) for (session, _, _), (success, response) in zip(warnings, results) if success]
                 
-                if success:
-                    session.sms_notification_sent = True
-                    session.save()
-                    
-                    # Log SMS activity
-                    CancellationService.log_activity(
+                ParkingSession.objects.filter(id__in=[session.id for session, _ in warned]).update(sms_notification_sent=True)
+                ActivityLogWriter.add_many([
+                    BookingActivityLog(
                         session=session,
+                        user=session.user,
                         activity_type='sms_sent',
                         description="Expiry warning SMS sent",
                         metadata={
                             'sms_response': response,
                             'vehicle_number': session.vehicle_number,
-                            'expiry_time': session.booking_expiry_time.isoformat() if session.booking_expiry_time else None
+                            'expiry_time': session.booking_expiry_time.isoformat()
                         }
                     )
-                    warning_count += 1
+                    for session, response in warned
+                ])
+                warning_count += len(warned)
         
         logger.info(f"Sent {warning_count} expiry warning SMS")
         return warning_count
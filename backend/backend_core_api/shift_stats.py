@@ -0,0 +1,88 @@
+"""
+Write-behind aggregation of shift counters.
+
+With SHIFT_STATS_WRITE_BEHIND on (it is off by default), gate scans no longer touch ShiftLog in
+their own transaction. ``aggregator.record()`` adds the scan's deltas to an
+in-process buffer once the scan commits, and a daemon thread writes the
+summed deltas every SHIFT_STATS_FLUSH_SECONDS, one F() UPDATE per staff
+member and day (ShiftService.apply). The buffer is also flushed at exit.
+
+A hard kill loses at most one interval of counters. The money totals of
+finished days can be rebuilt exactly from Payment with
+``manage.py recompute_shift_stats``; entry and exit counts have no such
+record, which is why the setting is opt-in.
+"""
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from .services import ShiftService
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ShiftStatsAggregator:
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.pending = {}  # (staff_id, shift_date) -> summed deltas
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def record(self, staff_id, deltas):
+        """Buffer a scan's deltas once the current transaction commits"""
+        key = (staff_id, timezone.localdate())
+        transaction.on_commit(lambda: self._add(key, deltas))
+        self.start()
+
+    def _add(self, key, deltas):
+        with self.lock:
+            totals = self.pending.setdefault(key, dict.fromkeys(ShiftService.COUNTERS, 0))
+            for field, delta in deltas.items():
+                totals[field] += delta
+
+    def flush(self):
+        """Write everything buffered; deltas that fail to write are kept for the next flush"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        written = 0
+        for (staff_id, shift_date), deltas in pending.items():
+            try:
+                ShiftService.apply(staff_id, shift_date, deltas)
+                written += 1
+            except Exception as e:
+                logger.error(f"Failed to flush shift stats of staff {staff_id} for {shift_date}: {str(e)}")
+                self._add((staff_id, shift_date), deltas)
+        return written
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name='shift-stats-flush', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        interval = self.interval or getattr(settings, 'SHIFT_STATS_FLUSH_SECONDS', 5)
+        try:
+            while not self.stopping.wait(interval):
+                close_old_connections()
+                self.flush()
+        finally:
+            # This thread holds its own DB connection
+            connection.close()
+
+    def shutdown(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+        self.flush()
+
+
+aggregator = ShiftStatsAggregator()
+atexit.register(aggregator.shutdown)
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent after commit whenever SlotStateService changes a slot with a bulk
+# UPDATE, which bypasses post_save. Receivers get the ``slot`` instance.
+slot_state_changed = Signal()
@@ -0,0 +1,180 @@
+"""
+Per-zone free-slot index.
+
+Every zone has a set of free slot ids. Gates pop a candidate from that set
+instead of scanning the ``Slot`` table. The pop removes the id atomically,
+so two gates never get the same candidate, and every operation touches one
+member, never the whole set. ``SlotStateService`` still confirms the slot
+with a conditional UPDATE, so a stale candidate costs one extra query.
+
+The sets live in Redis (SPOP/SADD/SREM) when the default cache is Redis.
+SLOT_INDEX_BACKEND = 'local' keeps them in process memory, which is only
+correct with a single server process. Without a shared store the index is
+off and gates go straight to the database.
+
+The index follows ``Slot.is_occupied`` / ``Slot.is_reserved`` through the
+``post_save`` / ``post_delete`` signals once the writing transaction has
+committed. A zone is rebuilt from the database whenever its marker key is
+missing, which covers process start-up, cache eviction and the periodic
+``INDEX_TIMEOUT`` refresh that heals any drift.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Slot
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RedisSlotStore:
+    def __init__(self):
+        self.client = cache._cache.get_client(write=True)
+
+    @staticmethod
+    def _key(name):
+        return cache.make_and_validate_key(name)
+
+    def is_built(self, marker):
+        return bool(self.client.exists(self._key(marker)))
+
+    def replace(self, key, marker, slot_ids, timeout):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._key(key))
+        if slot_ids:
+            pipe.sadd(self._key(key), *slot_ids)
+        pipe.set(self._key(marker), 1, ex=timeout)
+        pipe.execute()
+
+    def add(self, key, slot_id):
+        self.client.sadd(self._key(key), slot_id)
+
+    def remove(self, key, slot_id):
+        self.client.srem(self._key(key), slot_id)
+
+    def pop(self, key):
+        slot_id = self.client.spop(self._key(key))
+        return int(slot_id) if slot_id is not None else None
+
+
+class LocalSlotStore:
+    def __init__(self):
+        self.sets = {}
+        self.built_until = {}
+        self.lock = threading.Lock()
+
+    def is_built(self, marker):
+        return self.built_until.get(marker, 0) > time.monotonic()
+
+    def replace(self, key, marker, slot_ids, timeout):
+        with self.lock:
+            self.sets[key] = set(slot_ids)
+            self.built_until[marker] = time.monotonic() + timeout
+
+    def add(self, key, slot_id):
+        with self.lock:
+            self.sets.setdefault(key, set()).add(slot_id)
+
+    def remove(self, key, slot_id):
+        with self.lock:
+            self.sets.get(key, set()).discard(slot_id)
+
+    def pop(self, key):
+        with self.lock:
+            free_ids = self.sets.get(key)
+            return free_ids.pop() if free_ids else None
+
+
+class SlotAvailabilityIndex:
+    INDEX_KEY = 'slot_index:zone:{zone_id}'
+    BUILT_KEY = 'slot_index:zone:{zone_id}:built'
+    INDEX_TIMEOUT = 300  # Rebuild each zone from the DB at least every 5 minutes
+
+    _stores = {}
+
+    @classmethod
+    def store(cls):
+        """The configured free-set store, or None when the index is off"""
+        backend = getattr(settings, 'SLOT_INDEX_BACKEND', None)
+        if not backend:
+            return None
+        if backend not in cls._stores:
+            cls._stores[backend] = RedisSlotStore() if backend == 'redis' else LocalSlotStore()
+        return cls._stores[backend]
+
+    @staticmethod
+    def is_free(slot):
+        return slot.is_active and not slot.is_occupied and not slot.is_reserved
+
+    @classmethod
+    def rebuild(cls, zone_id, store=None):
+        """Reload the free set of a zone from the database"""
+        store = store or cls.store()
+        free_ids = list(
+            Slot.objects.filter(zone_id=zone_id, is_occupied=False, is_reserved=False, is_active=True)
+            .values_list('id', flat=True)
+        )
+        store.replace(
+            cls.INDEX_KEY.format(zone_id=zone_id), cls.BUILT_KEY.format(zone_id=zone_id),
+            free_ids, cls.INDEX_TIMEOUT,
+        )
+        logger.info(f"Slot index rebuilt for zone {zone_id}: {len(free_ids)} free slots")
+        return free_ids
+
+    @classmethod
+    def acquire(cls, zone):
+        """
+        Hand out a free slot of the zone, or None when the index has none.
+
+        The returned slot is only taken out of the index; the caller still
+        has to persist the new slot state.
+        """
+        store = cls.store()
+        if store is None:
+            return None
+        if not store.is_built(cls.BUILT_KEY.format(zone_id=zone.id)):
+            cls.rebuild(zone.id, store)
+
+        key = cls.INDEX_KEY.format(zone_id=zone.id)
+        while True:
+            slot_id = store.pop(key)
+            if slot_id is None:
+                return None
+            slot = Slot.objects.filter(
+                pk=slot_id, is_occupied=False, is_reserved=False, is_active=True
+            ).select_related('zone').first()
+            if slot:
+                return slot
+            # Stale member: already taken elsewhere, it stays out of the set
+
+    @classmethod
+    def sync(cls, slot):
+        """Add or remove a slot from its zone's free set to match the DB row"""
+        store = cls.store()
+        if store is None:
+            return
+        key = cls.INDEX_KEY.format(zone_id=slot.zone_id)
+        if cls.is_free(slot):
+            store.add(key, slot.id)
+        else:
+            store.remove(key, slot.id)
+
+    @classmethod
+    def discard(cls, slot):
+        store = cls.store()
+        if store is not None:
+            store.remove(cls.INDEX_KEY.format(zone_id=slot.zone_id), slot.id)
+
+
+@receiver(post_save, sender=Slot)
+def sync_slot_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: SlotAvailabilityIndex.sync(instance))
+
+
+@receiver(post_delete, sender=Slot)
+def discard_slot_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: SlotAvailabilityIndex.discard(instance))
@@ -0,0 +1,142 @@
+"""
+Worker that drains SMSOutbox.
+
+Rows are claimed in small batches with ``SELECT ... FOR UPDATE SKIP LOCKED``
+so several workers can run side by side without sending a message twice.
+A claimed row is marked ``sending``; if its worker dies, the claim expires
+after CLAIM_TIMEOUT and another worker picks it up again. Picking up an
+expired claim counts as an attempt, so a message that keeps crashing its
+worker still ends up ``failed``.
+
+Each provider gets its own thread pool, sized from
+``settings.SMS_PROVIDER_CONCURRENCY``. A slow or failing provider therefore
+only backs up its own messages. Failed sends are retried with exponential
+backoff and jitter until ``SMS_OUTBOX_MAX_ATTEMPTS`` is reached.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from datetime import timedelta
+from .models import SMSOutbox
+from .sms_service import SMSService
+from queue import Empty, Queue
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+
+class SMSOutboxWorker:
+    CLAIM_TIMEOUT = timedelta(minutes=5)
+    BACKOFF_BASE_SECONDS = 30
+    BACKOFF_MAX_SECONDS = 3600
+
+    def __init__(self, batch_size=50):
+        self.batch_size = batch_size
+        self.max_attempts = getattr(settings, 'SMS_OUTBOX_MAX_ATTEMPTS', 5)
+        concurrency = getattr(settings, 'SMS_PROVIDER_CONCURRENCY', {})
+        self.concurrency = {provider: concurrency.get(provider, 4) for provider in SMSService.PROVIDERS}
+        self.pools = {
+            provider: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'sms-{provider}')
+            for provider, workers in self.concurrency.items()
+        }
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+
+    def claim(self, provider, limit):
+        """Mark up to limit due rows of a provider as sending and return them"""
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                SMSOutbox.objects.select_for_update(skip_locked=True)
+                .filter(provider=provider)
+                .filter(
+                    Q(status='pending', next_attempt_at__lte=now)
+                    | Q(status='sending', claimed_at__lt=now - self.CLAIM_TIMEOUT)
+                )
+                .order_by('next_attempt_at')[:limit]
+            )
+            reclaimed = [row for row in rows if row.status == 'sending']
+            if reclaimed:
+                # The previous worker died mid-send, maybe after reaching the provider
+                SMSOutbox.objects.filter(pk__in=[row.pk for row in reclaimed]).update(
+                    attempts=F('attempts') + 1, last_error='Claim expired before the send finished'
+                )
+                for row in reclaimed:
+                    row.attempts += 1
+                exhausted = [row.pk for row in reclaimed if row.attempts >= self.max_attempts]
+                if exhausted:
+                    logger.error(f"SMS {exhausted} failed permanently: claims kept expiring")
+                    SMSOutbox.objects.filter(pk__in=exhausted).update(status='failed')
+                    rows = [row for row in rows if row.pk not in exhausted]
+            if rows:
+                SMSOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(status='sending', claimed_at=now)
+        return rows
+
+    def backoff(self, attempts):
+        delay = min(self.BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), self.BACKOFF_MAX_SECONDS)
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def deliver(self, entry):
+        """Send one row and record the outcome"""
+        try:
+            success, response = SMSService.deliver(entry.provider, entry.mobile_numbers, entry.message)
+        except Exception as e:
+            success, response = False, {'error': str(e)}
+
+        attempts = entry.attempts + 1
+        if success:
+            SMSOutbox.objects.filter(pk=entry.pk).update(
+                status='sent', attempts=attempts, response=response, sent_at=timezone.now(), last_error=''
+            )
+        elif attempts >= self.max_attempts:
+            logger.error(f"SMS {entry.pk} to {entry.mobile_numbers} failed permanently: {response}")
+            SMSOutbox.objects.filter(pk=entry.pk).update(
+                status='failed', attempts=attempts, response=response, last_error=str(response)
+            )
+        else:
+            SMSOutbox.objects.filter(pk=entry.pk).update(
+                status='pending', attempts=attempts, response=response, last_error=str(response),
+                next_attempt_at=timezone.now() + self.backoff(attempts)
+            )
+        return success
+
+    def _deliver_batch(self, entries):
+        """Pool task: deliver entries off the batch's shared queue until it runs dry"""
+        sent = failed = 0
+        try:
+            while True:
+                try:
+                    entry = entries.get_nowait()
+                except Empty:
+                    return sent, failed
+                if self.deliver(entry):
+                    sent += 1
+                else:
+                    failed += 1
+        finally:
+            # Pool threads open their own connection; close it once per batch, not per message
+            connection.close()
+
+    def drain(self):
+        """Send everything that is currently due; returns (sent, failed) counts"""
+        sent = failed = 0
+        while True:
+            futures = []
+            for provider, pool in self.pools.items():
+                claimed = self.claim(provider, self.batch_size)
+                entries = Queue()
+                for entry in claimed:
+                    entries.put(entry)
+                workers = min(len(claimed), self.concurrency[provider])
+                futures.extend(pool.submit(self._deliver_batch, entries) for _ in range(workers))
+            if not futures:
+                return sent, failed
+            for future in futures:
+                batch_sent, batch_failed = future.result()
+                sent += batch_sent
+                failed += batch_failed
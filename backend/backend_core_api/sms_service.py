@@ -1,9 +1,80 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.db import transaction
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+
+class SMSClientRegistry:
+    """
+    Long-lived provider clients for every thread of the process.
+
+    Each provider keeps one keep-alive HTTP session, so TLS handshakes are
+    paid once per connection instead of once per message. Multi-recipient
+    Twilio messages fan out on a shared thread pool.
+
+    TwilioHttpClient stores each response on the instance before returning
+    it, so one instance used by two threads can hand a thread the other's
+    response. Every thread therefore gets its own Twilio client, and only
+    the underlying requests Session (the connection pool) is shared.
+    """
+    TIMEOUT = 10
+    _lock = threading.Lock()
+    _local = threading.local()
+    _fast2sms_session = None
+    _twilio_session = None
+    _executor = None
+
+    @staticmethod
+    def pool_size():
+        return max(getattr(settings, 'SMS_PROVIDER_CONCURRENCY', {}).values(), default=4) * 2
+
+    @classmethod
+    def fast2sms_session(cls):
+        with cls._lock:
+            if cls._fast2sms_session is None:
+                session = requests.Session()
+                session.mount('https://', HTTPAdapter(pool_maxsize=cls.pool_size()))
+                cls._fast2sms_session = session
+            return cls._fast2sms_session
+
+    @classmethod
+    def twilio_session(cls):
+        with cls._lock:
+            if cls._twilio_session is None:
+                session = requests.Session()
+                session.mount('https://', HTTPAdapter(pool_maxsize=cls.pool_size()))
+                cls._twilio_session = session
+            return cls._twilio_session
+
+    @classmethod
+    def twilio_client(cls, account_sid, auth_token):
+        """The calling thread's client for these credentials"""
+        clients = cls._local.__dict__.setdefault('twilio_clients', {})
+        client = clients.get((account_sid, auth_token))
+        if client is None:
+            http_client = TwilioHttpClient(pool_connections=False, timeout=cls.TIMEOUT)
+            http_client.session = cls.twilio_session()
+            client = Client(account_sid, auth_token, http_client=http_client)
+            clients[(account_sid, auth_token)] = client
+        return client
+
+    @classmethod
+    def executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'SMS_RECIPIENT_CONCURRENCY', 8),
+                    thread_name_prefix='sms-recipient'
+                )
+            return cls._executor
+
 class Fast2SMSService:
     """
     Fast2SMS integration for sending SMS notifications
@@ -54,11 +125,11 @@ class Fast2SMSService:
             }
             
             # Send request
-            response = requests.post(
+            response = SMSClientRegistry.fast2sms_session().post(
                 Fast2SMSService.BASE_URL,
                 data=payload,
                 headers=headers,
-                timeout=10
+                timeout=SMSClientRegistry.TIMEOUT
             )
             
             response_data = response.json()
@@ -76,8 +147,7 @@ class Fast2SMSService:
         except Exception as e:
             logger.error(f"Unexpected error sending SMS: {str(e)}")
             return False, {"error": str(e)}
-    
-from twilio.rest import Client
+
 
 class TwilioSMSService:
     """
@@ -98,14 +168,11 @@ class TwilioSMSService:
                 logger.error("Twilio credentials not fully configured in settings")
                 return False, {"error": "Twilio not configured"}
             
-            client = Client(account_sid, auth_token)
-            
             # Twilio handles one number at a time via API standard
             if isinstance(mobile_numbers, str):
                 mobile_numbers = [num.strip() for num in mobile_numbers.split(',')]
             
-            results = []
-            for number in mobile_numbers:
+            def send_one(number):
                 # Add +91 if not present (assuming India)
                 formatted_number = str(number).strip()
                 if not formatted_number.startswith('+'):
@@ -121,9 +188,15 @@ class TwilioSMSService:
                     params["messaging_service_sid"] = from_number
                 else:
                     params["from_"] = from_number
-                    
-                msg = client.messages.create(**params)
-                results.append(msg.sid)
+
+                # Looked up here: each fan-out thread must use its own client
+                client = SMSClientRegistry.twilio_client(account_sid, auth_token)
+                return client.messages.create(**params).sid
+            
+            if len(mobile_numbers) == 1:
+                results = [send_one(mobile_numbers[0])]
+            else:
+                results = list(SMSClientRegistry.executor().map(send_one, mobile_numbers))
                 
             logger.info(f"Twilio SMS sent successfully. SIDs: {results}")
             return True, {"sids": results}
@@ -134,25 +207,93 @@ class TwilioSMSService:
 
 class SMSService:
     """
-    Unified SMS Service to switch between providers easily
+    Unified SMS Service to switch between providers easily.
+
+    send() only queues the message in SMSOutbox, usually inside the caller's
+    transaction, so gates never wait on the provider. The process_sms_outbox
+    worker calls deliver() with retries. With Twilio, each recipient of a
+    message is queued, delivered and retried on its own.
     """
+    PROVIDERS = {
+        'twilio': TwilioSMSService,
+        'fast2sms': Fast2SMSService,
+    }
+
     @staticmethod
-    def send(mobile_numbers, message):
+    def get_provider():
         provider = getattr(settings, 'SMS_PROVIDER', 'fast2sms').lower()
-        
-        if provider == 'twilio':
-            return TwilioSMSService.send_sms(mobile_numbers, message)
+        return provider if provider in SMSService.PROVIDERS else 'fast2sms'
+
+    @staticmethod
+    def outbox_entries(provider, mobile_numbers, message):
+        """
+        SMSOutbox rows for one message. Twilio makes one API call per number,
+        so each recipient gets its own row and a retry only resends to the
+        numbers that failed. Fast2SMS takes the whole list in one call.
+        """
+        from .models import SMSOutbox
+        if isinstance(mobile_numbers, (list, tuple)):
+            numbers = [str(num).strip() for num in mobile_numbers]
         else:
-            return Fast2SMSService.send_sms(mobile_numbers, message)
+            numbers = [num.strip() for num in str(mobile_numbers).split(',')]
+        groups = [[number] for number in numbers] if provider == 'twilio' else [numbers]
+        return [SMSOutbox(provider=provider, mobile_numbers=','.join(group), message=message) for group in groups]
 
     @staticmethod
-    def send_cancellation_warning(session):
+    def queued(entries):
+        ids = [entry.id for entry in entries]
+        return {"queued": ids[0] if len(ids) == 1 else ids}
+
+    @staticmethod
+    def send(mobile_numbers, message):
+        from .models import SMSOutbox
+        entries = SMSService.outbox_entries(SMSService.get_provider(), mobile_numbers, message)
+        try:
+            # Savepoint, so a failed INSERT does not abort the caller's transaction
+            with transaction.atomic():
+                SMSOutbox.objects.bulk_create(entries)
+        except Exception as e:
+            logger.error(f"Failed to queue SMS to {mobile_numbers}: {str(e)}")
+            return False, {"error": str(e)}
+        return True, SMSService.queued(entries)
+
+    @staticmethod
+    def send_many(messages):
+        """
+        Queue several (mobile_numbers, message) pairs with one INSERT.
+        Returns one (success, response) tuple per message, like send().
+        """
+        from .models import SMSOutbox
+        provider = SMSService.get_provider()
+        per_message = [SMSService.outbox_entries(provider, mobile_numbers, message) for mobile_numbers, message in messages]
+        try:
+            with transaction.atomic():
+                SMSOutbox.objects.bulk_create([entry for entries in per_message for entry in entries])
+        except Exception as e:
+            logger.error(f"Failed to queue {len(per_message)} SMS: {str(e)}")
+            return [(False, {"error": str(e)}) for _ in per_message]
+        return [(True, SMSService.queued(entries)) for entries in per_message]
+
+    @staticmethod
+    def deliver(provider, mobile_numbers, message):
+        """Call the provider API right away; used by the outbox worker"""
+        service = SMSService.PROVIDERS.get(provider, Fast2SMSService)
+        return service.send_sms(mobile_numbers, message)
+
+    @staticmethod
+    def build_cancellation_warning(session):
+        """(mobile, message) of the expiry warning; mobile is None when unknown"""
         mobile = session.user.phone_number if session.user else session.guest_mobile
-        if not mobile: return False, {"error": "No mobile"}
         message = (
             f"PARKING ALERT: Your booking for {session.vehicle_number} "
             f"will expire in 2 hours. Booking ID: {session.id}"
         )
+        return mobile or None, message
+
+    @staticmethod
+    def send_cancellation_warning(session):
+        mobile, message = SMSService.build_cancellation_warning(session)
+        if not mobile: return False, {"error": "No mobile"}
         return SMSService.send(mobile, message)
 
     @staticmethod
@@ -171,8 +312,14 @@ class SMSService:
         return SMSService.send(mobile, message)
 
     @staticmethod
-    def send_auto_cancellation_notice(session):
+    def build_auto_cancellation_notice(session):
+        """(mobile, message) of the auto-cancellation notice; mobile is None when unknown"""
         mobile = session.user.phone_number if session.user else session.guest_mobile
-        if not mobile: return False, {"error": "No mobile"}
         message = f"AUTO-CANCELLED: booking for {session.vehicle_number} has expired."
+        return mobile or None, message
+
+    @staticmethod
+    def send_auto_cancellation_notice(session):
+        mobile, message = SMSService.build_auto_cancellation_notice(session)
+        if not mobile: return False, {"error": "No mobile"}
         return SMSService.send(mobile, message)
@@ -1,3 +1,1114 @@
-from django.test import TestCase
+from django.apps import apps as django_apps
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from django.utils import timezone
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
+from urllib.parse import parse_qs
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
+from asgiref.sync import async_to_sync
+from .activity_log import ActivityLogWriter
+from .events import OccupancyEventService
+from .perf import PerfMiddleware, SerializeTimer, _serialize_timer, instrument_serializers, recorder
+from .serializers import SlotSerializer, ZoneSerializer
+from .versioning import DataVersion
+from .models import SMSOutbox, Zone, Slot, ParkingSession, BookingActivityLog, JobLease, OccupancyEvent, Payment, ShiftLog, User, normalize_vehicle_number
+from .scheduler import Job, JobLeaseService, Scheduler
+from .services import CancellationService, ShiftService, SlotStateService
+from decimal import Decimal
+import csv
+import glob
+import gzip
+import io
+import json
+import os
+import requests
+import tempfile
+import threading
+from queue import Queue
+from . import shift_stats
+from .shift_stats import ShiftStatsAggregator
+from .slot_index import SlotAvailabilityIndex
+from .sms_outbox import SMSOutboxWorker
+from .sms_service import SMSService, SMSClientRegistry, TwilioSMSService
 
-# Create your tests here.
+
+class SMSOutboxTests(TestCase):
+    def setUp(self):
+        self.worker = SMSOutboxWorker()
+
+    def tearDown(self):
+        self.worker.shutdown()
+
+    def test_send_only_queues(self):
+        with mock.patch.object(SMSService, 'deliver') as deliver:
+            success, response = SMSService.send(['9876543210', '9123456780'], 'Hello')
+        deliver.assert_not_called()
+        self.assertTrue(success)
+        entries = SMSOutbox.objects.filter(pk__in=response['queued']).order_by('id')
+        self.assertEqual([(entry.status, entry.mobile_numbers) for entry in entries],
+                         [('pending', '9876543210'), ('pending', '9123456780')])
+
+    @override_settings(SMS_PROVIDER='fast2sms')
+    def test_fast2sms_queues_one_bulk_row(self):
+        success, response = SMSService.send(['9876543210', '9123456780'], 'Hello')
+        self.assertTrue(success)
+        self.assertEqual(SMSOutbox.objects.get(pk=response['queued']).mobile_numbers, '9876543210,9123456780')
+
+    def test_successful_delivery(self):
+        SMSService.send('9876543210', 'Hello')
+        [entry] = self.worker.claim(SMSService.get_provider(), 10)
+        self.assertEqual(self.worker.claim(SMSService.get_provider(), 10), [])
+
+        with mock.patch.object(SMSService, 'deliver', return_value=(True, {'sids': ['SM1']})):
+            self.assertTrue(self.worker.deliver(entry))
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ('sent', 1))
+        self.assertIsNotNone(entry.sent_at)
+
+    def test_failures_back_off_then_give_up(self):
+        SMSService.send('9876543210', 'Hello')
+        provider = SMSService.get_provider()
+        with mock.patch.object(SMSService, 'deliver', side_effect=Exception('provider down')):
+            for attempt in range(1, self.worker.max_attempts + 1):
+                SMSOutbox.objects.update(next_attempt_at=timezone.now())
+                [entry] = self.worker.claim(provider, 10)
+                self.assertFalse(self.worker.deliver(entry))
+                entry.refresh_from_db()
+                self.assertEqual(entry.attempts, attempt)
+                if attempt < self.worker.max_attempts:
+                    self.assertEqual(entry.status, 'pending')
+                    self.assertGreater(entry.next_attempt_at, timezone.now() + timedelta(seconds=20))
+        self.assertEqual(entry.status, 'failed')
+        self.assertIn('provider down', entry.last_error)
+
+    def test_expired_claims_are_picked_up_again(self):
+        SMSService.send('9876543210', 'Hello')
+        provider = SMSService.get_provider()
+        self.worker.claim(provider, 10)
+        SMSOutbox.objects.update(claimed_at=timezone.now() - SMSOutboxWorker.CLAIM_TIMEOUT - timedelta(seconds=1))
+        [entry] = self.worker.claim(provider, 10)
+        self.assertEqual(entry.attempts, 1)
+        self.assertEqual(SMSOutbox.objects.get().attempts, 1)
+
+    def test_message_that_keeps_crashing_its_worker_fails(self):
+        SMSService.send('9876543210', 'Hello')
+        provider = SMSService.get_provider()
+        for _ in range(self.worker.max_attempts):
+            self.worker.claim(provider, 10)
+            SMSOutbox.objects.update(claimed_at=timezone.now() - SMSOutboxWorker.CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(self.worker.claim(provider, 10), [])
+        entry = SMSOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ('failed', self.worker.max_attempts))
+
+    def test_pool_task_closes_its_connection_once_per_batch(self):
+        for n in range(3):
+            SMSService.send(f'98765432{n:02d}', 'Hello')
+        entries = Queue()
+        for entry in self.worker.claim(SMSService.get_provider(), 10):
+            entries.put(entry)
+        outcomes = [(True, {'sids': ['SM1']}), (False, {'error': 'busy'}), (True, {'sids': ['SM3']})]
+        with mock.patch.object(SMSService, 'deliver', side_effect=outcomes), \
+                mock.patch('backend_core_api.sms_outbox.connection') as thread_connection:
+            self.assertEqual(self.worker._deliver_batch(entries), (2, 1))
+        thread_connection.close.assert_called_once_with()
+        self.assertEqual(SMSOutbox.objects.filter(status='sent').count(), 2)
+
+    def test_send_many_queues_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = SMSService.send_many([('9876543210', 'One'), (['9123456780', '9000000000'], 'Two')])
+        self.assertEqual(sum(query['sql'].startswith('INSERT') for query in queries.captured_queries), 1)
+        self.assertTrue(all(success for success, _ in results))
+        self.assertEqual(len(results[1][1]['queued']), 2)  # One Twilio row per recipient
+        self.assertEqual(SMSOutbox.objects.filter(status='pending').count(), 3)
+
+    @override_settings(SMS_PROVIDER='twilio')
+    def test_twilio_retries_only_the_failed_recipient(self):
+        SMSService.send(['9876543210', '9123456780'], 'Hello')
+
+        outcomes = {'9876543210': [(True, {'sids': ['SM1']})], '9123456780': [(False, {'error': 'busy'}), (True, {'sids': ['SM2']})]}
+        with mock.patch.object(SMSService, 'deliver', side_effect=lambda provider, number, message: outcomes[number].pop(0)) as sent:
+            self.assertEqual([self.worker.deliver(entry) for entry in self.worker.claim('twilio', 10)], [True, False])
+            SMSOutbox.objects.update(next_attempt_at=timezone.now())
+            [retry] = self.worker.claim('twilio', 10)
+            self.assertTrue(self.worker.deliver(retry))
+        self.assertEqual([call.args[1] for call in sent.call_args_list], ['9876543210', '9123456780', '9123456780'])
+        self.assertEqual(set(SMSOutbox.objects.values_list('status', flat=True)), {'sent'})
+
+    def test_failed_queueing_leaves_the_caller_transaction_usable(self):
+        with transaction.atomic():
+            Zone.objects.create(name='Zone A')
+            self.assertFalse(SMSService.send('9876543210', None)[0])
+            self.assertFalse(SMSService.send_many([('9876543210', None)])[0][0])
+            Zone.objects.create(name='Zone B')
+        self.assertEqual(Zone.objects.count(), 2)
+
+
+class SMSClientRegistryTests(TestCase):
+    def test_clients_are_reused(self):
+        self.assertIs(SMSClientRegistry.fast2sms_session(), SMSClientRegistry.fast2sms_session())
+        self.assertIs(SMSClientRegistry.twilio_client('AC1', 'token'), SMSClientRegistry.twilio_client('AC1', 'token'))
+        self.assertIsNot(SMSClientRegistry.twilio_client('AC1', 'token'), SMSClientRegistry.twilio_client('AC2', 'token'))
+
+        other_thread = SMSClientRegistry.executor().submit(SMSClientRegistry.twilio_client, 'AC1', 'token').result()
+        self.assertIsNot(other_thread, SMSClientRegistry.twilio_client('AC1', 'token'))
+        self.assertIs(other_thread.http_client.session, SMSClientRegistry.twilio_client('AC1', 'token').http_client.session)
+
+    def test_concurrent_twilio_sends_keep_their_own_responses(self):
+        recipients = ['9876540001', '9876540002', '9876540003', '9876540004']
+        # TwilioHttpClient stores its response on the instance, then returns it.
+        # Hold every thread in between, so a shared instance would return one response to all.
+        stored = threading.Barrier(len(recipients), timeout=5)
+
+        def remember(http_client, response):
+            http_client.__dict__['last_response'] = response
+            if response is not None:
+                stored.wait()
+        last_response = property(lambda http_client: http_client.__dict__.get('last_response'), remember)
+
+        class FakeTwilio(HTTPAdapter):
+            def send(self, request, **kwargs):
+                to = parse_qs(request.body)['To'][0]
+                response = requests.Response()
+                response.status_code = 201
+                response._content = json.dumps({'sid': f'SM{to[-4:]}', 'to': to}).encode()
+                return response
+
+        session = requests.Session()
+        session.mount('https://', FakeTwilio())
+        with mock.patch.object(SMSClientRegistry, 'twilio_session', return_value=session), \
+                mock.patch.object(SMSClientRegistry, '_local', threading.local()), \
+                mock.patch.object(TwilioHttpClient, '_test_only_last_response', last_response, create=True), \
+                self.settings(TWILIO_ACCOUNT_SID='AC1', TWILIO_AUTH_TOKEN='token', TWILIO_PHONE_NUMBER='+15550000000',
+                              SMS_RECIPIENT_CONCURRENCY=len(recipients)):
+            SMSClientRegistry._executor = None
+            try:
+                success, response = TwilioSMSService.send_sms(recipients, 'Hello')
+            finally:
+                SMSClientRegistry.executor().shutdown()
+                SMSClientRegistry._executor = None
+        self.assertTrue(success, response)
+        self.assertEqual(response['sids'], ['SM0001', 'SM0002', 'SM0003', 'SM0004'])
+
+    def test_twilio_sends_each_recipient(self):
+        client = mock.Mock()
+        client.messages.create.side_effect = lambda **params: mock.Mock(sid=f"SM{params['to'][-4:]}")
+        with mock.patch.object(SMSClientRegistry, 'twilio_client', return_value=client), \
+                self.settings(TWILIO_ACCOUNT_SID='AC1', TWILIO_AUTH_TOKEN='token', TWILIO_PHONE_NUMBER='+15550000000'):
+            success, response = TwilioSMSService.send_sms('9876543210, 9123456780', 'Hello')
+        self.assertTrue(success)
+        self.assertEqual(response['sids'], ['SM3210', 'SM6780'])
+        self.assertEqual(client.messages.create.call_count, 2)
+
+
+@override_settings(SLOT_INDEX_BACKEND='local')
+class SlotIndexTests(TestCase):
+    def setUp(self):
+        SlotAvailabilityIndex._stores.clear()
+        self.zone = Zone.objects.create(name='Zone A', total_slots=3)
+        self.slots = [Slot.objects.create(zone=self.zone, slot_number=number) for number in ('A1', 'A2', 'A3')]
+        Slot.objects.filter(pk=self.slots[2].pk).update(is_occupied=True)
+
+    def test_rebuild_then_acquire_hands_out_each_free_slot_once(self):
+        self.assertEqual(sorted(SlotAvailabilityIndex.rebuild(self.zone.id)), [self.slots[0].id, self.slots[1].id])
+        taken = {SlotAvailabilityIndex.acquire(self.zone).id, SlotAvailabilityIndex.acquire(self.zone).id}
+        self.assertEqual(taken, {self.slots[0].id, self.slots[1].id})
+        self.assertIsNone(SlotAvailabilityIndex.acquire(self.zone))
+
+    def test_acquire_builds_a_missing_zone_and_skips_stale_members(self):
+        store = SlotAvailabilityIndex.store()
+        SlotAvailabilityIndex.rebuild(self.zone.id)
+        store.add(SlotAvailabilityIndex.INDEX_KEY.format(zone_id=self.zone.id), self.slots[2].id)
+        Slot.objects.filter(pk=self.slots[1].pk).update(is_reserved=True)
+
+        with self.assertNumQueries(3):
+            handed_out = [SlotAvailabilityIndex.acquire(self.zone) for _ in range(3)]
+        self.assertEqual([slot.id for slot in handed_out if slot], [self.slots[0].id])
+
+        SlotAvailabilityIndex._stores.clear()  # A fresh process
+        self.assertEqual(SlotAvailabilityIndex.acquire(self.zone).id, self.slots[0].id)
+
+    def test_sync_follows_committed_slot_changes(self):
+        SlotAvailabilityIndex.rebuild(self.zone.id)
+        occupied = self.slots[2]
+        occupied.is_occupied = False
+        with self.captureOnCommitCallbacks(execute=True):
+            occupied.save()
+        first = self.slots[0]
+        first.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+
+        taken = {SlotAvailabilityIndex.acquire(self.zone).id, SlotAvailabilityIndex.acquire(self.zone).id}
+        self.assertEqual(taken, {self.slots[1].id, occupied.id})
+        self.assertIsNone(SlotAvailabilityIndex.acquire(self.zone))
+
+    @override_settings(SLOT_INDEX_BACKEND=None)
+    def test_without_a_shared_store_gates_use_the_database(self):
+        self.assertIsNone(SlotAvailabilityIndex.acquire(self.zone))
+        self.assertEqual(SlotStateService.claim(self.zone).slot_number, 'A1')
+
+
+class SlotStateTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='Zone A', total_slots=2)
+        self.a1 = Slot.objects.create(zone=self.zone, slot_number='A1')
+        self.a2 = Slot.objects.create(zone=self.zone, slot_number='A2')
+
+    def state(self, slot):
+        slot.refresh_from_db()
+        return slot.is_reserved, slot.is_occupied
+
+    def test_transitions_only_apply_from_the_expected_state(self):
+        slot = SlotStateService.claim(self.zone)
+        self.assertEqual((slot.pk, self.state(slot)), (self.a1.pk, (True, False)))
+
+        self.assertTrue(SlotStateService.occupy(slot))
+        self.assertEqual(self.state(slot), (False, True))
+        self.assertFalse(SlotStateService.occupy(slot))
+
+        self.assertTrue(SlotStateService.release(slot))
+        self.assertEqual(self.state(slot), (False, False))
+        self.assertFalse(SlotStateService.release(slot))
+
+        walk_in = SlotStateService.claim(self.zone, occupy=True)
+        self.assertEqual(self.state(walk_in), (False, True))
+
+    def test_gate_that_loses_the_race_takes_another_slot(self):
+        # The index hands out A1, but another gate occupies it first
+        Slot.objects.filter(pk=self.a1.pk).update(is_occupied=True)
+        stale = Slot.objects.get(pk=self.a1.pk)
+        stale.is_occupied = False
+        with mock.patch('backend_core_api.services.SlotAvailabilityIndex.acquire', side_effect=[stale, None]):
+            slot = SlotStateService.claim(self.zone)
+        self.assertEqual(slot.pk, self.a2.pk)
+        self.assertEqual(self.state(self.a1), (False, True))
+
+        self.assertIsNone(SlotStateService.claim(self.zone))
+
+    def test_release_reserved_frees_many_slots_in_one_update(self):
+        other_zone = Zone.objects.create(name='Zone B', total_slots=1)
+        b1 = Slot.objects.create(zone=other_zone, slot_number='B1')
+        Slot.objects.filter(pk__in=[self.a1.pk, b1.pk]).update(is_reserved=True)
+        Slot.objects.filter(pk=self.a2.pk).update(is_occupied=True)
+
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            released = SlotStateService.release_reserved([self.a1.pk, self.a2.pk, b1.pk])
+        self.assertEqual({slot.pk for slot in released}, {self.a1.pk, b1.pk})
+        # One for the slots, one for both zones' counters
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries.captured_queries), 2)
+        self.assertEqual([self.state(self.a1), self.state(self.a2), self.state(b1)], [(False, False), (False, True), (False, False)])
+        self.assertEqual(OccupancyEvent.objects.count(), 2)
+
+    def test_counters_move_in_the_slot_transaction(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            SlotStateService.claim(self.zone)
+            # Before commit, so a reconcile waiting on the zone row sees both or neither
+            self.zone.refresh_from_db()
+            self.assertEqual(self.zone.reserved_count, 1)
+
+        with transaction.atomic():
+            SlotStateService.release_reserved([self.a1.pk])
+            self.zone.refresh_from_db()
+            self.assertEqual(self.zone.reserved_count, 0)
+
+
+class ZoneOccupancyQueryTests(TestCase):
+    def setUp(self):
+        self.zone_a = Zone.objects.create(name='Zone A', total_slots=5)
+        for number, state in (('A1', {'is_occupied': True}), ('A2', {'is_occupied': True}), ('A3', {'is_reserved': True}),
+                              ('A4', {}), ('A5', {'is_occupied': True, 'is_active': False})):
+            Slot.objects.create(zone=self.zone_a, slot_number=number, **state)
+        self.zone_b = Zone.objects.create(name='Zone B', total_slots=2)
+        # Counters deliberately wrong: the annotations must count the slots
+        Zone.objects.update(occupied_count=9, reserved_count=9)
+
+    def test_counts_active_slots_only(self):
+        with self.assertNumQueries(1):
+            counts = {
+                zone.name: (zone.occupied_slots, zone.reserved_slots, zone.available_slots)
+                for zone in Zone.objects.with_occupancy().order_by('name')
+            }
+        self.assertEqual(counts, {'Zone A': (2, 1, 2), 'Zone B': (0, 0, 2)})
+
+    def test_serializing_more_zones_adds_no_queries(self):
+        for n in range(5):
+            zone = Zone.objects.create(name=f'Zone {n}', total_slots=2)
+            Slot.objects.create(zone=zone, slot_number='1', is_reserved=True)
+        with self.assertNumQueries(2):  # Zones with their counts, then the prefetched slots
+            data = ZoneSerializer(Zone.objects.with_occupancy().prefetch_related('slots').order_by('name'), many=True).data
+        self.assertEqual([(zone['name'], zone['reserved_slots'], zone['available_slots']) for zone in data][:3],
+                         [('Zone 0', 1, 1), ('Zone 1', 1, 1), ('Zone 2', 1, 1)])
+        self.assertEqual(data[-2]['current_occupancy']['occupied'], 2)
+
+
+class ZoneCounterTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='Zone A', total_slots=3)
+        for number in ('A1', 'A2', 'A3'):
+            Slot.objects.create(zone=self.zone, slot_number=number)
+
+    def counters(self):
+        self.zone.refresh_from_db()
+        return self.zone.occupied_count, self.zone.reserved_count
+
+    def test_transitions_move_the_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booked = SlotStateService.claim(self.zone)
+            walk_in = SlotStateService.claim(self.zone, occupy=True)
+        self.assertEqual(self.counters(), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SlotStateService.occupy(booked)
+        self.assertEqual(self.counters(), (2, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SlotStateService.release(walk_in)
+            SlotStateService.release(walk_in)  # Already free: no delta
+        self.assertEqual(self.counters(), (1, 0))
+
+    def test_inactive_slots_are_not_counted(self):
+        slot = Slot.objects.get(slot_number='A1')
+        Slot.objects.filter(pk=slot.pk).update(is_active=False)
+        slot.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            SlotStateService.occupy(slot)
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_slot_writes_through_the_api_move_the_counters(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('ops', password='x', is_staff=True))
+        created = client.post('/api/core/slots/', {'zone': self.zone.pk, 'slot_number': 'A4', 'is_occupied': True}, format='json')
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(self.counters(), (1, 0))
+
+        slot_id = created.json()['id']
+        client.patch(f'/api/core/slots/{slot_id}/', {'is_active': False}, format='json')
+        self.assertEqual(self.counters(), (0, 0))
+        client.patch(f'/api/core/slots/{slot_id}/', {'is_active': True, 'is_reserved': True}, format='json')
+        self.assertEqual(self.counters(), (1, 1))
+
+        other = Zone.objects.create(name='Zone B', total_slots=1)
+        client.patch(f'/api/core/slots/{slot_id}/', {'zone': other.pk}, format='json')
+        self.assertEqual(self.counters(), (0, 0))
+        self.assertEqual(Zone.objects.filter(pk=other.pk).values_list('occupied_count', 'reserved_count').get(), (1, 1))
+
+        client.delete(f'/api/core/slots/{slot_id}/')
+        self.assertEqual(Zone.objects.filter(pk=other.pk).values_list('occupied_count', 'reserved_count').get(), (0, 0))
+
+    def test_save_compares_against_the_stored_row(self):
+        slot = Slot.objects.get(slot_number='A1')
+        with self.captureOnCommitCallbacks(execute=True):
+            SlotStateService.claim(self.zone, occupy=True)  # Takes A1 behind this instance's back
+        self.assertEqual(self.counters(), (1, 0))
+
+        slot.is_active = False
+        slot.save(update_fields=['is_active'])  # The stale is_occupied=False is not written
+        self.assertEqual(self.counters(), (0, 0))
+        slot.is_active = True
+        slot.save(update_fields=['is_active'])
+        self.assertEqual(self.counters(), (1, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Slot.objects.filter(slot_number='A1').update(is_occupied=True)
+        Slot.objects.filter(slot_number='A2').update(is_reserved=True)
+        Zone.objects.filter(pk=self.zone.pk).update(occupied_count=3, reserved_count=-1)
+
+        out = io.StringIO()
+        call_command('reconcile_zone_counters', '--dry-run', stdout=out)
+        self.assertIn('occupied 3 -> 1, reserved -1 -> 1', out.getvalue())
+        self.assertEqual(self.counters(), (3, -1))
+
+        call_command('reconcile_zone_counters', stdout=io.StringIO())
+        self.assertEqual(self.counters(), (1, 1))
+        out = io.StringIO()
+        call_command('reconcile_zone_counters', stdout=out)
+        self.assertIn('Repaired counter drift in 0 zones', out.getvalue())
+
+
+class ExpiryWarningTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='Zone A', total_slots=10)
+
+    def reserve(self, expires_in, mobile='9876543210'):
+        return ParkingSession.objects.create(
+            vehicle_number='MH12AB1234', zone=self.zone, status='reserved', guest_mobile=mobile,
+            booking_expiry_time=timezone.now() + expires_in
+        )
+
+    def test_warns_only_sessions_inside_the_window(self):
+        due = [self.reserve(timedelta(minutes=30)), self.reserve(timedelta(minutes=90))]
+        self.reserve(timedelta(minutes=30), mobile=None)
+        self.reserve(timedelta(hours=5))
+        self.reserve(timedelta(minutes=-5))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(CancellationService.send_expiry_warnings(batch_size=1), 2)
+
+        warned = set(ParkingSession.objects.filter(sms_notification_sent=True).values_list('id', flat=True))
+        self.assertEqual(warned, {session.id for session in due})
+        self.assertEqual(BookingActivityLog.objects.filter(activity_type='sms_sent').count(), 2)
+        self.assertEqual(SMSOutbox.objects.count(), 2)
+        self.assertEqual(CancellationService.send_expiry_warnings(), 0)
+
+
+class ExpiredBookingTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='Zone A', total_slots=3)
+        for number in ('A1', 'A2', 'A3'):
+            Slot.objects.create(zone=self.zone, slot_number=number)
+
+    def book(self, expired=True, booked_ago=timedelta(hours=25), paid='0.00'):
+        with self.captureOnCommitCallbacks(execute=True):
+            slot = SlotStateService.claim(self.zone)
+        session = ParkingSession.objects.create(
+            vehicle_number='MH12AB1234', zone=self.zone, slot=slot, status='reserved',
+            guest_mobile='9876543210', initial_amount_paid=Decimal(paid),
+            booking_expiry_time=timezone.now() + (timedelta(minutes=-1) if expired else timedelta(hours=1))
+        )
+        ParkingSession.objects.filter(pk=session.pk).update(entry_time=timezone.now() - booked_ago)
+        return session
+
+    def test_bulk_cancellation(self):
+        old = self.book()
+        recent = self.book(booked_ago=timedelta(minutes=10), paid='40.00')
+        live = self.book(expired=False)
+        self.zone.refresh_from_db()
+        self.assertEqual(self.zone.reserved_count, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(CancellationService.check_expired_bookings(batch_size=1), 2)
+
+        old.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((old.status, old.cancellation_type, old.refund_status), ('cancelled', 'auto_cancelled', 'not_applicable'))
+        self.assertEqual((recent.refund_amount, recent.refund_status), (Decimal('40.00'), 'pending'))
+        self.assertEqual(ParkingSession.objects.get(pk=live.pk).status, 'reserved')
+
+        self.assertFalse(Slot.objects.filter(pk__in=[old.slot_id, recent.slot_id], is_reserved=True).exists())
+        self.zone.refresh_from_db()
+        self.assertEqual(self.zone.reserved_count, 1)
+        self.assertEqual(BookingActivityLog.objects.filter(activity_type='auto_cancelled').count(), 2)
+        self.assertEqual(SMSOutbox.objects.count(), 2)
+        self.assertEqual(CancellationService.check_expired_bookings(), 0)
+
+
+class SchedulerTests(TestCase):
+    def test_lease_admits_one_node_at_a_time(self):
+        ttl = timedelta(minutes=10)
+        self.assertTrue(JobLeaseService.acquire('sweep', 'node-a', ttl))
+        self.assertFalse(JobLeaseService.acquire('sweep', 'node-b', ttl))
+        JobLeaseService.release('sweep', 'node-a', 0.5)
+        self.assertTrue(JobLeaseService.acquire('sweep', 'node-b', ttl))
+
+        lease = JobLease.objects.get(name='sweep')
+        self.assertEqual((lease.owner, lease.run_count, lease.last_duration), ('node-b', 1, 0.5))
+
+    def test_two_nodes_run_a_job_once_per_interval(self):
+        func = mock.Mock()
+        node_a, node_b = Scheduler([Job('sweep', 60, func)]), Scheduler([Job('sweep', 60, func)])
+        node_a.owner, node_b.owner = 'node-a', 'node-b'
+
+        node_a.run_job(node_a.jobs[0])
+        node_b.run_job(node_b.jobs[0])
+        self.assertEqual(func.call_count, 1)
+        self.assertEqual(node_b.jobs[0].skipped, 1)
+        lease = JobLease.objects.get(name='sweep')
+        self.assertEqual(lease.owner, 'node-a')
+        self.assertGreater(lease.expires_at, timezone.now() + timedelta(seconds=50))
+
+        # Once the job is due again, whichever node comes first runs it
+        JobLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        node_b.run_job(node_b.jobs[0])
+        node_a.run_job(node_a.jobs[0])
+        self.assertEqual(func.call_count, 2)
+        self.assertEqual(JobLease.objects.get(name='sweep').owner, 'node-b')
+
+    def test_run_job_records_metrics_and_failures(self):
+        job = Job('broken', 60, mock.Mock(side_effect=RuntimeError('boom')))
+        Scheduler([job]).run_job(job)
+        self.assertEqual(job.metrics()['failures'], 1)
+        lease = JobLease.objects.get(name='broken')
+        self.assertEqual((lease.failure_count, lease.last_error), (1, 'boom'))
+
+
+class OccupancyEventTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='Zone A', total_slots=2)
+        Slot.objects.create(zone=self.zone, slot_number='A1')
+
+    def test_slot_and_session_changes_are_recorded(self):
+        slot = SlotStateService.claim(self.zone)
+        session = ParkingSession.objects.create(vehicle_number='MH12AB1234', zone=self.zone, slot=slot, status='reserved')
+        session.save()
+        session.status = 'active'
+        session.save()
+        SlotStateService.occupy(slot)
+
+        events = list(OccupancyEvent.objects.values_list('event_type', 'payload'))
+        self.assertEqual([event_type for event_type, _ in events], ['zone', 'session', 'session', 'zone'])
+        self.assertEqual((events[0][1]['reserved_delta'], events[0][1]['slot']['is_reserved']), (1, True))
+        self.assertEqual(events[2][1]['status'], 'active')
+        self.assertEqual((events[3][1]['occupied_delta'], events[3][1]['reserved_delta']), (1, -1))
+
+    def test_fetch_hides_sessions_from_public_streams(self):
+        slot = SlotStateService.claim(self.zone)
+        ParkingSession.objects.create(vehicle_number='MH12AB1234', zone=self.zone, slot=slot, status='reserved')
+        start = OccupancyEvent.objects.first().id - 1
+
+        events, read_up_to = OccupancyEventService.fetch(start, include_sessions=False)
+        self.assertEqual([event.event_type for event in events], ['zone'])
+        self.assertEqual(read_up_to, OccupancyEventService.latest_id())
+        self.assertEqual(len(OccupancyEventService.fetch(start, include_sessions=True)[0]), 2)
+
+    def add_event(self, event_id):
+        return OccupancyEvent.objects.create(id=event_id, event_type='zone', zone_id=self.zone.id).id
+
+    @override_settings(OCCUPANCY_EVENTS_GAP_SECONDS=30)
+    def test_fetch_waits_at_an_id_gap_until_it_times_out(self):
+        first = self.add_event(OccupancyEventService.latest_id() + 1)
+        # first + 1 stands in for a longer transaction that has not committed yet
+        last = self.add_event(first + 2)
+
+        events, read_up_to = OccupancyEventService.fetch(first - 1, include_sessions=True)
+        self.assertEqual(([event.id for event in events], read_up_to), ([first], first))
+        self.assertEqual(OccupancyEventService.fetch(first, include_sessions=True), ([], first))
+
+        in_flight = self.add_event(first + 1)  # Commits late, but is still delivered
+        events, read_up_to = OccupancyEventService.fetch(first, include_sessions=True)
+        self.assertEqual(([event.id for event in events], read_up_to), ([in_flight, last], last))
+
+        # A gap that outlives the timeout is taken as a rollback
+        after_rollback = self.add_event(last + 2)
+        self.assertEqual(OccupancyEventService.fetch(last, include_sessions=True), ([], last))
+        OccupancyEvent.objects.filter(pk=after_rollback).update(created_at=timezone.now() - timedelta(seconds=31))
+        self.assertEqual(OccupancyEventService.fetch(last, include_sessions=True)[1], after_rollback)
+
+    def test_rolled_back_ids_do_not_force_a_resync(self):
+        first = self.add_event(OccupancyEventService.latest_id() + 1)
+        self.add_event(first + 2)  # first + 1 was rolled back
+
+        self.assertFalse(OccupancyEventService.is_behind(first))
+        OccupancyEvent.objects.filter(pk=first).delete()  # Pruned
+        self.assertTrue(OccupancyEventService.is_behind(first))
+
+    def test_stream_resumes_and_resyncs(self):
+        Slot.objects.create(zone=self.zone, slot_number='A2')
+        SlotStateService.claim(self.zone)
+        SlotStateService.claim(self.zone)
+        first, second = OccupancyEvent.objects.values_list('id', flat=True)
+
+        def frames(last_id, count):
+            async def take():
+                stream = OccupancyEventService.stream(last_id, include_sessions=False)
+                try:
+                    return [await stream.__anext__() for _ in range(count)]
+                finally:
+                    await stream.aclose()
+            return async_to_sync(take)()
+
+        resumed = frames(first, 2)[1]
+        self.assertTrue(resumed.startswith(f'id: {second}\nevent: zone\n'))
+
+        OccupancyEvent.objects.filter(pk=first).delete()
+        self.assertIn('event: resync', frames(first - 1, 2)[1])
+
+    def test_stream_ticket_is_staff_only_and_short_lived(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('driver', password='x'))
+        self.assertEqual(client.post('/api/core/events/ticket/').status_code, 403)
+
+        staff = User.objects.create_user('gate1', password='x', role='STAFF')
+        client.force_authenticate(staff)
+        ticket = client.post('/api/core/events/ticket/').json()['ticket']
+        self.assertEqual(OccupancyEventService.staff_from_ticket(ticket), staff)
+        # Signed for another purpose, or expired
+        self.assertIsNone(OccupancyEventService.staff_from_ticket(signing.dumps({'user_id': staff.pk})))
+        with mock.patch.object(OccupancyEventService, 'TICKET_SECONDS', -1):
+            self.assertIsNone(OccupancyEventService.staff_from_ticket(ticket))
+
+
+class VehiclePlateTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='Zone A', total_slots=2)
+        self.slot = Slot.objects.create(zone=self.zone, slot_number='A1', is_occupied=True)
+        Zone.objects.filter(pk=self.zone.pk).update(occupied_count=1)
+
+    def test_normalization(self):
+        for raw in ('MH12AB1234', 'mh12ab1234', 'MH 12 AB 1234', 'mh-12-ab-1234', ' Mh-12 aB 1234 '):
+            self.assertEqual(normalize_vehicle_number(raw), 'MH12AB1234')
+        self.assertEqual(normalize_vehicle_number(None), '')
+
+    def test_save_keeps_the_plate_in_step(self):
+        session = ParkingSession.objects.create(vehicle_number='mh-12 ab 1234', zone=self.zone)
+        self.assertEqual(session.vehicle_plate, 'MH12AB1234')
+        session.vehicle_number = 'ka 01 x 9'
+        session.save(update_fields=['vehicle_number'])
+        self.assertEqual(ParkingSession.objects.get(pk=session.pk).vehicle_plate, 'KA01X9')
+
+    def test_backfill_and_lookups_match_legacy_rows(self):
+        session = ParkingSession.objects.create(vehicle_number='Mh 12-ab 1234', zone=self.zone, slot=self.slot, status='active')
+        ParkingSession.objects.filter(pk=session.pk).update(vehicle_plate='')  # Row from before the column existed
+
+        migration = import_module('backend_core_api.migrations.0015_parkingsession_vehicle_plate')
+        migration.backfill_vehicle_plate(django_apps, None)
+        self.assertEqual(ParkingSession.objects.get(pk=session.pk).vehicle_plate, 'MH12AB1234')
+
+        client = APIClient()
+        entry = client.post('/api/core/sessions/scan-entry/', {'vehicle_number': 'mh12ab1234'}, format='json')
+        self.assertEqual(entry.json()['session_id'], session.id)
+        for term in ('MH-12 AB', 'ab 12', '1234'):  # Any part of the plate, in any case
+            search = client.get(f'/api/core/sessions/?vehicle_number={term}').json()
+            self.assertEqual([row['id'] for row in search['sessions']], [session.id])
+
+        exit_scan = client.post('/api/core/sessions/scan-exit/', {'vehicle_number': 'MH 12 AB 1234'}, format='json')
+        self.assertTrue(exit_scan.json()['success'])
+        self.assertEqual(ParkingSession.objects.get(pk=session.pk).status, 'completed')
+
+
+class SessionIndexTests(TestCase):
+    def setUp(self):
+        zone = Zone.objects.create(name='Zone A', total_slots=1)
+        ParkingSession.objects.create(vehicle_number='MH12AB1234', zone=zone, status='active')
+
+    def indexes(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, ParkingSession._meta.db_table)
+        return {name: constraint['columns'] for name, constraint in constraints.items()
+                if constraint['index'] and not constraint['primary_key']}
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # A scan is still cheaper on a table this small; ask whether the index can serve the query at all
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_hot_predicates_use_their_indexes(self):
+        # Mostly closed sessions, as in production, with planner statistics
+        zone = Zone.objects.get()
+        statuses = ['completed'] * 90 + ['cancelled'] * 5 + ['reserved'] * 3 + ['active'] * 2
+        ParkingSession.objects.bulk_create(
+            ParkingSession(vehicle_number=f'KA01X{n:04d}', vehicle_plate=f'KA01X{n:04d}', zone=zone, status=status)
+            for n, status in enumerate(statuses * 3)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(ParkingSession._meta.db_table)}')
+
+        now = timezone.now()
+        sessions = ParkingSession.objects.values_list('id', flat=True)
+        cases = {
+            'session_active_plate_idx': sessions.filter(vehicle_plate='MH12AB1234', status='active'),
+            'session_reserved_expiry_idx': sessions.filter(status='reserved', booking_expiry_time__lte=now),
+            'session_entry_time_idx': sessions.filter(entry_time__gte=now),
+            'session_status_entry_idx': sessions.filter(status='reserved', entry_time__gte=now),
+            'session_completed_exit_idx': sessions.filter(status='completed', exit_time__gte=now),
+            'session_cancelled_at_idx': sessions.filter(status='cancelled', cancelled_at__gte=now),
+        }
+        self.assertEqual(set(cases), {index.name for index in ParkingSession._meta.indexes})
+        for name, queryset in cases.items():
+            with self.subTest(name):
+                self.assertIn(name, self.plan(queryset))
+
+    def test_indexes_exist(self):
+        indexes = self.indexes()
+        for index in ParkingSession._meta.indexes:
+            columns = [ParkingSession._meta.get_field(field).column for field in index.fields]
+            self.assertEqual(indexes.get(index.name), columns)
+
+    def test_plate_is_only_indexed_for_active_sessions(self):
+        plate_column = ParkingSession._meta.get_field('vehicle_plate').column
+        self.assertEqual([name for name, columns in self.indexes().items() if plate_column in columns],
+                         ['session_active_plate_idx'])
+
+    def test_benchmark_baseline_drops_every_predicate_index(self):
+        benchmark = import_module('backend_core_api.management.commands.benchmark_session_indexes').Command()
+        dropped = benchmark.predicate_indexes()
+        self.assertLessEqual({index.name for index in ParkingSession._meta.indexes}, set(dropped))
+
+        out = io.StringIO()
+        call_command('benchmark_session_indexes', rows=50, repeat=1, stdout=out)
+        for report in out.getvalue().split('plan without indexes:')[1:]:
+            baseline = report.split('plan with indexes:')[0]
+            self.assertFalse([name for name in dropped if name in baseline], baseline)
+        self.assertEqual(benchmark.predicate_indexes(), dropped)  # Rolled back
+
+
+class SessionListTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='Zone A', total_slots=5)
+        slot = Slot.objects.create(zone=self.zone, slot_number='A1')
+        self.sessions = []
+        for n in range(5):
+            session = ParkingSession.objects.create(
+                vehicle_number=f'MH12AB{n:04d}', zone=self.zone, slot=slot,
+                status='active' if n % 2 else 'completed'
+            )
+            # Two sessions share an entry time, so the id tie-breaker matters
+            ParkingSession.objects.filter(pk=session.pk).update(entry_time=timezone.now() - timedelta(hours=min(n, 3)))
+            self.sessions.append(session)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='x', is_staff=True))
+
+    def test_cursor_pages_cover_every_session_once_newest_first(self):
+        seen = []
+        url = '/api/core/sessions/?page_size=2'
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            self.assertLessEqual(len(data['sessions']), 2)
+            seen += [session['id'] for session in data['sessions']]
+            url = data['next']
+        self.assertEqual(seen, [session.id for session in self.sessions[:3]] + [self.sessions[4].id, self.sessions[3].id])
+
+    def test_projection_and_filters(self):
+        data = self.client.get('/api/core/sessions/?fields=id,vehicle_number,zone_name&status=active').json()
+        self.assertEqual(
+            data['sessions'],
+            [{'id': s.id, 'vehicle_number': s.vehicle_number, 'zone_name': 'Zone A'} for s in (self.sessions[1], self.sessions[3])]
+        )
+        self.assertIsNone(data['next'])
+
+    def test_guests_must_give_a_plate(self):
+        guest = APIClient()
+        self.assertEqual(guest.get('/api/core/sessions/').status_code, 403)
+        data = guest.get('/api/core/sessions/?vehicle_number=mh-12 ab 0002').json()
+        self.assertEqual([session['id'] for session in data['sessions']], [self.sessions[2].id])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='Zone A', total_slots=1)
+        Slot.objects.create(zone=self.zone, slot_number='A1')
+        self.client = APIClient()
+
+    def test_unchanged_poll_gets_304(self):
+        first = self.client.get('/api/core/zones/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            repeat = self.client.get('/api/core/zones/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SlotStateService.claim(self.zone)
+        changed = self.client.get('/api/core/zones/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_version_survives_expiry(self):
+        version = DataVersion.current()
+        DataVersion.bump()
+        self.assertEqual(DataVersion.current(), version + 1)
+        cache.delete(DataVersion.KEY)
+        DataVersion.bump()
+        self.assertNotEqual(DataVersion.current(), version + 1)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        zone = Zone.objects.create(name='Zone A', total_slots=1)
+        self.sessions = [
+            ParkingSession.objects.create(vehicle_number=f'MH12AB{n:04d}', zone=zone, status='completed')
+            for n in range(3)
+        ]
+        for n, session in enumerate(self.sessions):
+            Payment.objects.create(session=session, amount=Decimal('50.00'), payment_method='cash', transaction_id=f'TXN{n}')
+        Payment.objects.filter(session=self.sessions[0]).update(created_at=timezone.now() - timedelta(days=10))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('finance', password='x', is_staff=True))
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_csv_with_date_filter(self):
+        today = timezone.localdate()
+        response = self.client.get(f'/api/core/exports/payments.csv?from_date={today}&to_date={today}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'payments_{today}_{today}.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self.content(response).decode())))
+        self.assertEqual([row['transaction_id'] for row in rows], ['TXN1', 'TXN2'])
+        self.assertEqual((rows[0]['amount'], rows[0]['zone']), ('50.00', 'Zone A'))
+
+    def test_gzipped_ndjson(self):
+        response = self.client.get('/api/core/exports/sessions.ndjson?gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        records = [json.loads(line) for line in gzip.decompress(self.content(response)).decode().splitlines()]
+        self.assertEqual([record['vehicle_number'] for record in records], [s.vehicle_number for s in self.sessions])
+
+    def test_unknown_export_and_permissions(self):
+        self.assertEqual(self.client.get('/api/core/exports/users.csv').status_code, 404)
+        self.assertEqual(APIClient().get('/api/core/exports/payments.csv').status_code, 401)
+
+
+class ActivityLogTests(TestCase):
+    def setUp(self):
+        zone = Zone.objects.create(name='Zone A', total_slots=1)
+        self.user = User.objects.create_user('staff', password='x', role='STAFF')
+        for n in range(5):
+            session = ParkingSession.objects.create(vehicle_number=f'MH12AB{n:04d}', zone=zone, status='reserved')
+            BookingActivityLog.objects.create(
+                session=session, user=self.user, activity_type='booking_created', description=f'Booking {n}'
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_keyset_pages_without_per_row_queries(self):
+        with self.assertNumQueries(2):
+            first = self.client.get('/api/core/sessions/activity-logs/?page_size=3&count=exact').json()
+        self.assertEqual([log['description'] for log in first['activity_logs']], ['Booking 4', 'Booking 3', 'Booking 2'])
+        self.assertEqual((first['total_count'], first['count_is_estimate']), (5, False))
+        self.assertEqual(first['activity_logs'][0]['zone_name'], 'Zone A')
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual([log['description'] for log in second['activity_logs']], ['Booking 1', 'Booking 0'])
+        self.assertIsNone(second['next'])
+
+    def test_search_by_plate_and_count_modes(self):
+        response = self.client.get('/api/core/sessions/activity-logs/?search=mh12-ab0003&count=none').json()
+        self.assertEqual([log['vehicle_number'] for log in response['activity_logs']], ['MH12AB0003'])
+        self.assertIsNone(response['total_count'])
+        response = self.client.get('/api/core/sessions/activity-logs/?search=ab 0003&count=none').json()
+        self.assertEqual([log['vehicle_number'] for log in response['activity_logs']], ['MH12AB0003'])
+
+        response = self.client.get('/api/core/sessions/activity-logs/?search=Booking').json()
+        self.assertEqual((response['total_count'], response['count_is_estimate']), (5, False))
+
+
+class ActivityLogWriterTests(TestCase):
+    def setUp(self):
+        zone = Zone.objects.create(name='Zone A', total_slots=1)
+        self.session = ParkingSession.objects.create(vehicle_number='MH12AB1234', zone=zone, status='reserved')
+
+    def test_batch_writes_committed_entries_together(self):
+        with ActivityLogWriter.batch():
+            with self.captureOnCommitCallbacks(execute=True):
+                for n in range(3):
+                    CancellationService.log_activity(self.session, 'booking_extended', f'Extended {n}')
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        CancellationService.log_activity(self.session, 'booking_cancelled', 'Rolled back')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+            self.assertEqual(BookingActivityLog.objects.count(), 0)
+            with CaptureQueriesContext(connection) as queries:
+                ActivityLogWriter.flush()
+            self.assertEqual(sum(q['sql'].startswith('INSERT') for q in queries), 1)
+        self.assertEqual(list(BookingActivityLog.objects.order_by('id').values_list('description', flat=True)),
+                         ['Extended 0', 'Extended 1', 'Extended 2'])
+
+    def test_failed_writes_are_spooled_and_replayed(self):
+        path = os.path.join(tempfile.mkdtemp(), 'spool.jsonl')
+        with override_settings(ACTIVITY_LOG_SPOOL=path):
+            with mock.patch.object(BookingActivityLog.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+                with self.captureOnCommitCallbacks(execute=True):
+                    CancellationService.log_activity(self.session, 'sms_sent', 'Spooled', metadata={'amount': Decimal('5.00')})
+            self.assertEqual(BookingActivityLog.objects.count(), 0)
+            self.assertTrue(os.path.exists(path))
+
+            call_command('replay_activity_spool', stdout=io.StringIO())
+        log = BookingActivityLog.objects.get()
+        self.assertEqual((log.session_id, log.description, log.metadata), (self.session.id, 'Spooled', {'amount': '5.00'}))
+        self.assertFalse(os.listdir(os.path.dirname(path)))
+
+    def test_failed_replay_is_picked_up_by_the_next_run(self):
+        path = os.path.join(tempfile.mkdtemp(), 'spool.jsonl')
+        with override_settings(ACTIVITY_LOG_SPOOL=path):
+            with mock.patch.object(BookingActivityLog.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+                with self.captureOnCommitCallbacks(execute=True):
+                    CancellationService.log_activity(self.session, 'sms_sent', 'Spooled')
+            with mock.patch.object(ParkingSession.objects, 'filter', side_effect=RuntimeError('db down')):
+                with self.assertRaises(RuntimeError):
+                    call_command('replay_activity_spool', stdout=io.StringIO())
+            self.assertEqual(len(glob.glob(f'{path}.replaying-*')), 1)
+
+            with mock.patch.object(BookingActivityLog.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+                with self.captureOnCommitCallbacks(execute=True):
+                    CancellationService.log_activity(self.session, 'sms_sent', 'Spooled later')
+            out = io.StringIO()
+            call_command('replay_activity_spool', stdout=out)
+        self.assertIn('Replayed 2 activity logs', out.getvalue())
+        self.assertEqual(sorted(BookingActivityLog.objects.values_list('description', flat=True)), ['Spooled', 'Spooled later'])
+        self.assertFalse(os.listdir(os.path.dirname(path)))
+
+
+class ShiftStatsTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('gate1', password='x', role='STAFF')
+
+    def test_counters_accumulate_in_one_daily_log(self):
+        ShiftService.update_stats(self.staff, 'entry', 50, 'Cash')
+        ShiftService.update_stats(self.staff, 'exit', Decimal('30.50'), 'upi')
+        ShiftService.update_stats(self.staff, 'exit', 0, 'Cash')
+
+        log = ShiftLog.objects.get()
+        self.assertEqual(log.shift_date, timezone.localdate())
+        self.assertEqual((log.entry_count, log.exit_count), (1, 2))
+        self.assertEqual((log.revenue_collected, log.cash_collected, log.online_collected),
+                         (Decimal('80.50'), Decimal('50.00'), Decimal('30.50')))
+
+    def test_second_log_for_the_day_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        payload = {'staff': self.staff.pk, 'shift_start': timezone.now().isoformat()}
+        first = client.post('/api/core/shift-logs/', payload, format='json')
+        self.assertEqual(first.status_code, 201)
+
+        second = client.post('/api/core/shift-logs/', payload, format='json')
+        self.assertEqual(second.status_code, 400)
+        self.assertIn('shift_date', second.json())
+        self.assertEqual(ShiftLog.objects.count(), 1)
+
+        edit = client.patch(f"/api/core/shift-logs/{first.json()['id']}/", {'notes': 'Handover done'}, format='json')
+        self.assertEqual(edit.status_code, 200)
+
+    def test_losing_the_insert_race_adds_to_the_winner(self):
+        ShiftLog.objects.create(staff=self.staff, shift_start=timezone.now(), cash_collected=Decimal('10.00'),
+                                revenue_collected=Decimal('10.00'), entry_count=1)
+        original_update, calls = QuerySet.update, []
+
+        def stale_first_update(queryset, **kwargs):
+            # The other tablet's row is invisible to the first UPDATE
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else original_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', stale_first_update):
+            ShiftService.update_stats(self.staff, 'entry', 20, 'cash')
+
+        log = ShiftLog.objects.get()
+        self.assertEqual((log.entry_count, log.cash_collected), (2, Decimal('30.00')))
+
+    def test_write_behind_sums_committed_scans(self):
+        aggregator = ShiftStatsAggregator(interval=3600)
+        with self.captureOnCommitCallbacks(execute=True):
+            aggregator.record(self.staff.pk, ShiftService.deltas('entry', 50, 'cash'))
+            aggregator.record(self.staff.pk, ShiftService.deltas('exit', 20, 'upi'))
+        with self.captureOnCommitCallbacks(execute=False):
+            aggregator.record(self.staff.pk, ShiftService.deltas('entry', 99, 'cash'))  # Never commits
+        self.assertFalse(ShiftLog.objects.exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            aggregator.shutdown()
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in queries), 1)
+        log = ShiftLog.objects.get()
+        self.assertEqual((log.entry_count, log.exit_count, log.cash_collected, log.online_collected),
+                         (1, 1, Decimal('50.00'), Decimal('20.00')))
+
+    def pay_yesterday(self, staff, amount, method):
+        zone = Zone.objects.first() or Zone.objects.create(name='Zone A', total_slots=1)
+        session = ParkingSession.objects.create(vehicle_number='MH12AB1234', zone=zone)
+        payment = Payment.objects.create(session=session, amount=Decimal(amount), payment_method=method, collected_by=staff)
+        Payment.objects.filter(pk=payment.pk).update(created_at=timezone.now() - timedelta(days=1))
+
+    @mock.patch.object(ShiftService, 'attributed_since', return_value=timezone.now() - timedelta(days=30))
+    def test_recompute_from_payments(self, _):
+        other = User.objects.create_user('gate2', password='x', role='STAFF')
+        for staff, amount, method in ((self.staff, '40.00', 'Cash'), (self.staff, '15.00', 'upi'), (other, '25.00', 'cash')):
+            self.pay_yesterday(staff, amount, method)
+        yesterday = timezone.localdate() - timedelta(days=1)
+        ShiftLog.objects.create(staff=self.staff, shift_date=yesterday, shift_start=timezone.now(),
+                                entry_count=3, revenue_collected=Decimal('999.00'))
+
+        self.assertEqual(ShiftService.recompute(yesterday, yesterday), 2)
+        log = ShiftLog.objects.get(staff=self.staff)
+        self.assertEqual((log.entry_count, log.revenue_collected, log.cash_collected, log.online_collected),
+                         (3, Decimal('55.00'), Decimal('40.00'), Decimal('15.00')))
+        self.assertEqual(ShiftLog.objects.get(staff=other).cash_collected, Decimal('25.00'))
+
+    @mock.patch.object(ShiftService, 'attributed_since', return_value=timezone.now() - timedelta(days=30))
+    def test_recompute_flushes_pending_deltas_first(self, _):
+        self.pay_yesterday(self.staff, '40.00', 'cash')
+        yesterday = timezone.localdate() - timedelta(days=1)
+        # An exit whose flush failed: its payment is already in the table
+        shift_stats.aggregator._add((self.staff.pk, yesterday), ShiftService.deltas('exit', 40, 'cash'))
+        self.addCleanup(shift_stats.aggregator.pending.clear)
+
+        ShiftService.recompute(yesterday, yesterday)
+        shift_stats.aggregator.flush()  # The background thread's next run
+        log = ShiftLog.objects.get()
+        self.assertEqual((log.exit_count, log.revenue_collected, log.cash_collected), (1, Decimal('40.00'), Decimal('40.00')))
+
+    def test_recompute_refuses_days_it_cannot_rebuild(self):
+        today = timezone.localdate()
+        with mock.patch.object(ShiftService, 'attributed_since', return_value=timezone.now() - timedelta(days=2)):
+            # Before collected_by existed
+            with self.assertRaises(CommandError):
+                call_command('recompute_shift_stats', from_date=str(today - timedelta(days=2)), stdout=io.StringIO())
+            # Still receiving buffered scans
+            with override_settings(SHIFT_STATS_WRITE_BEHIND=True), self.assertRaises(ValueError):
+                ShiftService.recompute(today, today)
+            with override_settings(SHIFT_STATS_WRITE_BEHIND=False):
+                self.assertEqual(ShiftService.recompute(today, today), 0)
+
+
+@override_settings(PERF_INSTRUMENTATION=True)
+class PerfInstrumentationTests(TestCase):
+    def setUp(self):
+        zone = Zone.objects.create(name='Zone A', total_slots=2)
+        for number in ('A1', 'A2'):
+            Slot.objects.create(zone=zone, slot_number=number)
+        recorder.reset()
+
+    def test_report_per_endpoint(self):
+        client = APIClient()
+        for _ in range(3):
+            client.get('/api/core/zones/')
+        client.force_authenticate(User.objects.create_user('ops', password='x', is_staff=True))
+
+        endpoints = {entry['endpoint']: entry for entry in client.get('/api/_perf/').json()['endpoints']}
+        zones = endpoints['GET api/core/zones/ (list)']
+        self.assertEqual(zones['requests'], 3)
+        self.assertEqual(zones['queries']['max'], 2)
+        self.assertGreater(zones['total_ms']['p95'], 0)
+        self.assertGreater(zones['serialize_ms']['max'], 0)
+        self.assertLessEqual(zones['serialize_ms']['max'], zones['total_ms']['max'])
+        self.assertEqual(APIClient().get('/api/_perf/').status_code, 401)
+
+    def test_serialization_is_timed_once_for_nested_serializers(self):
+        class ZoneSlotsSerializer(serializers.Serializer):
+            slots = serializers.SerializerMethodField()
+
+            def get_slots(self, zone):
+                return SlotSerializer(zone.slots.all(), many=True).data
+
+        instrument_serializers()
+        timer = SerializeTimer()
+        token = _serialize_timer.set(timer)
+        try:
+            # Outer start, inner start, outer end: the inner end is not counted
+            with mock.patch('backend_core_api.perf.time.perf_counter', side_effect=[1.0, 2.0, 3.5]):
+                data = ZoneSlotsSerializer(Zone.objects.get()).data
+        finally:
+            _serialize_timer.reset(token)
+        self.assertEqual(len(data['slots']), 2)
+        self.assertEqual(timer.seconds, 2.5)
+
+    @override_settings(PERF_INSTRUMENTATION=False)
+    def test_disabled_instrumentation_patches_nothing(self):
+        with mock.patch('backend_core_api.perf.instrument_serializers') as instrument:
+            APIClient().get('/api/core/zones/')
+            with self.assertRaises(MiddlewareNotUsed):
+                PerfMiddleware(lambda request: None)
+        instrument.assert_not_called()
+        self.assertEqual(recorder.report(), [])
+
+    @override_settings(PERF_QUERY_THRESHOLD=1)
+    def test_threshold_logs_the_repeated_sql(self):
+        with self.assertLogs('backend_core_api.perf', level='WARNING') as logs:
+            APIClient().get('/api/core/zones/')
+        self.assertIn('ran 2 queries', logs.output[0])
+        self.assertIn('1x SELECT', logs.output[0])
@@ -4,7 +4,7 @@ from .views import (
     UserViewSet, SlotViewSet, AttendanceViewSet, ZoneViewSet,
     ParkingSessionViewSet, VehicleViewSet, DisputeViewSet,
     ScheduleViewSet, PaymentViewSet, ShiftLogViewSet, FeedbackViewSet,
-    StaffLoginView, StaffRegisterView
+    StaffLoginView, StaffRegisterView, ExportView, EventTicketView, occupancy_events
 )
 
 router = DefaultRouter()
@@ -24,4 +24,7 @@ urlpatterns = [
     path('', include(router.urls)),
     path('staff/login/', StaffLoginView.as_view(), name='staff-login'),
     path('staff/register/', StaffRegisterView.as_view(), name='staff-register'),
+    path('events/', occupancy_events, name='occupancy-events'),
+    path('events/ticket/', EventTicketView.as_view(), name='occupancy-events-ticket'),
+    path('exports/<str:dataset>.<str:file_format>', ExportView.as_view(), name='export'),
 ]
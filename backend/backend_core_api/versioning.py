@@ -0,0 +1,91 @@
+"""
+Change version behind the ETags of polled read endpoints.
+
+One global counter lives in the cache and is bumped after every committed
+write to sessions, payments, slots and zones, and to attendance and users,
+which the dashboard summary reports. Read views decorated with
+``conditional_get()`` derive their ETag from it, so an unchanged poll is
+answered with 304 before the view runs a query or serializes anything.
+
+The counter is seeded from the clock, so a fresh key never repeats an ETag
+handed out earlier, and it expires after DATA_VERSION_TTL. The expiry bounds
+how long a missed bump (a write path without signals, or a per-process
+cache in a multi-worker deployment) can serve stale 304s.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from functools import wraps
+from .models import Attendance, ParkingSession, Payment, Slot, User, Zone
+from .signals import slot_state_changed
+import hashlib
+import time
+
+
+class DataVersion:
+    KEY = 'data_version'
+
+    @staticmethod
+    def current():
+        version = cache.get(DataVersion.KEY)
+        if version is None:
+            cache.add(DataVersion.KEY, time.time_ns() // 1000, getattr(settings, 'DATA_VERSION_TTL', 600))
+            version = cache.get(DataVersion.KEY, 0)
+        return version
+
+    @staticmethod
+    def bump():
+        try:
+            cache.incr(DataVersion.KEY)
+        except ValueError:
+            pass  # Expired; the next read seeds a new version
+
+    @staticmethod
+    def bump_on_commit():
+        transaction.on_commit(DataVersion.bump)
+
+
+def conditional_get(bucket=None):
+    """
+    Method decorator for GET handlers: ETag from the data version, the
+    request path and query string, the user and the local date.
+    bucket (seconds) also rolls the ETag over on a clock, for payloads with
+    time-dependent fields such as running durations.
+    """
+    def etag_func(request, *args, **kwargs):
+        parts = [
+            DataVersion.current(),
+            request.get_full_path(),
+            getattr(request.user, 'pk', None),
+            timezone.localdate(),
+            int(time.time() // bucket) if bucket else '',
+        ]
+        return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            # Always revalidate; the payload depends on the caller's token
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Authorization',))
+            return response
+        return condition(etag_func=etag_func)(wrapper)
+
+    return method_decorator(decorator)
+
+
+def _bump(sender, **kwargs):
+    DataVersion.bump_on_commit()
+
+
+for model in (ParkingSession, Payment, Slot, Zone, Attendance, User):
+    post_save.connect(_bump, sender=model, dispatch_uid=f'data_version_save_{model.__name__}')
+    post_delete.connect(_bump, sender=model, dispatch_uid=f'data_version_delete_{model.__name__}')
+# Slot transitions are conditional UPDATEs and skip post_save
+slot_state_changed.connect(_bump, dispatch_uid='data_version_slot_state')
@@ -4,8 +4,17 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny, IsAuthenticatedOrReadOnly
 from django.utils import timezone
-from django.http import JsonResponse
-from .models import User, Slot, Attendance, Zone, ParkingSession, Payment, Vehicle, Dispute, Schedule, ShiftLog, Feedback
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from .models import User, Slot, Attendance, Zone, ParkingSession, Payment, Vehicle, Dispute, Schedule, ShiftLog, Feedback, normalize_vehicle_number
+from .services import SlotStateService
+from .events import OccupancyEventService
+from .versioning import conditional_get
+from .exports import ExportService, DATASETS, FORMATS
+from .perf import recorder
+from datetime import date
+from .pagination import SessionCursorPagination, ActivityLogCursorPagination, estimate_count
 from .serializers import (
     UserSerializer, SlotSerializer, ZoneSerializer, 
     ParkingSessionSerializer, PaymentSerializer, VehicleSerializer,
@@ -107,9 +116,10 @@ class FeedbackViewSet(viewsets.ModelViewSet):
 
 class CoreDashboardView(APIView):
     permission_classes = [IsAuthenticated]
+    @conditional_get(bucket=60)  # Session durations and estimates run on the clock
     def get(self, request):
-        sessions = ParkingSession.objects.all().order_by('-entry_time')[:10]
-        zones = Zone.objects.all()
+        sessions = ParkingSession.objects.select_related('zone', 'slot').order_by('-entry_time')[:10]
+        zones = Zone.objects.prefetch_related('slots')
         session_serializer = ParkingSessionSerializer(sessions, many=True)
         zone_serializer = ZoneSerializer(zones, many=True)
         return Response({
@@ -131,6 +141,81 @@ def home(request):
         }
     })
 
+class PerfReportView(APIView):
+    """Query count and latency percentiles per endpoint for this worker (DELETE clears them)"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'success': True, 'endpoints': recorder.report()})
+
+    def delete(self, request):
+        recorder.reset()
+        return Response({'success': True})
+
+class EventTicketView(APIView):
+    """Short-lived ticket for opening /api/core/events/ with session events (staff only)"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        if not (user.role in ('STAFF', 'ADMIN') or user.is_staff):
+            return Response({'success': False, 'error': 'Staff access required'}, status=status.HTTP_403_FORBIDDEN)
+        return Response({
+            'success': True,
+            'ticket': OccupancyEventService.issue_ticket(user),
+            'expires_in': OccupancyEventService.TICKET_SECONDS,
+        })
+
+async def occupancy_events(request):
+    """
+    Server-Sent Events feed of zone occupancy deltas and session lifecycle changes.
+    Zone events are public; session events need a staff ?ticket= from
+    /api/core/events/ticket/ (EventSource cannot send an Authorization header).
+    Resumes after the Last-Event-ID header (or ?last_event_id=) on reconnect.
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    staff = await sync_to_async(OccupancyEventService.staff_from_ticket)(request.GET.get('ticket'))
+
+    response = StreamingHttpResponse(
+        OccupancyEventService.stream(last_id, include_sessions=staff is not None),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Tell nginx not to buffer the stream
+    return response
+
+class ExportView(APIView):
+    """
+    Streaming export for reconciliations: /api/core/exports/<sessions|payments|activity-logs>.<csv|ndjson>
+    Optional ?from_date= / ?to_date= (YYYY-MM-DD, local days, inclusive) and ?gzip=1.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, dataset, file_format):
+        if dataset not in DATASETS or file_format not in FORMATS:
+            return Response({'success': False, 'error': f"Unknown export {dataset}.{file_format}"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            from_date = date.fromisoformat(request.query_params['from_date']) if request.query_params.get('from_date') else None
+            to_date = date.fromisoformat(request.query_params['to_date']) if request.query_params.get('to_date') else None
+        except ValueError:
+            return Response({'success': False, 'error': 'Dates must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+        chunks = ExportService.chunks(dataset, file_format, from_date, to_date, compress)
+        response = StreamingHttpResponse(
+            ExportService.streaming_content(request._request, chunks),
+            content_type='application/gzip' if compress else FORMATS[file_format],
+        )
+        period = '_'.join(str(day) for day in (from_date, to_date) if day)
+        filename = f"{dataset}{'_' + period if period else ''}.{file_format}{'.gz' if compress else ''}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
 def get_staff_zones(user):
     """Helper function to get zones assigned to a staff member"""
     if not user or user.role != 'STAFF':
@@ -195,10 +280,11 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         return Response({'success': False, 'message': 'No active duty found'}, status=400)
 
 class ZoneViewSet(viewsets.ModelViewSet):
-    queryset = Zone.objects.all()
+    queryset = Zone.objects.prefetch_related('slots')
     serializer_class = ZoneSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @conditional_get()
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
@@ -219,9 +305,10 @@ class ZoneViewSet(viewsets.ModelViewSet):
         return Response({'success': True, 'slots': serializer.data})
 
 class ParkingSessionViewSet(viewsets.ModelViewSet):
-    queryset = ParkingSession.objects.all()
+    queryset = ParkingSession.objects.select_related('zone', 'slot', 'user')
     serializer_class = ParkingSessionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SessionCursorPagination
 
     def get_permissions(self):
         if self.action in ['list', 'book_parking', 'scan_entry', 'scan_exit', 'create_razorpay_order', 'verify_razorpay_payment']:
@@ -234,16 +321,36 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
             vehicle_number = request.query_params.get('vehicle_number')
             if not vehicle_number:
                 return Response({'error': 'Authentication required to view all sessions'}, status=403)
-        
+
         queryset = self.filter_queryset(self.get_queryset())
-        
-        # Filter by vehicle_number if provided
+
+        # Filter by vehicle_number if provided: substring match on the normalized
+        # plate, so case, spaces and dashes in either side do not matter
         vehicle_number = request.query_params.get('vehicle_number')
         if vehicle_number:
-            queryset = queryset.filter(vehicle_number__icontains=vehicle_number)
-            
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({'success': True, 'sessions': serializer.data})
+            plate = normalize_vehicle_number(vehicle_number)
+            queryset = queryset.filter(vehicle_plate__contains=plate) if plate else queryset.none()
+
+        # Comma-separated filters, e.g. ?status=active,reserved
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status__in=status_filter.split(','))
+        payment_status = request.query_params.get('payment_status')
+        if payment_status:
+            queryset = queryset.filter(payment_status__in=payment_status.split(','))
+
+        # Optional projection, e.g. ?fields=id,vehicle_number,status
+        fields = request.query_params.get('fields')
+        fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True, fields=fields)
+        return Response({
+            'success': True,
+            'sessions': serializer.data,
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link()
+        })
 
     @action(detail=False, methods=['post'], url_path='book', permission_classes=[AllowAny])
     def book_parking(self, request):
@@ -255,10 +362,7 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
         
         try:
             zone = Zone.objects.get(id=zone_id)
-            slot = Slot.objects.filter(zone=zone, is_occupied=False, is_reserved=False, is_active=True).first()
-            if not slot:
-                return Response({'error': 'No slots available in this zone'}, status=400)
-            
+
             # Set expiry time if exitTime is provided
             from datetime import timedelta
             booking_expiry = None
@@ -272,33 +376,35 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
                 except ValueError:
                     return Response({'error': 'Invalid time format'}, status=400)
 
-            session = ParkingSession.objects.create(
-                vehicle_number=vehicle_number,
-                zone=zone,
-                slot=slot,
-                status='reserved',
-                user=request.user if request.user.is_authenticated else None,
-                guest_mobile=guest_mobile,
-                guest_email=guest_email,
-                booking_expiry_time=booking_expiry
-            )
-            
-            # Mark slot as reserved
-            slot.is_reserved = True
-            slot.save()
-            
-            # Generate QR code data
-            import json
-            qr_data = {
-                'session_id': session.id,
-                'vehicle_number': session.vehicle_number,
-                'zone': session.zone.name,
-                'slot_number': slot.slot_number,
-                'entry_time': (session.entry_time or timezone.now()).isoformat(),
-                'type': 'parking_session'
-            }
-            session.qr_code_data = json.dumps(qr_data)
-            session.save()
+            with transaction.atomic():
+                # Reserve a slot; fails cleanly if another gate took the last one
+                slot = SlotStateService.claim(zone)
+                if not slot:
+                    return Response({'error': 'No slots available in this zone'}, status=400)
+
+                session = ParkingSession.objects.create(
+                    vehicle_number=vehicle_number,
+                    zone=zone,
+                    slot=slot,
+                    status='reserved',
+                    user=request.user if request.user.is_authenticated else None,
+                    guest_mobile=guest_mobile,
+                    guest_email=guest_email,
+                    booking_expiry_time=booking_expiry
+                )
+
+                # Generate QR code data
+                import json
+                qr_data = {
+                    'session_id': session.id,
+                    'vehicle_number': session.vehicle_number,
+                    'zone': session.zone.name,
+                    'slot_number': slot.slot_number,
+                    'entry_time': (session.entry_time or timezone.now()).isoformat(),
+                    'type': 'parking_session'
+                }
+                session.qr_code_data = json.dumps(qr_data)
+                session.save()
             
             serializer = self.get_serializer(session)
             response_data = serializer.data
@@ -339,7 +445,9 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
         
         # 2. If no session_id, check for active session by vehicle number
         if not session and vehicle_number:
-            session = ParkingSession.objects.filter(vehicle_number=vehicle_number, status='active').first()
+            session = ParkingSession.objects.filter(
+                vehicle_plate=normalize_vehicle_number(vehicle_number), status='active'
+            ).first()
             
         # 3. If session found, check zone permissions for staff
         if session:
@@ -355,22 +463,22 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
             if session.status not in ['active', 'reserved']:
                 return Response({'error': f'Session is in {session.status} status'}, status=400)
                 
-            if session.status == 'reserved' and session.slot:
-                # Transition from reserved to active occupancy
-                slot = session.slot
-                slot.is_reserved = False
-                slot.is_occupied = True
-                slot.save()
-                session.status = 'active'
-                session.save()
-            elif not session.slot:
-                slot = Slot.objects.filter(zone=session.zone, is_occupied=False, is_reserved=False, is_active=True).first()
-                if slot:
-                    slot.is_occupied = True
-                    slot.save()
-                    session.slot = slot
+            with transaction.atomic():
+                if session.status == 'reserved' and session.slot:
+                    # Transition from reserved to active occupancy
+                    if not SlotStateService.occupy(session.slot):
+                        # Reserved slot was taken meanwhile; move the vehicle to a free one
+                        slot = SlotStateService.claim(session.zone, occupy=True)
+                        if not slot:
+                            return Response({'error': 'No slots available in this zone'}, status=400)
+                        session.slot = slot
                     session.status = 'active'
-            session.save()
+                elif not session.slot:
+                    slot = SlotStateService.claim(session.zone, occupy=True)
+                    if slot:
+                        session.slot = slot
+                        session.status = 'active'
+                session.save()
             
             # Send Entry Confirmation SMS
             try:
@@ -382,42 +490,43 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
             except Exception as e:
                 import logging
                 logging.getLogger(__name__).error(f"Entry SMS failed: {str(e)}")
-        return Response({'success': True, 'message': 'Entry verified', 'session_id': session.id})
+            return Response({'success': True, 'message': 'Entry verified', 'session_id': session.id})
             
         # 4. If no session found, create walk-in session if zone_id provided
         if vehicle_number and zone_id:
             try:
                 zone = Zone.objects.get(id=zone_id)
-                slot = Slot.objects.filter(zone=zone, is_occupied=False, is_reserved=False, is_active=True).first()
-                if not slot:
-                    return Response({'error': 'No slots available in this zone'}, status=400)
-                
-                session = ParkingSession.objects.create(
-                    vehicle_number=vehicle_number,
-                    zone=zone,
-                    slot=slot,
-                    status='active',
-                    initial_amount_paid=request.data.get('initial_amount', zone.base_price),
-                    payment_status='partially_paid'
-                )
-                slot.is_occupied = True
-                slot.save()
-                
-                # Record Initial Payment
-                payment_method = request.data.get('payment_method', 'Cash')
-                params_amount = session.initial_amount_paid
-                Payment.objects.create(
-                    session=session,
-                    amount=params_amount,
-                    payment_method=payment_method,
-                    payment_type='INITIAL',
-                    status='success'
-                )
-                
-                # Update Shift Log
-                if request.user.is_authenticated:
-                    from .services import ShiftService
-                    ShiftService.update_stats(request.user, 'entry', params_amount, payment_method)
+
+                with transaction.atomic():
+                    slot = SlotStateService.claim(zone, occupy=True)
+                    if not slot:
+                        return Response({'error': 'No slots available in this zone'}, status=400)
+
+                    session = ParkingSession.objects.create(
+                        vehicle_number=vehicle_number,
+                        zone=zone,
+                        slot=slot,
+                        status='active',
+                        initial_amount_paid=request.data.get('initial_amount', zone.base_price),
+                        payment_status='partially_paid'
+                    )
+
+                    # Record Initial Payment
+                    payment_method = request.data.get('payment_method', 'Cash')
+                    params_amount = session.initial_amount_paid
+                    Payment.objects.create(
+                        session=session,
+                        amount=params_amount,
+                        payment_method=payment_method,
+                        payment_type='INITIAL',
+                        status='success',
+                        collected_by=request.user if request.user.is_authenticated else None
+                    )
+
+                    # Update Shift Log
+                    if request.user.is_authenticated:
+                        from .services import ShiftService
+                        ShiftService.record(request.user, 'entry', params_amount, payment_method)
                 
                 # Send Walk-in Entry SMS
                 try:
@@ -465,7 +574,9 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
                 pass
                 
         if not session and vehicle_number:
-            session = ParkingSession.objects.filter(vehicle_number=vehicle_number, status='active').last()
+            session = ParkingSession.objects.filter(
+                vehicle_plate=normalize_vehicle_number(vehicle_number), status='active'
+            ).last()
             
         if not session:
             return Response({'error': 'Active session not found'}, status=404)
@@ -492,36 +603,35 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
         session.final_amount_paid = max(0, total_bill - session.initial_amount_paid)
         session.payment_status = 'paid'
         
-        # Free the slot
-        if session.slot:
-            slot = session.slot
-            slot.is_occupied = False
-            slot.is_reserved = False
-            slot.save()
-            
-        session.save()
-        
-        # Record Final Payment
-        if session.final_amount_paid > 0:
-            payment_method = request.data.get('payment_method', 'Cash')
-            Payment.objects.create(
-                session=session,
-                amount=session.final_amount_paid,
-                payment_method=payment_method,
-                payment_type='FINAL',
-                status='success'
-            )
-            
-            # Update Shift Log
-            if request.user.is_authenticated:
-                from .services import ShiftService
-                ShiftService.update_stats(request.user, 'exit', session.final_amount_paid, payment_method)
-        else:
-             # Just increment exit count for prepaid/zero balance
-             if request.user.is_authenticated:
-                from .services import ShiftService
-                ShiftService.update_stats(request.user, 'exit', 0, 'Cash')
-        
+        with transaction.atomic():
+            # Free the slot
+            if session.slot:
+                SlotStateService.release(session.slot)
+
+            session.save()
+
+            # Record Final Payment
+            if session.final_amount_paid > 0:
+                payment_method = request.data.get('payment_method', 'Cash')
+                Payment.objects.create(
+                    session=session,
+                    amount=session.final_amount_paid,
+                    payment_method=payment_method,
+                    payment_type='FINAL',
+                    status='success',
+                    collected_by=request.user if request.user.is_authenticated else None
+                )
+
+                # Update Shift Log
+                if request.user.is_authenticated:
+                    from .services import ShiftService
+                    ShiftService.record(request.user, 'exit', session.final_amount_paid, payment_method)
+            else:
+                # Just increment exit count for prepaid/zero balance
+                if request.user.is_authenticated:
+                    from .services import ShiftService
+                    ShiftService.record(request.user, 'exit', 0, 'Cash')
+
         # Send Exit Confirmation SMS
         try:
             from .sms_service import SMSService
@@ -633,7 +743,11 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], url_path='activity-logs')
     def get_activity_logs(self, request):
-        """Get booking activity logs for admin/staff monitoring"""
+        """
+        Get booking activity logs for admin/staff monitoring.
+        Keyset-paginated newest first (follow next/previous); ?count=exact|estimated|none
+        picks how total_count is computed (estimated by default).
+        """
         from .models import BookingActivityLog
         from .serializers import BookingActivityLogSerializer
         from django.db.models import Q
@@ -645,9 +759,10 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
         user_id = request.query_params.get('user_id')
         zone_id = request.query_params.get('zone_id')
         search = request.query_params.get('search')
+        count_mode = request.query_params.get('count', 'estimated')
         
-        # Base queryset
-        queryset = BookingActivityLog.objects.all()
+        # Base queryset; the serializer reads user, session and session.zone
+        queryset = BookingActivityLog.objects.select_related('user', 'session__zone')
         
         # Apply filters
         if activity_type:
@@ -666,30 +781,34 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(session__zone_id=zone_id)
         
         if search:
+            # Plates match anywhere in the normalized plate, like the sessions list
+            plate = normalize_vehicle_number(search)
+            by_plate = Q(session__vehicle_plate__contains=plate) if plate else Q(pk__in=[])
             queryset = queryset.filter(
-                Q(session__vehicle_number__icontains=search) |
+                by_plate |
                 Q(description__icontains=search) |
                 Q(user__username__icontains=search)
             )
         
-        # Pagination
-        page_size = int(request.query_params.get('page_size', 50))
-        page = int(request.query_params.get('page', 1))
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        total_count = queryset.count()
-        logs = queryset[start:end]
-        
+        paginator = ActivityLogCursorPagination()
+        logs = paginator.paginate_queryset(queryset, request, view=self)
         serializer = BookingActivityLogSerializer(logs, many=True)
         
+        if count_mode == 'exact':
+            total_count, estimated = queryset.count(), False
+        elif count_mode == 'none':
+            total_count, estimated = None, False
+        else:
+            total_count, estimated = estimate_count(queryset)
+        
         return Response({
             'success': True,
             'activity_logs': serializer.data,
             'total_count': total_count,
-            'page': page,
-            'page_size': page_size,
-            'total_pages': (total_count + page_size - 1) // page_size
+            'count_is_estimate': estimated,
+            'page_size': paginator.get_page_size(request),
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link()
         })
     
     @action(detail=False, methods=['get'], url_path='cancellation-report')
@@ -0,0 +1,95 @@
+"""
+Zone.occupied_count / reserved_count upkeep outside SlotStateService.
+
+Gates move the counters inside SlotStateService's conditional UPDATEs,
+which send no model signals. Every other Slot write (the slots API, the
+admin, shell edits) goes through save() or delete(), and the handlers here
+apply the difference between the row as stored and as written, so
+creating, PATCHing (is_active, is_occupied, zone, ...) or deleting a slot
+keeps its zone's counters right.
+
+``reconcile`` recounts every zone from its Slot rows and repairs whatever
+drift is left (queryset updates, raw SQL, crashes). It runs from
+``manage.py reconcile_zone_counters`` and as a scheduler daemon job.
+"""
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Slot, Zone
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATE_FIELDS = ('zone_id', 'is_active', 'is_occupied', 'is_reserved')
+
+
+def counted(state):
+    """Counter contribution of a slot in the given state"""
+    return Counter({
+        'occupied_count': int(bool(state['is_active'] and state['is_occupied'])),
+        'reserved_count': int(bool(state['is_active'] and state['is_reserved'])),
+    })
+
+
+def move_counters(before, after):
+    """Apply the counter difference between two slot states (either may be None)"""
+    deltas = defaultdict(Counter)
+    if before:
+        deltas[before['zone_id']].subtract(counted(before))
+    if after:
+        deltas[after['zone_id']].update(counted(after))
+    for zone_id, counters in deltas.items():
+        changes = {field: F(field) + delta for field, delta in counters.items() if delta}
+        if changes:
+            Zone.objects.filter(pk=zone_id).update(**changes)
+
+
+def reconcile(dry_run=False):
+    """
+    Recount every zone from its slots and fix counters that drifted.
+    Returns (zone, (occupied_count, reserved_count), (num_occupied, num_reserved)) per drifted zone.
+    """
+    drifted = []
+    with transaction.atomic():
+        # Lock the zone rows so gates cannot move the counters mid-repair
+        zone_ids = list(Zone.objects.select_for_update().values_list('id', flat=True))
+        for zone in Zone.objects.filter(id__in=zone_ids).with_occupancy():
+            stored = (zone.occupied_count, zone.reserved_count)
+            actual = (zone.num_occupied, zone.num_reserved)
+            if stored == actual:
+                continue
+            drifted.append((zone, stored, actual))
+            if not dry_run:
+                Zone.objects.filter(pk=zone.pk).update(occupied_count=actual[0], reserved_count=actual[1])
+    if drifted and not dry_run:
+        logger.warning(f"Repaired counter drift in {len(drifted)} zones")
+    return drifted
+
+
+@receiver(pre_save, sender=Slot)
+def remember_stored_slot_state(sender, instance, raw=False, **kwargs):
+    # Read the stored row rather than trusting the instance, which may have
+    # been loaded before a gate changed the slot
+    instance._stored_state = None
+    if instance.pk and not raw:
+        instance._stored_state = Slot.objects.filter(pk=instance.pk).values(*STATE_FIELDS).first()
+
+
+@receiver(post_save, sender=Slot)
+def count_saved_slot(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    before = instance.__dict__.pop('_stored_state', None)
+    written = {field: getattr(instance, field) for field in STATE_FIELDS}
+    if before and update_fields is not None:
+        # Fields left out of update_fields keep their stored value
+        names = {'zone_id' if name == 'zone' else name for name in update_fields}
+        written = {field: written[field] if field in names else before[field] for field in STATE_FIELDS}
+    move_counters(before, written)
+
+
+@receiver(post_delete, sender=Slot)
+def count_deleted_slot(sender, instance, **kwargs):
+    move_counters({field: getattr(instance, field) for field in STATE_FIELDS}, None)
@@ -3,6 +3,11 @@ ASGI config for smart_parking project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server so the /api/core/events/ stream does not hold a
+worker thread per client, e.g.:
+
+    gunicorn smart_parking.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend_core_api.perf.PerfMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -62,6 +63,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend_core_api.middleware.ActivityLogMiddleware',
 ]
 
 ROOT_URLCONF = 'smart_parking.urls'
@@ -96,6 +98,39 @@ DATABASES = {
 }
 
 
+# Cache
+# Local memory is per process: with several gunicorn workers set REDIS_URL so
+# that cached analytics and their invalidation are shared by every worker.
+
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'smart-parking',
+        }
+    }
+
+# Seconds each AnalyticsService result may be served from cache. Writes to
+# sessions, payments and slots invalidate all of them immediately; the TTL
+# only bounds how long the local date and live occupancy can lag.
+ANALYTICS_CACHE_TIMEOUTS = {
+    'get_dashboard_summary': 15,
+    'get_zone_occupancy': 15,
+    'get_revenue_report': 300,
+    'get_peak_hours': 300,
+    'get_daily_report': 300,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -173,6 +208,58 @@ TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', 'your_auth_token')
 TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER', 'your_phone_number')
 SMS_PROVIDER = os.environ.get('SMS_PROVIDER', 'twilio')
 
+# SMS outbox worker (manage.py process_sms_outbox)
+SMS_OUTBOX_MAX_ATTEMPTS = 5
+SMS_PROVIDER_CONCURRENCY = {  # Parallel API calls per provider
+    'twilio': 4,
+    'fast2sms': 2,
+}
+SMS_RECIPIENT_CONCURRENCY = 8  # Parallel Twilio calls for one multi-recipient message
+
+# Periodic jobs of `manage.py check_expired_bookings --daemon`, in seconds (0 disables a job)
+SCHEDULER_INTERVALS = {
+    'expiry_warnings': 60,
+    'expired_bookings': 60,
+    'sms_outbox': 5,
+    'analytics_rollups': 900,
+    'prune_occupancy_events': 3600,
+    'reconcile_zone_counters': 900,
+}
+SCHEDULER_LEASE_SECONDS = 600  # A crashed node's jobs are taken over after this
+
+# Occupancy event stream (/api/core/events/)
+OCCUPANCY_EVENTS_POLL_SECONDS = 1
+OCCUPANCY_EVENTS_RETENTION_HOURS = 24  # Older clients get a resync event
+# A missing event id holds the stream back this long before it is treated as
+# rolled back; transactions that record events must commit within it
+OCCUPANCY_EVENTS_GAP_SECONDS = 30
+
+# Free-slot index store (backend_core_api/slot_index.py). 'local' is only
+# correct with a single server process; None leaves gates on the database.
+SLOT_INDEX_BACKEND = 'redis' if REDIS_URL else None
+
+# ETag version of polled read endpoints (backend_core_api/versioning.py).
+# A per-process cache cannot see other workers' bumps, so expire it sooner.
+DATA_VERSION_TTL = 600 if REDIS_URL else 30
+
+# Buffered BookingActivityLog writes (backend_core_api/activity_log.py)
+ACTIVITY_LOG_FLUSH_SIZE = 500
+# Failed writes are appended here; load them with `manage.py replay_activity_spool`
+ACTIVITY_LOG_SPOOL = os.environ.get('ACTIVITY_LOG_SPOOL', str(BASE_DIR / 'activity_log_spool.jsonl'))
+
+# Opt-in: gate scans buffer ShiftLog counters in-process and flush them every few seconds
+# (backend_core_api/shift_stats.py). A hard kill loses the buffered entry/exit counts,
+# which cannot be rebuilt; only money totals can (`manage.py recompute_shift_stats`).
+# Off, each scan updates its ShiftLog row inside the scan's transaction.
+SHIFT_STATS_WRITE_BEHIND = os.environ.get('SHIFT_STATS_WRITE_BEHIND', 'False') == 'True'
+SHIFT_STATS_FLUSH_SECONDS = 5
+
+# Query count / latency per endpoint (backend_core_api/perf.py, report at /api/_perf/).
+# Off by default: it wraps every query and serializer. Enable it per environment.
+PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION', 'False') == 'True'
+PERF_RING_SIZE = 500  # Samples kept per endpoint
+PERF_QUERY_THRESHOLD = int(os.environ.get('PERF_QUERY_THRESHOLD', 50))  # Log the SQL of requests above this (0 disables)
+
 # Razorpay Configuration
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'your_razorpay_key_id')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', 'your_razorpay_key_secret')
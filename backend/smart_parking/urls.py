@@ -4,7 +4,7 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from backend_core_api.views import home, CoreDashboardView, ParkingSessionViewSet
+from backend_core_api.views import home, CoreDashboardView, ParkingSessionViewSet, PerfReportView
 from backend_analytics_api.views import DashboardAnalyticsView
 
 urlpatterns = [
@@ -22,6 +22,9 @@ urlpatterns = [
     # Dashboard Aliases
     path('api/dashboard/', CoreDashboardView.as_view(), name='core-dashboard'),
     
+    # Per-endpoint query/latency report (PerfMiddleware)
+    path('api/_perf/', PerfReportView.as_view(), name='perf-report'),
+    
     # Specialized Parking Logic (Direct Overrides for specific frontend paths)
     path('api/parking/book/', ParkingSessionViewSet.as_view({'post': 'book_parking'})),
     path('api/parking/scan-entry/', ParkingSessionViewSet.as_view({'post': 'scan_entry'})),
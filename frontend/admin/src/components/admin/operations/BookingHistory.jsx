@@ -14,20 +14,13 @@ const BookingHistory = () => {
     const fetchBookings = async () => {
         try {
             setLoading(true);
-            const response = await apiService.getCompletedSessions().catch(() => ({ data: [] }));
-            const sessions = Array.isArray(response) ? response : (response.data || response.sessions || []);
-
-            const mappedBookings = sessions.map(item => ({
+            const response = await apiService.getAllSessions({ status: 'completed' }, { limit: 200 })
+                .catch(() => ({ sessions: [] }));
+            // Already newest first
+            setBookings((response.sessions || []).map(item => ({
                 ...item,
-                id: item.session_id || item.id
-            }));
-
-            // Sort by newest first
-            const sortedSessions = mappedBookings.sort((a, b) =>
-                new Date(b.entry_time) - new Date(a.entry_time)
-            );
-
-            setBookings(sortedSessions);
+                amount_paid: item.total_amount_paid
+            })));
         } catch (err) {
             console.error('Error fetching booking history:', err);
             setError('Failed to load booking history');
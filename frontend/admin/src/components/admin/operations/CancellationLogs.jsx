@@ -14,15 +14,11 @@ const CancellationLogs = () => {
     const fetchCancellations = async () => {
         try {
             setLoading(true);
-            const response = await apiService.getCompletedSessions().catch(() => ({ data: [] }));
-            const sessions = Array.isArray(response) ? response : (response.data || response.sessions || []);
-
-            // Filter for cancelled sessions
-            const cancelled = sessions.filter(s => s.status === 'Cancelled' || s.status === 'CANCELLED');
-
-            setCancellations(cancelled.map(item => ({
+            const response = await apiService.getAllSessions({ status: 'cancelled' }, { limit: 200 })
+                .catch(() => ({ sessions: [] }));
+            setCancellations((response.sessions || []).map(item => ({
                 ...item,
-                id: item.session_id || item.id
+                amount_paid: item.total_amount_paid
             })));
         } catch (err) {
             console.error('Error fetching cancellations:', err);
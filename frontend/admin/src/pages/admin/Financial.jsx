@@ -21,12 +21,33 @@ const Financial = () => {
     fetchFinancialData();
   }, [timeFilter, customDate, customMonth, customYear]);
 
+  // Earliest entry time the current filter can match, so paging stops there
+  const filterStart = () => {
+    const now = new Date();
+    if (timeFilter === 'today') return new Date(now.getFullYear(), now.getMonth(), now.getDate());
+    if (timeFilter === 'week') return new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000);
+    if (timeFilter === 'month') return new Date(now.getFullYear(), now.getMonth(), 1);
+    if (timeFilter === 'year') return new Date(now.getFullYear(), 0, 1);
+    if (timeFilter === 'custom') {
+      if (customDate) {
+        const selectedDate = new Date(customDate);
+        return new Date(selectedDate.getFullYear(), selectedDate.getMonth(), selectedDate.getDate());
+      }
+      if (customMonth) {
+        const [year, month] = customMonth.split('-');
+        return new Date(parseInt(year), parseInt(month) - 1, 1);
+      }
+      if (customYear) return new Date(parseInt(customYear), 0, 1);
+    }
+    return null;
+  };
+
   const fetchFinancialData = async () => {
     try {
       setData(prev => ({ ...prev, loading: true }));
 
       const [sessionsRes, zonesRes, analyticsRes] = await Promise.all([
-        apiService.getSessions().catch(() => ({ sessions: [] })),
+        apiService.getAllSessions({}, { since: filterStart() }).catch(() => ({ sessions: [] })),
         apiService.getZones().catch(() => ({ zones: [] })),
         apiService.getAnalyticsDashboard().catch(() => ({ summary: {} }))
       ]);
@@ -118,11 +118,31 @@ class ApiService {
   }
 
   // Sessions Management
-  async getSessions() {
-    const response = await apiClient.get(API_CONFIG.ENDPOINTS.CORE.SESSIONS);
+  // The sessions list is cursor-paginated, newest entry first: { sessions, next, previous }
+  async getSessions(params = {}) {
+    const response = await apiClient.get(API_CONFIG.ENDPOINTS.CORE.SESSIONS, { params });
     return response.data;
   }
 
+  // Follows the `next` cursor until a session entered before `since`, or `limit` sessions
+  async getAllSessions(params = {}, { since = null, limit = Infinity } = {}) {
+    const sessions = [];
+    let url = API_CONFIG.ENDPOINTS.CORE.SESSIONS;
+    let query = { page_size: 1000, ...params };
+
+    while (url && sessions.length < limit) {
+      const response = await apiClient.get(url, { params: query });
+      const page = response.data.sessions || [];
+      const kept = since ? page.filter(session => new Date(session.entry_time) >= since) : page;
+      sessions.push(...kept);
+      if (kept.length < page.length) break; // The rest of the list is older still
+
+      url = response.data.next; // Absolute URL that already carries the cursor and filters
+      query = undefined;
+    }
+    return { success: true, sessions: sessions.slice(0, limit) };
+  }
+
   async getActiveSessions() {
     const response = await apiClient.get(API_CONFIG.ENDPOINTS.ANALYTICS.ACTIVE_SESSIONS);
     return response.data;
@@ -1,6 +1,6 @@
 import axios from 'axios';
 
-const API_BASE_URL = import.meta.env.VITE_API_BASE_URL ? `${import.meta.env.VITE_API_BASE_URL.replace(/\/$/, '')}/api/` : 'http://127.0.0.1:8000/api/';
+export const API_BASE_URL = import.meta.env.VITE_API_BASE_URL ? `${import.meta.env.VITE_API_BASE_URL.replace(/\/$/, '')}/api/` : 'http://127.0.0.1:8000/api/';
 
 const api = axios.create({
     baseURL: API_BASE_URL,
@@ -74,11 +74,27 @@ export const alertApi = {
     clearAll: () => api.post('analytics/alerts/clear_all/'),
 };
 
+// /core/sessions/ returns one cursor page at a time: follow `next` and hand
+// back every page as a single response, shaped like a one-page reply
+export const getAllSessions = async (params = {}) => {
+    let response = await api.get('core/sessions/', { params: { page_size: 1000, ...params } });
+    const sessions = [...(response.data.sessions || [])];
+    while (response.data.next) {
+        response = await api.get(response.data.next); // Absolute URL that already carries the cursor and filters
+        sessions.push(...(response.data.sessions || []));
+    }
+    return { ...response, data: { ...response.data, sessions, next: null, previous: null } };
+};
+
 export const parkingApi = {
     getDashboardStats: () => api.get('analytics/dashboard/'),
     getZones: () => api.get('core/zones/'),
-    getActiveSessions: () => api.get('core/sessions/?status=active,reserved'),
-    getCompletedSessions: () => api.get('core/sessions/?status=completed'),
+    // Pass a vehicle number to look up one car instead of loading every parked session
+    getActiveSessions: (vehicleNumber) => getAllSessions({
+        status: 'active,reserved',
+        ...(vehicleNumber ? { vehicle_number: vehicleNumber } : {}),
+    }),
+    getCompletedSessions: () => getAllSessions({ status: 'completed' }),
     getAvailableSlots: (zoneId) => api.get(`core/slots/?zone=${zoneId}&is_occupied=false&is_active=true`),
     processEntry: (data) => api.post('core/sessions/scan-entry/', {
         vehicle_number: data.vehicleNumber,
@@ -91,7 +107,7 @@ export const parkingApi = {
         session_id: data.session_id || data.sessionId
     }),
     getPayments: () => api.get('core/payments/'),
-    getPendingSessions: () => api.get('core/sessions/?payment_status=pending,partially_paid'),
+    getPendingSessions: () => getAllSessions({ payment_status: 'pending,partially_paid' }),
 };
 
 export const attendanceApi = {
@@ -101,7 +117,7 @@ export const attendanceApi = {
 export const reportApi = {
     getDailyShift: (date) => api.get(`core/shift-logs/?date=${date}`),
     getRevenueSummary: (period = 'DAILY') => api.get(`analytics/revenue/?period=${period}`),
-    getVehicleHistory: (vehicleNumber) => api.get(`core/sessions/?vehicle_number=${vehicleNumber}`),
+    getVehicleHistory: (vehicleNumber) => getAllSessions({ vehicle_number: vehicleNumber }),
     getZonePerformance: () => api.get('analytics/zones/'),
 };
 
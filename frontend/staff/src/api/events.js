@@ -0,0 +1,123 @@
+import { useEffect, useRef, useState } from 'react';
+import api, { API_BASE_URL } from './api';
+
+const EVENT_TYPES = ['zone', 'session', 'resync'];
+const RECONNECT_DELAY = 3000;
+
+// Subscribes to /api/core/events/ and calls onEvent(type, data) for each event.
+// Each (re)connect asks for a fresh stream ticket, so the access token never
+// goes into the URL, and resumes after the last event seen.
+// Returns whether the stream is currently connected.
+export const useOccupancyEvents = (onEvent) => {
+  const [connected, setConnected] = useState(false);
+  const handler = useRef(onEvent);
+  handler.current = onEvent;
+
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return undefined;
+
+    let source = null;
+    let retryTimer = null;
+    let lastEventId = null;
+    let closed = false;
+
+    // Short-lived ticket for session events; EventSource cannot send an Authorization header
+    const fetchTicket = async () => {
+      if (!localStorage.getItem('access_token')) return null;
+      try {
+        const response = await api.post('core/events/ticket/');
+        return response.data.ticket;
+      } catch (error) {
+        return null; // Zone events still stream without one
+      }
+    };
+
+    const connect = async () => {
+      const params = new URLSearchParams();
+      const ticket = await fetchTicket();
+      if (closed) return;
+      if (ticket) params.set('ticket', ticket);
+      if (lastEventId) params.set('last_event_id', lastEventId);
+
+      source = new EventSource(`${API_BASE_URL}core/events/?${params}`);
+      source.onopen = () => setConnected(true);
+      source.onerror = () => {
+        setConnected(false);
+        source.close();
+        retryTimer = setTimeout(connect, RECONNECT_DELAY);
+      };
+      EVENT_TYPES.forEach((type) => {
+        source.addEventListener(type, (e) => {
+          lastEventId = e.lastEventId || lastEventId;
+          handler.current(type, JSON.parse(e.data));
+        });
+      });
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }, []);
+
+  return connected;
+};
+
+// Reloads with refresh() when matching events arrive, at most once per
+// `throttle` ms: the first event refreshes right away and later ones are
+// folded into one trailing refresh, so steady gate traffic still refreshes
+// every `throttle` ms instead of waiting for a quiet moment. Falls back to
+// polling every pollInterval ms while the stream is down.
+// A slow poll keeps running while connected in case session events stop
+// (e.g. the stream reconnected without a ticket).
+export const useLiveRefresh = (refresh, pollInterval, types = ['zone', 'session', 'resync'], throttle = 5000) => {
+  const refreshRef = useRef(refresh);
+  refreshRef.current = refresh;
+  const lastRefresh = useRef(0);
+  const trailingTimer = useRef(null);
+
+  const connected = useOccupancyEvents((type) => {
+    if (!types.includes(type) || trailingTimer.current) return;
+    const wait = lastRefresh.current + throttle - Date.now();
+    const run = () => {
+      trailingTimer.current = null;
+      lastRefresh.current = Date.now();
+      refreshRef.current();
+    };
+    if (wait <= 0) run();
+    else trailingTimer.current = setTimeout(run, wait);
+  });
+
+  useEffect(() => {
+    lastRefresh.current = Date.now();
+    refreshRef.current();
+    const interval = setInterval(() => {
+      lastRefresh.current = Date.now();
+      refreshRef.current();
+    }, connected ? pollInterval * 10 : pollInterval);
+    return () => clearInterval(interval);
+  }, [connected, pollInterval]);
+
+  useEffect(() => () => clearTimeout(trailingTimer.current), []);
+
+  return connected;
+};
+
+// Applies a zone event's counter deltas and slot flags to a list of zones from getZones()
+export const applyZoneEvent = (zones, event) => zones.map((zone) => {
+  if (zone.id !== event.zone_id) return zone;
+
+  const occupied = zone.occupied_slots + event.occupied_delta;
+  const reserved = zone.reserved_slots + event.reserved_delta;
+  const available = zone.available_slots - event.occupied_delta - event.reserved_delta;
+  return {
+    ...zone,
+    occupied_slots: occupied,
+    reserved_slots: reserved,
+    available_slots: available,
+    current_occupancy: { ...zone.current_occupancy, occupied, reserved, available },
+    slots: (zone.slots || []).map((slot) => (slot.id === event.slot.id ? { ...slot, ...event.slot } : slot)),
+  };
+});
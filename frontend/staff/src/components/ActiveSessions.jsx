@@ -1,16 +1,14 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
 import { parkingApi } from '../api/api';
+import { useLiveRefresh } from '../api/events';
 import './StaffPages.css';
 
 const ActiveSessions = () => {
   const [activeSessions, setActiveSessions] = useState([]);
   const [loading, setLoading] = useState(true);
 
-  useEffect(() => {
-    fetchActiveSessions();
-    const interval = setInterval(fetchActiveSessions, 60000); // Refresh every minute
-    return () => clearInterval(interval);
-  }, []);
+  // Refreshes on session events; polls every minute while the stream is down
+  useLiveRefresh(() => fetchActiveSessions(), 60000, ['session', 'resync']);
 
   const fetchActiveSessions = async () => {
     try {
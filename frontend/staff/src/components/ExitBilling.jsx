@@ -16,7 +16,7 @@ const ExitBilling = () => {
 
     try {
       setLoading(true);
-      const response = await parkingApi.getActiveSessions();
+      const response = await parkingApi.getActiveSessions(vehicleNumber);
       if (response.data.success) {
         const sessions = response.data.sessions || [];
         const found = sessions.find(s =>
@@ -112,7 +112,7 @@ const GateControl = () => {
         if (!exitVehicleNumber) return;
         try {
             setLoading(true);
-            const response = await parkingApi.getActiveSessions();
+            const response = await parkingApi.getActiveSessions(exitVehicleNumber);
             if (response.data.success) {
                 const found = (response.data.sessions || []).find(s =>
                     s.vehicle_number.replace(/\s/g, '').toUpperCase() === exitVehicleNumber.replace(/\s/g, '').toUpperCase()
@@ -14,9 +14,17 @@ const reportApi = {
     fetch(`${API_BASE_URL}/analytics/revenue/`)
       .then(res => res.json()),
 
-  getVehicleHistory: (vehicleNumber) =>
-    fetch(`${API_BASE_URL}/core/sessions/?vehicle_number=${vehicleNumber}`)
-      .then(res => res.json()),
+  // Follows the cursor `next` links so long histories are not cut at one page
+  getVehicleHistory: async (vehicleNumber) => {
+    let page = await fetch(`${API_BASE_URL}/core/sessions/?vehicle_number=${encodeURIComponent(vehicleNumber)}&page_size=1000`)
+      .then(res => res.json());
+    const sessions = [...(page.sessions || [])];
+    while (page.next) {
+      page = await fetch(page.next).then(res => res.json());
+      sessions.push(...(page.sessions || []));
+    }
+    return { ...page, sessions, next: null };
+  },
 
   getZonePerformance: () =>
     fetch(`${API_BASE_URL}/analytics/zones/`)
@@ -1,6 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { parkingApi, alertApi } from '../api/api';
+import { useLiveRefresh } from '../api/events';
 import Payment from './Payment';
 
 const StaffDashboard = () => {
@@ -17,11 +18,8 @@ const StaffDashboard = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
-  useEffect(() => {
-    fetchDashboardData();
-    const interval = setInterval(fetchDashboardData, 30000); // Auto-refresh every 30s
-    return () => clearInterval(interval);
-  }, []);
+  // Refreshes on occupancy events; polls every 30s while the stream is down
+  useLiveRefresh(() => fetchDashboardData(), 30000);
 
   const fetchDashboardData = async () => {
     try {
@@ -1,16 +1,24 @@
 import React, { useState, useEffect } from 'react';
 import { parkingApi } from '../api/api';
+import { useOccupancyEvents, applyZoneEvent } from '../api/events';
 import './StaffPages.css';
 
 const ZoneStatus = () => {
   const [zones, setZones] = useState([]);
   const [loading, setLoading] = useState(true);
 
+  // Zone events are applied in place; polling only runs while the stream is down
+  const connected = useOccupancyEvents((type, data) => {
+    if (type === 'zone') setZones(prev => applyZoneEvent(prev, data));
+    if (type === 'resync') fetchZones();
+  });
+
   useEffect(() => {
     fetchZones();
+    if (connected) return undefined;
     const interval = setInterval(fetchZones, 30000); // 30s refresh
     return () => clearInterval(interval);
-  }, []);
+  }, [connected]);
 
   const fetchZones = async () => {
     try {
@@ -95,8 +95,16 @@ export const parkingApi = {
     // Check slot availability (Optional future integration)
     getZones: () => api.get('core/zones/'),
 
-    // Get booking history by vehicle number
-    getBookingHistory: (vehicleNumber) => api.get(`core/sessions/?vehicle_number=${vehicleNumber}`),
+    // Get booking history by vehicle number, following the cursor `next` links across pages
+    getBookingHistory: async (vehicleNumber) => {
+        let response = await api.get('core/sessions/', { params: { vehicle_number: vehicleNumber, page_size: 1000 } });
+        const sessions = [...(response.data.sessions || [])];
+        while (response.data.next) {
+            response = await api.get(response.data.next);
+            sessions.push(...(response.data.sessions || []));
+        }
+        return { ...response, data: { ...response.data, sessions, next: null, previous: null } };
+    },
 
     // Razorpay Integration
     createRazorpayOrder: (bookingId, amount) => api.post(`core/sessions/${bookingId}/create-razorpay-order/`, { amount }),